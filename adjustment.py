@@ -0,0 +1,220 @@
+"""
+Back-door adjustment sets. Z is a valid adjustment set for the effect of X on
+Y when it contains no descendant of X and d-separates X and Y once the arrows
+out of X are removed (Pearl's back-door criterion, for sets of treatments).
+
+Both enumerations have polynomial delay, i.e. O(n (n + m)) work between two
+outputs however many sets there are, instead of checking all 2^n subsets:
+
+- all valid sets: ListSep (van der Zander, Liśkiewicz & Textor, "Separators
+  and adjustment sets in causal graphs", 2019), branching on one variable at a
+  time and pruning with the ancestral-set test FindSep;
+- minimal sets: minimal d-separators are the minimal separators of the moral
+  graph of An(X ∪ Y) (Tian, Paz & Pearl 1998), listed by branching on the
+  separator closest to X (after Takata 2010).
+
+    for Z in adjustment_sets(G, "T", "Y", minimal=True):
+        print(adjustment_formula("T", "Y", Z))
+"""
+
+import networkx as nx
+
+from dseparation import MutilatedGraph, check_dag, node_set
+
+
+class _Problem:
+    """
+    Treatment, outcome and the back-door graph of one adjustment query.
+    """
+
+    def __init__(self, G, treatment, outcome, exclude=()):
+        check_dag(G)
+        self.G = G
+        self.x, self.y = node_set(G, treatment), node_set(G, outcome)
+        missing = (self.x | self.y) - G.nodes
+        if missing:
+            raise nx.NodeNotFound(f"The node(s) {missing} are not found in G")
+        if self.x & self.y:
+            raise ValueError("treatment and outcome must be disjoint")
+        self.backdoor = MutilatedGraph(G, cut_outgoing=self.x)
+        descendants = set()
+        for x in self.x:
+            descendants |= nx.descendants(G, x)
+        self.forbidden = (descendants | node_set(G, exclude)) - self.x - self.y
+        self.position = {v: i for i, v in enumerate(G)}
+
+    def ancestral(self, nodes) -> set:
+        return self.backdoor.ancestors(nodes) | set(nodes)
+
+    def is_valid(self, z) -> bool:
+        return not (z & self.forbidden) and self.backdoor.is_d_separator(self.x, self.y, z)
+
+    def find_separator(self, include, restrict):
+        """
+        FindSep: a valid set between include and restrict if there is one. If
+        any is, the ancestral closure of X, Y and include within restrict is.
+        """
+        z = self.ancestral(self.x | self.y | include) & restrict
+        return z if self.backdoor.is_d_separator(self.x, self.y, z) else None
+
+    def first(self, nodes):
+        return min(nodes, key=self.position.__getitem__)
+
+
+def is_adjustment_set(G, treatment, outcome, adjustment) -> bool:
+    """
+    True if adjustment satisfies the back-door criterion for treatment -> outcome.
+    """
+    problem = _Problem(G, treatment, outcome)
+    z = node_set(G, adjustment)
+    if z & (problem.x | problem.y):
+        return False
+    return problem.is_valid(z)
+
+
+def _all_sets(problem):
+    restrict = frozenset(problem.G) - problem.x - problem.y - problem.forbidden
+    # explicit stack, the recursion goes one level per candidate variable
+    stack = [(frozenset(), restrict)]
+    while stack:
+        include, restrict = stack.pop()
+        if problem.find_separator(include, restrict) is None:
+            continue
+        if include == restrict:
+            yield include
+            continue
+        v = problem.first(restrict - include)
+        stack.append((include, restrict - {v}))
+        stack.append((include | {v}, restrict))
+
+
+def _moral_graph(problem) -> dict:
+    """
+    Moral graph of the back-door graph restricted to An(X ∪ Y), as adjacency sets.
+    """
+    nodes = problem.ancestral(problem.x | problem.y)
+    adjacency = {v: set() for v in nodes}
+    for v in nodes:
+        parents = problem.backdoor.predecessors(v)
+        for i, u in enumerate(parents):
+            adjacency[u].add(v)
+            adjacency[v].add(u)
+            for w in parents[i + 1:]:
+                adjacency[u].add(w)
+                adjacency[w].add(u)
+    return adjacency
+
+
+def _neighbours(adjacency, nodes) -> set:
+    out = set()
+    for v in nodes:
+        out |= adjacency[v]
+    return out - nodes
+
+
+def _component(adjacency, start, blocked) -> set:
+    seen = set(start) - blocked
+    stack = list(seen)
+    while stack:
+        for u in adjacency[stack.pop()]:
+            if u not in seen and u not in blocked:
+                seen.add(u)
+                stack.append(u)
+    return seen
+
+
+def _minimal_sets(problem):
+    H = _moral_graph(problem)
+    x, y = problem.x, problem.y
+
+    def closest(side):
+        # the minimal separator closest to side: the neighbours of Y's component
+        # once side and its neighbourhood are taken out
+        boundary = _neighbours(H, side)
+        if boundary & y:
+            return None
+        return _neighbours(H, _component(H, y, side | boundary))
+
+    stack = [(frozenset(x), frozenset())]
+    while stack:
+        side, kept = stack.pop()
+        # forbidden nodes can't be in the separator, so they join X's side
+        z = closest(side)
+        while z is not None and kept <= z and z & problem.forbidden:
+            side = frozenset(_component(H, x, z)) | (z & problem.forbidden)
+            z = closest(side)
+        if z is None or not kept <= z:
+            continue
+        if z <= kept:
+            yield frozenset(z)
+            continue
+        # separators that contain v, and those that put v on X's side
+        v = problem.first(z - kept)
+        stack.append((frozenset(_component(H, x, z)) | {v}, kept))
+        stack.append((side, kept | {v}))
+
+
+def adjustment_sets(G, treatment, outcome, minimal=False, exclude=()):
+    """
+    Lists back-door adjustment sets, with polynomial delay.
+
+    Args:
+        G: networkx DiGraph, e.g. from expr_to_digraph.
+        treatment, outcome: A node or an iterable of nodes.
+        minimal (bool, optional): Only sets none of whose proper subsets is valid.
+            Defaults to False, all valid sets.
+        exclude (optional): Nodes that may not be adjusted for (unobserved ones).
+
+    Yields:
+        frozensets of nodes
+    """
+    problem = _Problem(G, treatment, outcome, exclude)
+    yield from (_minimal_sets(problem) if minimal else _all_sets(problem))
+
+
+def minimal_adjustment_sets(G, treatment, outcome, exclude=()):
+    return adjustment_sets(G, treatment, outcome, minimal=True, exclude=exclude)
+
+
+def _value_names(names) -> dict:
+    # Z -> z, and a distinct name when the lower-case one is taken
+    taken = set(names)
+    values = {}
+    for name in names:
+        value = str(name).lower()
+        while value in taken:
+            value += "_"
+        taken.add(value)
+        values[name] = value
+    return values
+
+
+def adjustment_formula(treatment, outcome, adjustment, expectation=False) -> str:
+    """
+    The back-door adjustment formula in CausalGrammar syntax, e.g.
+    Σ_{z} P(Z=z) * P(Y=y|X=x,Z=z). The joint P(Z) is written with the chain
+    rule so that every term is a single-variable probability.
+
+    Args:
+        treatment, outcome: A node or an iterable of nodes.
+        adjustment: The adjustment set.
+        expectation (bool, optional): Emit E[Y|...] instead of P(Y=y|...). Needs a
+            single outcome. Defaults to False.
+    """
+    xs, ys, zs = (sorted(node_set(None, nodes), key=str) for nodes in (treatment, outcome, adjustment))
+    values = _value_names(xs + ys + zs)
+
+    def assigned(nodes):
+        return ",".join(f"{v}={values[v]}" for v in nodes)
+
+    if expectation:
+        if len(ys) != 1:
+            raise ValueError("expectation=True needs a single outcome")
+        effect = f"E[{ys[0]}|{assigned(xs + zs)}]"
+    else:
+        effect = " * ".join(f"P({y}={values[y]}|{assigned(xs + zs + ys[:i])})" for i, y in enumerate(ys))
+    if not zs:
+        return effect
+    weights = [f"P({z}={values[z]}|{assigned(zs[i + 1:])})" if zs[i + 1:] else f"P({z}={values[z]})"
+               for i, z in enumerate(zs)]
+    return "".join(f"Σ_{{{values[z]}}} " for z in zs) + " * ".join(weights + [effect])
@@ -0,0 +1,246 @@
+"""
+Seeded micro-benchmark suite for the parse, simplify and equivalence hot
+paths, with machine-readable results that can be compared against a stored
+baseline.
+
+Workloads come from the seeded generators in workloads.py, so two runs with
+the same seed time exactly the same inputs.
+
+    python bench_suite.py --output bench.json
+    python bench_suite.py --baseline bench.json --tolerance 0.2
+
+The second command exits with status 1 when a case got slower than the baseline
+by more than the tolerance.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from typing import NamedTuple
+
+import networkx as nx
+
+from markov_equivalence import markov_equivalence
+from normalize_expr import apply_rule_1, apply_rule_2, apply_rule_3, parse_query, simplify_expression
+from probability import CausalProbability
+from syntax_eval import CausalGrammar, LarkParser
+from workloads import random_dag, random_expression, random_query
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# group of cases -> (sweep, quick sweep)
+SWEEPS = {
+    "parse": ((1, 4, 16, 64, 256), (1, 16, 64)),
+    "probability_parse": ((0, 2, 4, 8, 16), (0, 4, 16)),
+    "simplify": (((10, 0.3), (100, 0.05), (1000, 0.005), (1000, 0.02)), ((10, 0.3), (100, 0.05))),
+    "markov_equivalence": (((10, 0.3), (100, 0.05), (1000, 0.005), (10000, 0.0005)), ((10, 0.3), (1000, 0.005))),
+}
+
+
+class CaseResult(NamedTuple):
+    name: str
+    params: dict
+    ops: int
+    best_seconds: float
+    median_seconds: float
+
+    @property
+    def key(self) -> str:
+        return case_key(self.name, self.params)
+
+    @property
+    def us_per_op(self) -> float:
+        return self.best_seconds / self.ops * 1e6
+
+
+def case_key(name: str, params: dict) -> str:
+    return f"{name}[{','.join(f'{k}={v}' for k, v in sorted(params.items()))}]"
+
+
+def _time_case(name: str, params: dict, run, workload: list, repeats: int, setup=None) -> CaseResult:
+    timings = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        for item in workload:
+            run(item)
+        timings.append(time.perf_counter() - start)
+    result = CaseResult(name, params, len(workload), min(timings), statistics.median(timings))
+    print(f"{result.key}: {result.us_per_op:.1f} us/op")
+    return result
+
+
+def bench_parse(sizes, num_expressions: int, repeats: int, seed: int) -> list:
+    parser = LarkParser(CausalGrammar().grammar)
+    results = []
+    for size in sizes:
+        rng = random.Random(f"{seed}:parse:{size}")
+        workload = [random_expression(size, rng) for _ in range(num_expressions)]
+        invalid = [expression for expression in workload if parser.parse(expression) is None]
+        if invalid:
+            raise AssertionError(f"generated expressions don't parse: {invalid[:3]}")
+        results.append(_time_case("LarkParser.parse", {"atoms": size}, parser.parse, workload, repeats))
+    return results
+
+
+def bench_probability_parse(sizes, num_expressions: int, repeats: int, seed: int) -> list:
+    results = []
+    for size in sizes:
+        rng = random.Random(f"{seed}:probability:{size}")
+        G = nx.empty_graph([f"V{i}" for i in range(max(64, size + 1))], create_using=nx.DiGraph)
+        workload = [random_query(G, rng, num_do=size // 2, num_obs=size - size // 2) for _ in range(num_expressions)]
+        # cold cache: every repeat parses every expression
+        results.append(_time_case("CausalProbability.parse", {"conditions": size}, CausalProbability.parse, workload,
+                                  repeats, setup=CausalProbability.cache_clear))
+    return results
+
+
+def bench_simplify(sweep, num_queries: int, repeats: int, seed: int) -> list:
+    functions = {
+        "simplify_expression": lambda G, query: simplify_expression(G, query, cache=None),
+        "apply_rule_1": apply_rule_1,
+        "apply_rule_2": apply_rule_2,
+        "apply_rule_3": apply_rule_3,
+    }
+    results = []
+    for num_nodes, density in sweep:
+        G = random_dag(num_nodes, density, seed)
+        rng = random.Random(f"{seed}:simplify:{num_nodes}:{density}")
+        workload = [random_query(G, rng) for _ in range(num_queries)]
+        params = {"nodes": num_nodes, "density": density}
+        for name, function in functions.items():
+            results.append(_time_case(name, params, lambda query: function(G, query), workload, repeats,
+                                      setup=parse_query.cache_clear))
+    return results
+
+
+def bench_markov_equivalence(sweep, num_pairs: int, repeats: int, seed: int) -> list:
+    results = []
+    for num_nodes, density in sweep:
+        rng = random.Random(f"{seed}:markov:{num_nodes}:{density}")
+        workload = []
+        for i in range(num_pairs):
+            G = random_dag(num_nodes, density, seed=rng.randrange(1 << 30))
+            # the same graph built in another order, or one edge reversed
+            H = nx.DiGraph()
+            H.add_nodes_from(reversed(list(G)))
+            H.add_edges_from(reversed(list(G.edges)))
+            if i % 2 and H.number_of_edges():
+                u, v = rng.choice(list(G.edges))
+                H.remove_edge(u, v)
+                H.add_edge(v, u)
+            workload.append((G, H))
+        results.append(_time_case("markov_equivalence", {"nodes": num_nodes, "density": density},
+                                  lambda pair: markov_equivalence(*pair), workload, repeats))
+    return results
+
+
+def run_suite(quick: bool = False, repeats: int = 5, seed: int = 0, only=None) -> dict:
+    """
+    Runs every group of cases (or the groups named in only) and returns the
+    results with the environment they ran in, ready for json.dump.
+
+    Args:
+        quick (bool, optional): Smaller sweeps and workloads. Defaults to False.
+        repeats (int, optional): Timed passes per case, the best is kept. Defaults to 5.
+        seed (int, optional): Seed of every generator. Defaults to 0.
+        only (optional): Group names from SWEEPS. Defaults to all of them.
+    """
+    scale = 4 if quick else 1
+    groups = {
+        "parse": lambda sweep: bench_parse(sweep, 200 // scale, repeats, seed),
+        "probability_parse": lambda sweep: bench_probability_parse(sweep, 2000 // scale, repeats, seed),
+        "simplify": lambda sweep: bench_simplify(sweep, 200 // scale, repeats, seed),
+        "markov_equivalence": lambda sweep: bench_markov_equivalence(sweep, 20 // scale, repeats, seed),
+    }
+    results = []
+    for group, (sweep, quick_sweep) in SWEEPS.items():
+        if only is None or group in only:
+            results += groups[group](quick_sweep if quick else sweep)
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(), "commit": commit,
+                 "created": time.time(), "seed": seed, "quick": quick, "repeats": repeats},
+        "results": [dict(result._asdict(), key=result.key, us_per_op=result.us_per_op) for result in results],
+    }
+
+
+class Comparison(NamedTuple):
+    key: str
+    baseline_us: float
+    current_us: float
+    status: str  # "faster", "slower", "same", "new" or "missing"
+
+    @property
+    def ratio(self):
+        if self.baseline_us is None or self.current_us is None:
+            return None
+        return self.current_us / self.baseline_us
+
+
+def compare(current: dict, baseline: dict, tolerance: float = 0.2) -> list:
+    """
+    Matches cases by key and compares their best us/op. A case is slower or
+    faster when the ratio is beyond 1 + tolerance either way.
+    """
+    before = {result["key"]: result["us_per_op"] for result in baseline["results"]}
+    after = {result["key"]: result["us_per_op"] for result in current["results"]}
+    comparisons = []
+    for key in list(after) + [key for key in before if key not in after]:
+        if key not in before:
+            status = "new"
+        elif key not in after:
+            status = "missing"
+        elif after[key] > before[key] * (1 + tolerance):
+            status = "slower"
+        elif after[key] * (1 + tolerance) < before[key]:
+            status = "faster"
+        else:
+            status = "same"
+        comparisons.append(Comparison(key, before.get(key), after.get(key), status))
+    return comparisons
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seeded benchmarks of parse, simplify and equivalence.")
+    parser.add_argument("--output", default=None, help="write the results as JSON")
+    parser.add_argument("--baseline", default=None, help="results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--quick", action="store_true")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", default=None, help=f"comma-separated groups of {', '.join(SWEEPS)}")
+    args = parser.parse_args()
+
+    results = run_suite(quick=args.quick, repeats=args.repeats, seed=args.seed,
+                        only=args.only.split(",") if args.only else None)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline is None:
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["meta"]["seed"] != args.seed or baseline["meta"]["quick"] != args.quick:
+        print("warning: the baseline was run with a different seed or sweep")
+    comparisons = compare(results, baseline, args.tolerance)
+    for comparison in comparisons:
+        ratio = f"{comparison.ratio:.2f}x" if comparison.ratio is not None else "-"
+        print(f"{comparison.status:>7} {ratio:>7} {comparison.key}")
+    if any(comparison.status == "slower" for comparison in comparisons):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
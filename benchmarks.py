@@ -0,0 +1,656 @@
+"""
+Throughput benchmarks for the pipeline stages. Everything here runs on a
+CPU-only box with local stand-ins, no downloads or logins.
+
+Usage: python benchmarks.py
+"""
+
+import itertools
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import networkx as nx
+
+import instrumentation
+from adjustment import adjustment_sets
+from bulk_generate import bulk_generate
+from dataset_writer import DatasetWriter
+from dseparation import MutilatedGraph
+from evaluate import evaluate_dataset
+from graph_batch import GraphBatch
+from identification import identify
+from markov_equivalence import equivalence_classes, get_skeleton_edges, get_v_structures, markov_equivalence
+from normalize_expr import SimplifyCache, parse_query, rewrite_cost, search_simplify, simplify_expression
+from generate_pairs import (
+    GenerationBackend, generate_batched, sample_rows, build_question_prompt,
+    PROMPT_PREFIX, VARIABLES, TEMPLATES, MATH_EXPRESSIONS,
+)
+from probability import CausalProbability, _parse_uncached
+from result_cache import ResultCache
+from syntax_eval import CausalGrammar, LarkParser, emit_standalone
+from workloads import random_dag, random_query, sparse_density
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def bench_generation(num_prompts: int = 64, batch_sizes=(1, 8, 32), max_new_tokens: int = 32):
+    """
+    Prompts/sec and generated tokens/sec of the stand-in model across batch sizes.
+    """
+    rows = sample_rows(num_prompts, VARIABLES, TEMPLATES, MATH_EXPRESSIONS)
+    prompts = [build_question_prompt(question) for question, _ in rows]
+    results = []
+    for batch_size in batch_sizes:
+        backend = GenerationBackend.tiny_random()
+        start = time.perf_counter()
+        # no stop sequences so every batch size does the same amount of work
+        generate_batched(backend, prompts, batch_size=batch_size, max_new_tokens=max_new_tokens, stop=[],
+                         prefix=PROMPT_PREFIX, prefix_cache=False)
+        elapsed = time.perf_counter() - start
+        result = {
+            "batch_size": batch_size,
+            "seconds": elapsed,
+            "prompts_per_sec": num_prompts / elapsed,
+            "tokens_per_sec": backend.stats["generated_tokens"] / elapsed,
+        }
+        print(f"generation batch_size={batch_size}: {result['prompts_per_sec']:.1f} prompts/s, "
+              f"{result['tokens_per_sec']:.1f} tokens/s")
+        results.append(result)
+    return results
+
+
+def bench_prefix_cache(num_prompts: int = 64, batch_size: int = 16, max_new_tokens: int = 16):
+    """
+    Tokens/sec with and without reusing the KV cache of PROMPT_PREFIX. Prompt
+    tokens count the full prompt in both modes, so the numbers are comparable.
+    """
+    rows = sample_rows(num_prompts, VARIABLES, TEMPLATES, MATH_EXPRESSIONS)
+    prompts = [build_question_prompt(question) for question, _ in rows]
+    results = []
+    for prefix_cache in (False, True):
+        backend = GenerationBackend.tiny_random()
+        start = time.perf_counter()
+        outputs = generate_batched(backend, prompts, batch_size=batch_size, max_new_tokens=max_new_tokens, stop=[],
+                                   prefix=PROMPT_PREFIX, prefix_cache=prefix_cache)
+        elapsed = time.perf_counter() - start
+        prefix_tokens = len(backend.tokenizer.encode(PROMPT_PREFIX))
+        prompt_tokens = backend.stats["prompt_tokens"] + (num_prompts * prefix_tokens if prefix_cache else 0)
+        total_tokens = prompt_tokens + backend.stats["generated_tokens"]
+        result = {
+            "prefix_cache": prefix_cache,
+            "seconds": elapsed,
+            "tokens_per_sec": total_tokens / elapsed,
+            "generated_tokens_per_sec": backend.stats["generated_tokens"] / elapsed,
+            "outputs": outputs,
+        }
+        print(f"prefix_cache={prefix_cache}: {result['tokens_per_sec']:.1f} tokens/s "
+              f"({result['generated_tokens_per_sec']:.1f} generated tokens/s)")
+        results.append(result)
+    if results[0]["outputs"] != results[1]["outputs"]:
+        print("warning: cached and uncached outputs differ")
+    return results
+
+
+def bench_bulk_generation(num_rows: int = 1_000_000):
+    """
+    Rows/minute of the LLM-free bulk generator, including the Parquet write.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        written = bulk_generate(os.path.join(tmp, "bulk.parquet"), num_rows=num_rows)
+        elapsed = time.perf_counter() - start
+    result = {"rows": written, "seconds": elapsed, "rows_per_min": written / elapsed * 60}
+    print(f"bulk generation: {written} rows in {elapsed:.2f}s ({result['rows_per_min']:,.0f} rows/min)")
+    return result
+
+
+_COLD_START = """
+import time
+start = time.perf_counter()
+from syntax_eval import CausalGrammar, LarkParser
+imported = time.perf_counter()
+parser = {construct}
+print(imported - start, time.perf_counter() - imported)
+"""
+
+
+def bench_parser_cold_start(repeats: int = 5):
+    """
+    LarkParser construction time in a fresh interpreter: compiling the grammar,
+    loading cached LALR tables, and loading a generated standalone module.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        grammar = CausalGrammar().grammar
+        LarkParser(grammar, cache_dir=tmp)  # warm the table cache
+        module_path = os.path.join(tmp, "causal_grammar_standalone.py")
+        emit_standalone(grammar, module_path)
+        modes = {
+            "compile": "LarkParser(CausalGrammar().grammar)",
+            "cache": f"LarkParser(CausalGrammar().grammar, cache_dir={tmp!r})",
+            "standalone": f"LarkParser.from_standalone({module_path!r})",
+        }
+        for mode, construct in modes.items():
+            import_times, construct_times = [], []
+            for _ in range(repeats):
+                out = subprocess.run([sys.executable, "-c", _COLD_START.format(construct=construct)],
+                                     cwd=REPO_DIR, capture_output=True, text=True, check=True)
+                import_time, construct_time = map(float, out.stdout.split()[-2:])
+                import_times.append(import_time)
+                construct_times.append(construct_time)
+            result = {
+                "mode": mode,
+                "import_seconds": statistics.median(import_times),
+                "construct_seconds": statistics.median(construct_times),
+            }
+            print(f"parser cold start {mode}: construct {result['construct_seconds'] * 1000:.1f} ms "
+                  f"(import {result['import_seconds'] * 1000:.1f} ms)")
+            results.append(result)
+    return results
+
+
+# module -> (import budget in seconds, modules the import must not pull in)
+IMPORT_BUDGETS = {
+    "normalize_expr": (0.5, ("matplotlib", "sympy", "torch", "transformers")),
+    "causal_equiv": (1.0, ("matplotlib", "torch", "transformers")),
+    "generate_pairs": (0.3, ("torch", "transformers", "huggingface_hub", "pandas")),
+}
+
+_IMPORT_CHECK = """
+import sys
+import {module}
+print(" ".join(sorted(m for m in {heavy!r} if m in sys.modules)))
+"""
+
+
+def bench_import_time(budgets=IMPORT_BUDGETS, repeats: int = 5):
+    """
+    Cumulative `python -X importtime` of the modules workers import, median over
+    fresh interpreters. A module over its budget or loading a heavy dependency
+    at import time is reported as a regression.
+    """
+    results = []
+    for module, (budget, heavy) in budgets.items():
+        times = []
+        for _ in range(repeats):
+            code = _IMPORT_CHECK.format(module=module, heavy=heavy)
+            out = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                                 cwd=REPO_DIR, capture_output=True, text=True, check=True)
+            # stderr lines read "import time: self [us] | cumulative [us] | name"
+            cumulative = [int(line.split("|")[1]) for line in out.stderr.splitlines()
+                          if line.startswith("import time:") and line.split("|")[2].strip() == module]
+            times.append(cumulative[-1] / 1e6)
+        loaded = out.stdout.split()
+        seconds = statistics.median(times)
+        result = {"module": module, "seconds": seconds, "budget_seconds": budget, "loaded": loaded,
+                  "regressed": seconds > budget or bool(loaded)}
+        print(f"import {module}: {seconds * 1000:.1f} ms (budget {budget * 1000:.0f} ms)"
+              + (f", loaded {', '.join(loaded)}" if loaded else ""))
+        if result["regressed"]:
+            print(f"warning: import {module} regressed")
+        results.append(result)
+    return results
+
+
+def long_expression(num_terms: int) -> str:
+    """
+    An adjustment-style sum with num_terms products, like the Σ formulas in syntax_eval.main.
+    """
+    terms = [f"P(X{i}=x|T=0)*(E[Y|T=1,X{i}=x] - E[Y|T=0,X{i}=x])" for i in range(num_terms)]
+    return "Σ_{x} " + " + ".join(terms)
+
+
+def bench_parse_scaling(sizes=(50, 100, 200, 400, 800), repeats: int = 3):
+    """
+    Parse time of LarkParser on long expressions. With the conflict-free
+    LALR grammar the time per term should stay flat as the expression grows.
+    """
+    parser = LarkParser(CausalGrammar().grammar)
+    results = []
+    for size in sizes:
+        expression = long_expression(size)
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            assert parser.parse(expression) is not None
+            timings.append(time.perf_counter() - start)
+        elapsed = min(timings)
+        result = {"terms": size, "chars": len(expression), "seconds": elapsed, "us_per_term": elapsed / size * 1e6}
+        print(f"parse {size} terms ({len(expression)} chars): {elapsed * 1000:.1f} ms, "
+              f"{result['us_per_term']:.1f} us/term")
+        results.append(result)
+    growth = results[-1]["us_per_term"] / results[0]["us_per_term"]
+    print(f"per-term time grew {growth:.2f}x from {sizes[0]} to {sizes[-1]} terms")
+    return results
+
+
+def probability_workload(num_expressions: int, num_distinct: int = 5000, seed: int = 0) -> list:
+    """
+    P(Y|do(...),...) strings with Zipf-distributed repeats, the way a few
+    common forms dominate LLM output, and irregular spacing.
+    """
+    rng = random.Random(seed)
+    names = [f"X{i}" for i in range(40)] + ["Y", "Z", "W", "T"]
+    pool = []
+    for _ in range(num_distinct):
+        outcome, *rest = rng.sample(names, 1 + rng.randint(0, 4))
+        num_do = rng.randint(0, len(rest))
+        conditions = [f"do({v})" for v in rest[:num_do]] + rest[num_do:]
+        sep = rng.choice([",", ", "])
+        pool.append(f"P({outcome} | {sep.join(conditions)})" if conditions else f"P({outcome})")
+    weights = [1 / (rank + 1) for rank in range(num_distinct)]
+    return rng.choices(pool, weights=weights, k=num_expressions)
+
+
+def bench_probability_parse(num_expressions: int = 1_000_000, uncached_sample: int = 20000):
+    """
+    CausalProbability.parse with its LRU cache over a repeat-heavy workload,
+    against the uncached path on a sample.
+    """
+    workload = probability_workload(num_expressions)
+    CausalProbability.cache_clear()
+    start = time.perf_counter()
+    for expression in workload:
+        CausalProbability.parse(expression)
+    cached = time.perf_counter() - start
+    info = CausalProbability.cache_info()
+
+    start = time.perf_counter()
+    for expression in workload[:uncached_sample]:
+        _parse_uncached(CausalProbability, "".join(expression.split()))
+    uncached = (time.perf_counter() - start) / uncached_sample * num_expressions
+
+    result = {
+        "expressions": num_expressions,
+        "cached_seconds": cached,
+        "uncached_seconds_estimated": uncached,
+        "hit_rate": info.hits / (info.hits + info.misses),
+    }
+    print(f"CausalProbability.parse x{num_expressions}: {cached:.2f}s cached "
+          f"(hit rate {result['hit_rate']:.1%}), ~{uncached:.1f}s uncached")
+    return result
+
+
+def bench_mutilated_dsep(sizes=(10, 100, 1000, 5000), num_candidates: int = 20, seed: int = 0):
+    """
+    One rule-2 style d-separation test per candidate Z (arrows into X and out of Z
+    removed), copying the graph each time as the rules used to, against
+    MutilatedGraph edge masks.
+    """
+    results = []
+    for n in sizes:
+        G = random_dag(n, sparse_density(n), seed)
+        rng = random.Random(seed)
+        nodes = rng.sample(list(G), min(n, num_candidates + 3))
+        y, x, w, candidates = nodes[0], nodes[1], nodes[2], nodes[3:]
+
+        start = time.perf_counter()
+        copied = []
+        for z in candidates:
+            H = G.copy()
+            H.remove_edges_from([(u, v) for v in (x, z) for u in G.predecessors(v)])
+            H.remove_edges_from(list(H.out_edges(z)))
+            copied.append(nx.is_d_separator(H, {y}, {z}, {x, w}))
+        copy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        masked = [MutilatedGraph(G, cut_incoming=(x, z), cut_outgoing=(z,)).is_d_separator({y}, {z}, {x, w})
+                  for z in candidates]
+        mask_time = time.perf_counter() - start
+        assert copied == masked
+
+        results.append({"nodes": n, "candidates": len(candidates), "copy_seconds": copy_time, "mask_seconds": mask_time})
+        print(f"d-separation, {n} nodes x{len(candidates)} candidates: "
+              f"{copy_time * 1e3:.2f}ms with copies, {mask_time * 1e3:.2f}ms with edge masks")
+    return results
+
+
+def bench_simplify_cache(num_expressions: int = 20000, num_graphs: int = 30, num_distinct: int = 2000, seed: int = 0):
+    """
+    simplify_expression over a workload that reuses a few dozen graphs and has
+    Zipf-distributed repeats, with and without the memo cache. Graphs are rebuilt
+    per expression, as an eval loop would, so hits come from the fingerprint.
+    """
+    rng = random.Random(seed)
+    graphs = [random_dag(12, sparse_density(12), seed + i) for i in range(num_graphs)]
+    pool = []
+    for _ in range(num_distinct):
+        G = rng.choice(graphs)
+        num_conditions = rng.randint(1, 4)
+        num_do = rng.randint(0, num_conditions)
+        pool.append((list(G.edges), random_query(G, rng, num_do, num_conditions - num_do)))
+    weights = [1 / (rank + 1) for rank in range(num_distinct)]
+    workload = []
+    for edges, expression in rng.choices(pool, weights=weights, k=num_expressions):
+        G = nx.DiGraph()
+        G.add_nodes_from(f"V{i}" for i in range(12))
+        G.add_edges_from(rng.sample(edges, len(edges)))
+        workload.append((G, expression))
+
+    timings = {}
+    cache = SimplifyCache()
+    for name, kwargs in (("uncached", {"cache": None}), ("cached", {"cache": cache})):
+        start = time.perf_counter()
+        for G, expression in workload:
+            simplify_expression(G, expression, **kwargs)
+        timings[name] = time.perf_counter() - start
+    info = cache.info()
+    result = {"expressions": num_expressions, **{f"{k}_seconds": v for k, v in timings.items()}, **info._asdict()}
+    print(f"simplify_expression x{num_expressions}: {timings['uncached']:.2f}s uncached, "
+          f"{timings['cached']:.2f}s cached ({info.hits} hits, {info.misses} misses)")
+    return result
+
+
+def bench_identification(sizes=(10, 100, 1000, 5000), num_queries: int = 20, seed: int = 0):
+    """
+    ID algorithm latency on random DAGs with one bidirected edge per ten nodes.
+    """
+    results = []
+    for n in sizes:
+        G = random_dag(n, sparse_density(n), seed)
+        rng = random.Random(seed)
+        nodes = list(G)
+        bidirected = [rng.sample(nodes, 2) for _ in range(max(1, n // 10))]
+        identified = 0
+        start = time.perf_counter()
+        for _ in range(num_queries):
+            y, x = rng.sample(nodes, 2)
+            identified += identify(G, [y], [x], bidirected=bidirected).identifiable
+        elapsed = time.perf_counter() - start
+        results.append({"nodes": n, "queries": num_queries, "identified": identified, "seconds": elapsed})
+        print(f"identify, {n} nodes: {elapsed / num_queries * 1e3:.2f}ms per query, "
+              f"{identified}/{num_queries} identifiable")
+    return results
+
+
+def bench_rewrite_search(sizes=(10, 50, 200), num_queries: int = 50, seed: int = 0):
+    """
+    Cost of the greedy rule loop's result against best-first search, with the
+    search statistics.
+    """
+    results = []
+    for n in sizes:
+        G = random_dag(n, sparse_density(n), seed)
+        rng = random.Random(seed)
+        improved = expansions = table_hits = 0
+        greedy_time = search_time = 0.0
+        for _ in range(num_queries):
+            num_conditions = rng.randint(1, 4)
+            num_do = rng.randint(0, num_conditions)
+            expression = random_query(G, rng, num_do, num_conditions - num_do)
+            start = time.perf_counter()
+            greedy = simplify_expression(G, expression, cache=None)
+            greedy_time += time.perf_counter() - start
+            start = time.perf_counter()
+            searched = search_simplify(G, expression, max_expansions=500, max_seconds=0.2)
+            search_time += time.perf_counter() - start
+            improved += searched.cost < rewrite_cost(parse_query(greedy))
+            expansions += searched.stats.expansions
+            table_hits += searched.stats.table_hits
+        results.append({"nodes": n, "queries": num_queries, "improved": improved, "expansions": expansions,
+                        "table_hits": table_hits, "greedy_seconds": greedy_time, "search_seconds": search_time})
+        print(f"rewrite search, {n} nodes: {improved}/{num_queries} cheaper than greedy, "
+              f"{expansions} expansions, {table_hits} table hits, {greedy_time:.2f}s greedy vs {search_time:.2f}s search")
+    return results
+
+
+def bench_instrumentation(num_nodes: int = 50, num_queries: int = 500, repeats: int = 3, seed: int = 0):
+    """
+    Uncached simplify_expression with instrumentation off and inside
+    instrumentation.record(), plus the counters of the recorded run.
+    """
+    G = random_dag(num_nodes, sparse_density(num_nodes), seed)
+    rng = random.Random(seed)
+    workload = []
+    for _ in range(num_queries):
+        num_conditions = rng.randint(1, 4)
+        num_do = rng.randint(0, num_conditions)
+        workload.append(random_query(G, rng, num_do, num_conditions - num_do))
+
+    def run():
+        start = time.perf_counter()
+        for expression in workload:
+            simplify_expression(G, expression, cache=None)
+        return time.perf_counter() - start
+
+    off = min(run() for _ in range(repeats))
+    timings = []
+    for _ in range(repeats):
+        with instrumentation.record() as recorder:
+            timings.append(run())
+    on = min(timings)
+    result = {"queries": num_queries, "off_seconds": off, "on_seconds": on, "overhead": on / off - 1,
+              "counts": dict(recorder.counts), "traces": len(recorder.traces)}
+    print(f"instrumentation, {num_queries} queries: {off:.2f}s off, {on:.2f}s recording "
+          f"({result['overhead']:+.1%}), {recorder.counts['d_separation']} d-separation traversals, "
+          f"{recorder.counts['fixpoint_iterations']} fixpoint iterations")
+    return result
+
+
+def bench_adjustment_sets(sizes=(100, 300, 1000), max_sets: int = 100, seed: int = 0):
+    """
+    Delay of back-door adjustment set enumeration: time per listed set for the
+    first max_sets sets, all valid and minimal, treatment and outcome picked
+    mid-graph so there are back-door paths to block.
+    """
+    results = []
+    for n in sizes:
+        G = random_dag(n, sparse_density(n), seed)
+        order = list(nx.topological_sort(G))
+        treatment, outcome = order[n // 2], order[n // 2 + n // 10]
+        row = {"nodes": n}
+        for minimal in (False, True):
+            start = time.perf_counter()
+            count = sum(1 for _ in itertools.islice(adjustment_sets(G, treatment, outcome, minimal=minimal), max_sets))
+            elapsed = time.perf_counter() - start
+            label = "minimal" if minimal else "valid"
+            row[f"{label}_sets"] = count
+            row[f"{label}_seconds"] = elapsed
+            print(f"adjustment sets, {n} nodes: {count} {label} in {elapsed:.2f}s "
+                  f"({elapsed / max(count, 1) * 1e3:.1f}ms per set)")
+        results.append(row)
+    return results
+
+
+def bench_markov_equivalence(sizes=(100, 1000, 10000), isomorphism_max_nodes: int = 1000, seed: int = 0):
+    """
+    markov_equivalence on a random DAG against a copy built in another order,
+    the worst case since nothing exits early. The unlabeled skeleton
+    isomorphism test it replaced is timed up to isomorphism_max_nodes.
+    """
+    results = []
+    for n in sizes:
+        G1 = random_dag(n, sparse_density(n, 3), seed)
+        G2 = nx.DiGraph()
+        G2.add_nodes_from(reversed(list(G1.nodes)))
+        G2.add_edges_from(reversed(list(G1.edges)))
+        start = time.perf_counter()
+        assert markov_equivalence(G1, G2)
+        labeled = time.perf_counter() - start
+        row = {"nodes": n, "edges": G1.number_of_edges(), "seconds": labeled}
+        line = f"markov_equivalence, {n} nodes: {labeled * 1e3:.1f}ms"
+        if n <= isomorphism_max_nodes:
+            start = time.perf_counter()
+            nx.is_isomorphic(G1.to_undirected(), G2.to_undirected())
+            row["isomorphism_seconds"] = time.perf_counter() - start
+            line += f", skeleton isomorphism alone {row['isomorphism_seconds'] * 1e3:.1f}ms"
+        results.append(row)
+        print(line)
+    return results
+
+
+def bench_equivalence_classes(num_graphs: int = 2000, num_nodes: int = 20, num_gold: int = 50, seed: int = 0):
+    """
+    Grouping a batch of predicted graphs by Markov equivalence class with
+    CPDAG hashes, against pairwise markov_equivalence calls against every gold
+    graph. Predictions are gold graphs with random covered edges reversed,
+    so most of them fall into a gold class.
+    """
+    rng = random.Random(seed)
+    gold = [random_dag(num_nodes, sparse_density(num_nodes), seed + i) for i in range(num_gold)]
+    predictions = []
+    for _ in range(num_graphs):
+        G = rng.choice(gold).copy()
+        for u, v in rng.sample(list(G.edges), min(3, G.number_of_edges())):
+            # reversing a covered edge keeps the class
+            if set(G.predecessors(v)) - {u} == set(G.predecessors(u)):
+                G.remove_edge(u, v)
+                G.add_edge(v, u)
+        predictions.append(G)
+
+    start = time.perf_counter()
+    pairwise = [next((j for j, H in enumerate(gold) if markov_equivalence(G, H)), None) for G in predictions]
+    pairwise_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    classes = equivalence_classes(gold + predictions)
+    hashed_time = time.perf_counter() - start
+    matched = sum(1 for members in classes.values() for i in members if i >= num_gold and members[0] < num_gold)
+    assert matched == sum(j is not None for j in pairwise)
+
+    print(f"equivalence classes, {num_graphs} graphs x {num_gold} gold: {pairwise_time:.2f}s pairwise, "
+          f"{hashed_time:.2f}s hashed, {len(classes)} classes")
+    return {"graphs": num_graphs, "gold": num_gold, "pairwise_seconds": pairwise_time,
+            "hashed_seconds": hashed_time, "classes": len(classes)}
+
+
+def bench_graph_batch(num_graphs: int = 100_000, num_nodes: int = 8, seed: int = 0):
+    """
+    Acyclicity, skeletons, v-structures, ancestor closure and pairwise Markov
+    equivalence over many small graphs: per-graph networkx calls against one
+    GraphBatch. Half of the second batch has one edge reversed.
+    """
+    rng = random.Random(seed)
+    graphs, others = [], []
+    for i in range(num_graphs):
+        G = random_dag(num_nodes, sparse_density(num_nodes, 1), seed + i)
+        graphs.append(G)
+        H = G.copy()
+        if H.number_of_edges() and rng.random() < 0.5:
+            u, v = rng.choice(list(H.edges))
+            H.remove_edge(u, v)
+            H.add_edge(v, u)
+        others.append(H)
+
+    start = time.perf_counter()
+    for G, H in zip(graphs, others):
+        nx.is_directed_acyclic_graph(G)
+        get_skeleton_edges(G)
+        get_v_structures(G)
+        for v in G:
+            nx.ancestors(G, v)
+        markov_equivalence(G, H)
+    networkx_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = GraphBatch.from_graphs(graphs)
+    other = GraphBatch.from_graphs(others, nodes=batch.nodes)
+    convert_time = time.perf_counter() - start
+    start = time.perf_counter()
+    batch.is_acyclic()
+    batch.skeletons()
+    batch.count_v_structures()
+    batch.ancestor_closure()
+    batch.markov_equivalent(other)
+    batch_time = time.perf_counter() - start
+
+    result = {"graphs": num_graphs, "nodes": num_nodes, "networkx_seconds": networkx_time,
+              "convert_seconds": convert_time, "batch_seconds": batch_time, "packed_bytes": batch.packed.nbytes}
+    print(f"graph checks x{num_graphs} ({num_nodes} nodes): {networkx_time:.2f}s networkx, "
+          f"{batch_time:.2f}s batched (+{convert_time:.2f}s conversion), {batch.packed.nbytes / 1e6:.1f}MB packed")
+    return result
+
+
+def evaluation_workload(num_rows: int, seed: int = 0) -> list:
+    """
+    (question, y_true, y_pred) rows as generate_questions writes them, with
+    y_pred a copy of y_true, a respaced or reordered variant, or a broken one.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for question, y_true in sample_rows(num_rows, VARIABLES, TEMPLATES, MATH_EXPRESSIONS, seed=seed):
+        y_pred = rng.choice([
+            y_true,
+            # spaces around symbols only, multi-word names keep theirs
+            re.sub(r"\s*([^\w\s])\s*", r"\1", y_true),
+            " + ".join(reversed(y_true.split(" - "))),
+            y_true.replace("do(", "("),
+            y_true[:-rng.randint(1, 5)],
+        ])
+        rows.append((question, y_true, y_pred))
+    return rows
+
+
+def bench_evaluation(num_rows: int = 50000, processes=(0, None), seed: int = 0):
+    """
+    Rows/sec of evaluate_dataset from a csv on disk to per-row results, in this
+    process and on a pool of os.cpu_count() workers, with per-stage times.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, "dataset.csv")
+        with DatasetWriter(input_path, ["Natural Language Question", "y_true", "y_pred"], resume=False) as writer:
+            writer.write(evaluation_workload(num_rows, seed))
+        for count in processes:
+            report = evaluate_dataset(input_path, os.path.join(tmp, "evaluation.csv"), processes=count)
+            result = {"processes": count if count is not None else os.cpu_count(), "rows": report.rows,
+                      "seconds": report.wall_seconds, "rows_per_sec": report.rows_per_sec,
+                      "stage_seconds": report.stage_seconds}
+            stages = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in report.stage_seconds.items())
+            print(f"evaluation processes={result['processes']}: {report.rows_per_sec:.0f} rows/s ({stages})")
+            results.append(result)
+    return results
+
+
+def bench_result_cache(num_rows: int = 50000, changed: float = 0.1, seed: int = 0):
+    """
+    Incremental re-evaluation: a cold run that fills a ResultCache, then a run
+    over the same dataset with a fraction of y_pred regenerated.
+    """
+    rng = random.Random(seed)
+    rows = evaluation_workload(num_rows, seed)
+    rerun = [(question, y_true, y_pred + " + 0" if rng.random() < changed else y_pred)
+             for question, y_true, y_pred in rows]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp, ResultCache(os.path.join(tmp, "results.sqlite")) as cache:
+        for name, dataset in (("cold", rows), ("rerun", rerun)):
+            input_path = os.path.join(tmp, f"{name}.csv")
+            with DatasetWriter(input_path, ["Natural Language Question", "y_true", "y_pred"], resume=False) as writer:
+                writer.write(dataset)
+            report = evaluate_dataset(input_path, os.path.join(tmp, "evaluation.csv"), processes=0, cache=cache)
+            result = {"run": name, "rows": report.rows, "seconds": report.wall_seconds,
+                      "hit_rate": report.cache.hit_rate, "cache_seconds": report.stage_seconds["cache"]}
+            print(f"result cache {name}: {report.wall_seconds:.2f}s, {report.cache.hit_rate:.1%} hits "
+                  f"({report.stage_seconds['cache']:.2f}s in the cache)")
+            results.append(result)
+    return results
+
+
+def main():
+    bench_generation()
+    bench_prefix_cache()
+    bench_bulk_generation()
+    bench_parser_cold_start()
+    bench_import_time()
+    bench_parse_scaling()
+    bench_probability_parse()
+    bench_mutilated_dsep()
+    bench_simplify_cache()
+    bench_identification()
+    bench_rewrite_search()
+    bench_instrumentation()
+    bench_adjustment_sets()
+    bench_markov_equivalence()
+    bench_equivalence_classes()
+    bench_graph_batch()
+    bench_evaluation()
+    bench_result_cache()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+LLM-free bulk generation of (question, y_true) pairs for parser and normalizer
+load tests. Templates are compiled once into plans of literal pieces and
+placeholder slots, then whole batches of rows are rendered with NumPy array
+ops and written straight to Parquet.
+"""
+
+import re
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from generate_pairs import VARIABLES, TEMPLATES, MATH_EXPRESSIONS
+
+# placeholder -> slot: treatment, outcome, held-constant variable, its value
+PLACEHOLDERS = {"Δ": 0, "Γ": 1, "Λ": 2, "λ": 3}
+
+_FORMAT_FIELD = re.compile(r"\{(Δ|Γ|Λ|λ)\}")
+_BARE_FIELD = re.compile(r"(Δ|Γ|Λ|λ)")
+
+
+def compile_plan(template: str, bare: bool = False) -> list:
+    """
+    Splits a template into a list of literal strings and slot indices.
+
+    Args:
+        template (str): A question template ("{Δ}" fields) or a math expression
+            (bare placeholders, literal braces)
+        bare (bool, optional): Treat placeholders as bare characters. Defaults to False.
+    """
+    parts = (_BARE_FIELD if bare else _FORMAT_FIELD).split(template)
+    # re.split puts the captured placeholders at the odd positions
+    return [PLACEHOLDERS[part] if i % 2 else part for i, part in enumerate(parts) if part or i % 2]
+
+
+def render(plan: list, slots: list):
+    """
+    Renders one plan for a batch of rows.
+
+    Args:
+        plan (list): Output of compile_plan
+        slots (list): One object array of strings per slot, all of the batch length
+    """
+    out = np.full(len(slots[0]), "", dtype=object)
+    for piece in plan:
+        out = out + (slots[piece] if isinstance(piece, int) else piece)
+    return out
+
+
+def iter_bulk_batches(variables: list = VARIABLES, templates: list = TEMPLATES, math_expressions: list = MATH_EXPRESSIONS,
+                      num_rows: int = None, lambda_range: tuple = (0, 188), batch_size: int = 1 << 18, seed: int = 0):
+    """
+    Yields (questions, y_true) object arrays batch by batch.
+
+    Args:
+        num_rows (int, optional): Rows to sample with replacement. Defaults to None,
+            the full templates x variables x lambda cartesian product in order.
+        lambda_range (tuple, optional): Inclusive range of λ values. Defaults to (0, 188),
+            the range sample_rows draws from.
+        batch_size (int, optional): Rows per batch. Defaults to 262144.
+        seed (int, optional): Seed for sampled mode. Defaults to 0.
+    """
+    assert len(templates) == len(math_expressions)
+    question_plans = [compile_plan(t) for t in templates]
+    expression_plans = [compile_plan(e, bare=True) for e in math_expressions]
+    names = np.array(variables, dtype=object)
+    lambdas = np.array([str(v) for v in range(lambda_range[0], lambda_range[1] + 1)], dtype=object)
+    shape = (len(templates), len(variables), len(lambdas))
+    total = int(np.prod(shape)) if num_rows is None else num_rows
+    rng = np.random.default_rng(seed)
+
+    for start in range(0, total, batch_size):
+        n = min(batch_size, total - start)
+        if num_rows is None:
+            template_idx, variable_idx, lambda_idx = np.unravel_index(np.arange(start, start + n), shape)
+        else:
+            template_idx = rng.integers(0, shape[0], n)
+            variable_idx = rng.integers(0, shape[1], n)
+            lambda_idx = rng.integers(0, shape[2], n)
+
+        questions = np.empty(n, dtype=object)
+        expressions = np.empty(n, dtype=object)
+        for t in range(len(templates)):
+            rows = np.flatnonzero(template_idx == t)
+            if not len(rows):
+                continue
+            chosen = names[variable_idx[rows]]
+            slots = [chosen[:, 0], chosen[:, 1], chosen[:, 2], lambdas[lambda_idx[rows]]]
+            questions[rows] = render(question_plans[t], slots)
+            expressions[rows] = render(expression_plans[t], slots)
+        yield questions, expressions
+
+
+def bulk_generate(output_path: str, variables: list = VARIABLES, templates: list = TEMPLATES,
+                  math_expressions: list = MATH_EXPRESSIONS, num_rows: int = None,
+                  lambda_range: tuple = (0, 188), batch_size: int = 1 << 18, seed: int = 0) -> int:
+    """
+    Writes generated pairs to a Parquet file, one row group per batch.
+    Takes the same arguments as iter_bulk_batches.
+
+    Returns:
+        Number of rows written
+    """
+    schema = pa.schema([("Natural Language Question", pa.string()), ("y_true", pa.string())])
+    written = 0
+    with pq.ParquetWriter(output_path, schema) as writer:
+        for questions, expressions in iter_bulk_batches(variables, templates, math_expressions, num_rows=num_rows,
+                                                        lambda_range=lambda_range, batch_size=batch_size, seed=seed):
+            writer.write_table(pa.table([pa.array(questions, pa.string()), pa.array(expressions, pa.string())],
+                                        schema=schema))
+            written += len(questions)
+    return written
+
+def main():
+    print(bulk_generate("causal_questions_bulk.parquet"))
+
+if __name__ == "__main__":
+    main()
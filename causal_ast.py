@@ -0,0 +1,226 @@
+"""
+Typed AST for CausalGrammar parse trees.
+
+Nodes are immutable, use __slots__ and are hash-consed: constructing a node
+equal to a live one returns that same object, so identical subtrees are shared
+and equality is an identity check.
+
+    tree = LarkParser(CausalGrammar().grammar).parse("E[Y|do(T=1)] - E[Y|do(T=0)]")
+    ast = to_ast(tree)
+
+Trees from a standalone parser module (syntax_eval.emit_standalone) are
+converted the same way.
+"""
+
+import weakref
+
+
+class Node:
+    __slots__ = ("_hash", "__weakref__")
+    _fields = ()
+    _interned = weakref.WeakValueDictionary()
+
+    def __new__(cls, *args):
+        key = (cls,) + args
+        node = Node._interned.get(key)
+        if node is None:
+            node = object.__new__(cls)
+            for name, value in zip(cls._fields, args):
+                object.__setattr__(node, name, value)
+            # children are interned already, so their hashes are cached
+            object.__setattr__(node, "_hash", hash(key))
+            Node._interned[key] = node
+        return node
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __hash__(self):
+        return self._hash
+
+    # equality falls back to identity, which is exact under hash-consing
+
+    def __reduce__(self):
+        # unpickling goes through __new__ and re-interns the node
+        return type(self), tuple(getattr(self, name) for name in self._fields)
+
+    def __repr__(self):
+        args = ", ".join(repr(getattr(self, name)) for name in self._fields)
+        return f"{type(self).__name__}({args})"
+
+
+class Variable(Node):
+    __slots__ = ("name",)
+    _fields = ("name",)
+
+    def __str__(self):
+        return self.name
+
+
+class Number(Node):
+    __slots__ = ("value",)
+    _fields = ("value",)
+
+    def __str__(self):
+        return self.value
+
+
+class SubscriptedVariable(Node):
+    """
+    Y_{X(0)}: name "Y", subscript Variable("X"), value Number("0") (or None).
+    """
+    __slots__ = ("name", "subscript", "value")
+    _fields = ("name", "subscript", "value")
+
+    def __str__(self):
+        value = f"({self.value})" if self.value is not None else ""
+        return f"{self.name}_{{{self.subscript}{value}}}"
+
+
+class Assignment(Node):
+    __slots__ = ("variable", "value")
+    _fields = ("variable", "value")
+
+    def __str__(self):
+        return f"{self.variable}={self.value}"
+
+
+class Do(Node):
+    __slots__ = ("assignments",)
+    _fields = ("assignments",)
+
+    def __str__(self):
+        return f"do({','.join(map(str, self.assignments))})"
+
+
+def _conditioned(outcome, conditions) -> str:
+    if not conditions:
+        return str(outcome)
+    return f"{outcome}|{','.join(map(str, conditions))}"
+
+
+class Probability(Node):
+    __slots__ = ("outcome", "conditions")
+    _fields = ("outcome", "conditions")
+
+    def __str__(self):
+        return f"P({_conditioned(self.outcome, self.conditions)})"
+
+
+class Expectation(Node):
+    __slots__ = ("outcome", "conditions")
+    _fields = ("outcome", "conditions")
+
+    def __str__(self):
+        return f"E[{_conditioned(self.outcome, self.conditions)}]"
+
+
+class Summation(Node):
+    __slots__ = ("index", "body")
+    _fields = ("index", "body")
+
+    def __str__(self):
+        # the body is a product or another summation, anything looser needs parentheses
+        body = self.body
+        if isinstance(body, BinaryOp) and body.op != "*":
+            return f"Σ_{{{self.index}}} ({body})"
+        return f"Σ_{{{self.index}}} {body}"
+
+
+class BinaryOp(Node):
+    __slots__ = ("op", "left", "right")
+    _fields = ("op", "left", "right")
+
+    def __str__(self):
+        def operand(node):
+            return f"({node})" if isinstance(node, (BinaryOp, Summation)) else str(node)
+        return f"{operand(self.left)} {self.op} {operand(self.right)}"
+
+
+class CausalTransformer:
+    """
+    Turns a CausalGrammar parse tree into Node objects. Non-recursive, so long
+    chains of binary operations don't hit the recursion limit.
+
+    Trees are only read through .data and .children and tokens through .type,
+    so trees from lark and from a standalone parser module both work (the
+    latter's own Transformer classes are not usable as generated).
+    """
+
+    def transform(self, tree):
+        values = []
+        stack = [(tree, False)]
+        while stack:
+            item, expanded = stack.pop()
+            if item is None or isinstance(item, str):
+                # a token (tokens are str) or None standing in for an absent optional
+                callback = getattr(self, item.type, None) if item is not None else None
+                values.append(item if callback is None else callback(item))
+            elif not expanded:
+                # children are pushed last-first, so their values come out in order
+                stack.append((item, True))
+                stack.extend((child, False) for child in reversed(item.children))
+            else:
+                start = len(values) - len(item.children)
+                args = values[start:]
+                del values[start:]
+                values.append(getattr(self, item.data)(args))
+        return values[0]
+
+    def start(self, children):
+        return children[0]
+
+    def variable(self, children):
+        return Variable(str(children[0]))
+
+    def NUMBER(self, token):
+        return Number(str(token))
+
+    def value(self, children):
+        return children[0]
+
+    def variable_subscript(self, children):
+        name, subscript = children[0], children[1]
+        value = children[2] if len(children) > 2 else None
+        # the variable pattern swallows the "_" of "Y_{...}"
+        return SubscriptedVariable(name.name.removesuffix("_"), subscript, value)
+
+    def assignment(self, children):
+        return Assignment(children[0], children[1])
+
+    def do_expr(self, children):
+        return Do(tuple(children))
+
+    def conditionals(self, children):
+        return tuple(children)
+
+    def expectation(self, children):
+        return Expectation(children[0], children[1] if len(children) > 1 else ())
+
+    def probability(self, children):
+        return Probability(children[0], children[1] if len(children) > 1 else ())
+
+    def summation(self, children):
+        return Summation(children[0], children[1])
+
+    def eq_op(self, children):
+        return str(children[0])
+
+    add_op = mul_op = eq_op
+
+    def binary_op(self, children):
+        left, op, right = children
+        return BinaryOp(op, left, right)
+
+
+_transformer = CausalTransformer()
+
+
+def to_ast(tree) -> Node:
+    """
+    Converts a parse tree from LarkParser.parse into an AST.
+    """
+    return _transformer.transform(tree)
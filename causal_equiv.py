@@ -1,11 +1,8 @@
 import networkx as nx
 from probability import *
 import logging
-import matplotlib.pyplot as plt
 
-logging.basicConfig()
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger = logging.getLogger(__name__)
 
 
 
@@ -49,6 +46,7 @@ class CausalGraph:
     
 
     def draw(self):
+        import matplotlib.pyplot as plt
         plt.figure(figsize=(8, 6))
         pos = nx.spring_layout(self.graph, seed=42)  
         nx.draw_networkx_nodes(self.graph, pos, node_size=700, node_color='lightblue')
@@ -58,8 +56,15 @@ class CausalGraph:
         plt.show()
 
 
-expr = "P(Y | do(X), Z)"
-expr = CausalProbability.parse(expr)
-causal_graph = CausalGraph(expr)
-print("Parsed Expression:", causal_graph.expression)
-causal_graph.draw()
+def main():
+    logging.basicConfig(level=logging.INFO)
+    expr = "P(Y | do(X), Z)"
+    expr = CausalProbability.parse(expr)
+    causal_graph = CausalGraph(expr)
+    print("Parsed Expression:", causal_graph.expression)
+    causal_graph.draw()
+
+
+if __name__ == "__main__":
+    main()
+
@@ -0,0 +1,208 @@
+"""
+Grammar-constrained decoding. Generated text is kept a viable prefix of the
+grammar by stepping Lark's interactive LALR parser alongside the model: the
+parser says which terminals may come next, and per-terminal automata decide
+whether the characters of a candidate token can still form one of them.
+
+Terminal automata are built with interegular (the optional dependency Lark
+itself uses for regex collision checks).
+"""
+
+from collections import deque
+
+import interegular
+from lark import Lark, Token
+from lark.lexer import PatternStr
+
+
+class _TerminalMatcher:
+    def __init__(self, terminal):
+        self.name = terminal.name
+        self.is_literal = isinstance(terminal.pattern, PatternStr)
+        self.priority = terminal.priority
+        fsm = interegular.parse_pattern(terminal.pattern.to_regexp()).to_fsm()
+        self.alphabet = fsm.alphabet
+        self.transitions = fsm.map
+        self.initial = fsm.initial
+        self.finals = fsm.finals
+        self.live = {state for state in fsm.states if fsm.islive(state)}
+        # one concrete character per transition symbol, for building completions
+        self.examples = {
+            symbol: min(ch for ch in chars if isinstance(ch, str))
+            for symbol, chars in fsm.alphabet.by_transition.items()
+            if any(isinstance(ch, str) for ch in chars)
+        }
+        self.shortest = self.complete("")
+
+    def scan(self, text: str):
+        """
+        Runs the automaton over text.
+
+        Returns:
+            (alive, longest): whether all of text is a prefix of some match,
+            and the length of the longest prefix of text that is a full match
+        """
+        state = self.initial
+        longest = 0
+        for i, ch in enumerate(text):
+            state = self.transitions[state].get(self.alphabet[ch])
+            if state is None:
+                return False, longest
+            if state in self.finals:
+                longest = i + 1
+        return state in self.live, longest
+
+    def complete(self, text: str):
+        """
+        Shortest string that turns text into a full match, or None if text is
+        not a prefix of any match.
+        """
+        state = self.initial
+        for ch in text:
+            state = self.transitions[state].get(self.alphabet[ch])
+            if state is None:
+                return None
+        queue = deque([(state, "")])
+        seen = {state}
+        while queue:
+            state, suffix = queue.popleft()
+            if state in self.finals:
+                return suffix
+            for symbol, target in self.transitions[state].items():
+                if target not in seen and symbol in self.examples:
+                    seen.add(target)
+                    queue.append((target, suffix + self.examples[symbol]))
+        return None
+
+
+class GrammarState:
+    """
+    Parser over the committed tokens plus the text of the still-open last token.
+    Treated as immutable: advancing copies the parser before feeding it.
+    """
+    __slots__ = ("parser", "pending")
+
+    def __init__(self, parser, pending: str = ""):
+        self.parser = parser
+        self.pending = pending
+
+
+class GrammarConstraint:
+    def __init__(self, lark_parser: Lark):
+        """
+        Args:
+            lark_parser (Lark): A parser built with parser="lalr"
+        """
+        self.lark = lark_parser
+        self.ignore = set(lark_parser.ignore_tokens)
+        self.matchers = [_TerminalMatcher(t) for t in lark_parser.terminals]
+        # literals win ties against regexes of the same length, like Lark's
+        # lexer turning a variable match "do" into the DO keyword
+        self.matchers.sort(key=lambda m: (not m.is_literal, -m.priority))
+        self._accepts_cache = {}
+
+    @classmethod
+    def from_grammar(cls, grammar: str):
+        return cls(Lark(grammar, parser="lalr"))
+
+    def start(self) -> GrammarState:
+        return GrammarState(self.lark.parse_interactive(""))
+
+    def _accepts(self, parser) -> set:
+        # the acceptable terminals depend only on the LALR state stack
+        key = tuple(parser.parser_state.state_stack)
+        if key not in self._accepts_cache:
+            self._accepts_cache[key] = parser.accepts()
+        return self._accepts_cache[key]
+
+    def _candidates(self, parser):
+        accepts = self._accepts(parser)
+        return [m for m in self.matchers if m.name in accepts or m.name in self.ignore]
+
+    def advance(self, state: GrammarState, text: str):
+        """
+        Appends text to the generated output.
+
+        Returns:
+            The new GrammarState, or None if no continuation of the result can parse
+        """
+        parser = state.parser
+        pending = state.pending + text
+        copied = False
+        while pending:
+            candidates = self._candidates(parser)
+            best, best_len = None, 0
+            for matcher in candidates:
+                alive, longest = matcher.scan(pending)
+                if alive:
+                    # the last token is still open, maximal munch keeps extending it
+                    return GrammarState(parser, pending)
+                if longest > best_len:
+                    best, best_len = matcher, longest
+            if best is None:
+                return None
+            lexeme, pending = pending[:best_len], pending[best_len:]
+            if best.name in self.ignore:
+                continue
+            if not copied:
+                parser = parser.copy()
+                copied = True
+            parser.feed_token(Token(best.name, lexeme))
+        return GrammarState(parser, pending)
+
+    def is_complete(self, state: GrammarState) -> bool:
+        """
+        True if the generated output parses as a whole expression.
+        """
+        parser = state.parser
+        if state.pending:
+            matcher = next((m for m in self._candidates(parser) if m.scan(state.pending)[1] == len(state.pending)), None)
+            if matcher is None:
+                return False
+            if matcher.name not in self.ignore:
+                parser = parser.copy()
+                parser.feed_token(Token(matcher.name, state.pending))
+        return "$END" in self._accepts(parser)
+
+    def completion(self, state: GrammarState):
+        """
+        A short string that, appended to the output, makes it parse. Used to close
+        expressions that ran out of generation budget.
+
+        Returns:
+            The completion text, or None if there is none
+        """
+        parser = state.parser
+        suffix = ""
+        if state.pending:
+            best = None
+            for matcher in self._candidates(parser):
+                tail = matcher.complete(state.pending)
+                if tail is not None and (best is None or len(tail) < len(best[1])):
+                    best = (matcher, tail)
+            if best is None:
+                return None
+            matcher, suffix = best
+            if matcher.name not in self.ignore:
+                parser = parser.copy()
+                parser.feed_token(Token(matcher.name, state.pending + suffix))
+
+        # breadth-first over terminal sequences, fewest tokens first
+        queue = deque([(parser, "")])
+        seen = {tuple(parser.parser_state.state_stack)}
+        while queue:
+            parser, text = queue.popleft()
+            accepts = self._accepts(parser)
+            if "$END" in accepts:
+                return suffix + text
+            for matcher in self.matchers:
+                if matcher.name not in accepts or matcher.name in self.ignore or matcher.shortest is None:
+                    continue
+                child = parser.copy()
+                child.feed_token(Token(matcher.name, matcher.shortest))
+                key = tuple(child.parser_state.state_stack)
+                if key not in seen:
+                    seen.add(key)
+                    # separate tokens so a variable can't run into the next one
+                    queue.append((child, text + " " + matcher.shortest))
+        return None
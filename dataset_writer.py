@@ -0,0 +1,169 @@
+"""
+Chunked, resumable dataset output. Rows go to disk as they are produced and a
+JSON manifest next to the output records how far the run got, so an
+interrupted run can pick up where it stopped.
+
+- csv: a single file, appended per chunk. The manifest stores the byte size
+  after the last complete chunk and a half-written tail is cut off on resume.
+- parquet: a directory with one part file per chunk.
+"""
+
+import json
+import os
+
+
+def _pandas():
+    """
+    pandas, imported on first use so that importing this module stays cheap.
+    """
+    import pandas
+    return pandas
+
+
+def infer_format(path: str) -> str:
+    return "parquet" if path.endswith(".parquet") else "csv"
+
+
+class DatasetWriter:
+    def __init__(self, path: str, columns: list, fmt: str = None, params: dict = None, resume: bool = True):
+        """
+        Args:
+            path (str): Output file (csv) or directory (parquet)
+            columns (list): Column names
+            fmt (str, optional): "csv" or "parquet". Defaults to the path extension.
+            params (dict, optional): Run parameters. Only a manifest with the same ones
+                and the same format is resumed, otherwise the output starts over.
+            resume (bool, optional): Continue from an existing manifest. Defaults to True.
+        """
+        self.path = path
+        self.columns = list(columns)
+        self.fmt = fmt or infer_format(path)
+        if self.fmt not in ("csv", "parquet"):
+            raise ValueError(f"Unknown format: {self.fmt}")
+        self.manifest_path = path + ".manifest.json"
+        self.params = params or {}
+
+        manifest = None
+        if resume and os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+            if manifest["params"] != self.params or manifest["format"] != self.fmt:
+                manifest = None
+        if manifest is not None:
+            self.manifest = manifest
+            self._discard_partial_chunk()
+        else:
+            self.manifest = {
+                "format": self.fmt,
+                "columns": self.columns,
+                "params": self.params,
+                "rows_written": 0,
+                "chunks": 0,
+                "bytes": 0,
+                "complete": False,
+            }
+            self._reset_output()
+            self._save_manifest()
+
+    @property
+    def rows_written(self) -> int:
+        return self.manifest["rows_written"]
+
+    @property
+    def complete(self) -> bool:
+        return self.manifest["complete"]
+
+    def _part_path(self, index: int) -> str:
+        return os.path.join(self.path, f"part-{index:05d}.parquet")
+
+    def _reset_output(self):
+        if self.fmt == "csv":
+            open(self.path, "w").close()
+        else:
+            os.makedirs(self.path, exist_ok=True)
+            for name in os.listdir(self.path):
+                if name.startswith("part-"):
+                    os.remove(os.path.join(self.path, name))
+
+    def _discard_partial_chunk(self):
+        # anything past the manifest belongs to a chunk that never finished
+        if self.fmt == "csv":
+            with open(self.path, "a+b") as f:
+                f.truncate(self.manifest["bytes"])
+        else:
+            for name in os.listdir(self.path):
+                if name.startswith("part-") and int(name[5:10]) >= self.manifest["chunks"]:
+                    os.remove(os.path.join(self.path, name))
+
+    def _save_manifest(self):
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.manifest_path)
+
+    def write(self, rows: list):
+        """
+        Appends a chunk of rows (tuples in column order) and checkpoints it.
+        """
+        if not rows:
+            return
+        pd = _pandas()
+        df = pd.DataFrame(rows, columns=self.columns)
+        if self.fmt == "csv":
+            with open(self.path, "a", newline="", encoding="utf-8") as f:
+                df.to_csv(f, header=self.manifest["bytes"] == 0, index=False)
+                f.flush()
+                os.fsync(f.fileno())
+            self.manifest["bytes"] = os.path.getsize(self.path)
+        else:
+            part = self._part_path(self.manifest["chunks"])
+            df.to_parquet(part + ".tmp", index=False)
+            os.replace(part + ".tmp", part)
+        self.manifest["rows_written"] += len(rows)
+        self.manifest["chunks"] += 1
+        self._save_manifest()
+
+    def close(self):
+        """
+        Marks the run as finished.
+        """
+        self.manifest["complete"] = True
+        self._save_manifest()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # an interrupted run keeps its manifest open for resuming
+        if exc_type is None:
+            self.close()
+        return False
+
+
+def read_dataset(path: str, fmt: str = None) -> "pd.DataFrame":
+    pd = _pandas()
+    return pd.read_csv(path) if (fmt or infer_format(path)) == "csv" else pd.read_parquet(path)
+
+
+def iter_dataset(path: str, columns: list, fmt: str = None, chunksize: int = 10000):
+    """
+    Streams a csv file, a parquet file or a DatasetWriter parquet directory as
+    lists of row tuples in column order, chunksize rows at a time, without
+    loading the whole dataset.
+    """
+    if (fmt or infer_format(path)) == "csv":
+        pd = _pandas()
+        for chunk in pd.read_csv(path, usecols=columns, chunksize=chunksize, keep_default_na=False):
+            yield list(chunk[columns].itertuples(index=False, name=None))
+        return
+    import pyarrow.parquet as pq
+    if os.path.isdir(path):
+        files = [os.path.join(path, name) for name in sorted(os.listdir(path))
+                 if name.startswith("part-") and name.endswith(".parquet")]
+    else:
+        files = [path]
+    for file in files:
+        for batch in pq.ParquetFile(file).iter_batches(batch_size=chunksize, columns=columns):
+            yield list(zip(*(batch.column(name).to_pylist() for name in columns)))
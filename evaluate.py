@@ -0,0 +1,561 @@
+"""
+End-to-end scoring of a generated (y_true, y_pred) dataset. Every row goes
+through three stages on a process pool:
+
+- syntax: both expressions are parsed with CausalGrammar, after joining
+  multi-word variable names such as "lung cancer" with "_";
+- normalize: parse trees become canonical ASTs (sorted conditions and
+  commutative operands, one do() per term), optionally simplified with the
+  do-calculus rules under a known causal structure;
+- equivalence: exact and normalized matches, and Markov equivalence of the
+  DAGs the two expressions imply.
+
+Input is streamed in chunks and results are written as they come back, so
+memory stays flat however large the dataset is.
+
+    report = evaluate_dataset("causal_questions_dataset.csv", "evaluation.csv")
+    print(report.metrics["equivalent_rate"], report.rows_per_sec)
+
+or from the shell:
+
+    python evaluate.py causal_questions_dataset.csv evaluation.csv --processes 8
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter, deque
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+import networkx as nx
+
+from causal_ast import BinaryOp, Do, Expectation, Node, Probability, SubscriptedVariable, Variable, to_ast
+from dataset_writer import DatasetWriter, iter_dataset
+from dseparation import check_dag
+from markov_equivalence import markov_equivalence
+from normalize_expr import CausalQuery, simplify_expression
+from result_cache import DEFAULT_PATH, ResultCache, RunInfo, content_key, source_digest
+from syntax_eval import DEFAULT_CACHE_DIR, CausalGrammar, LarkParser, grammar_digest, join_name_words
+
+STAGES = ("read", "cache", "syntax", "normalize", "equivalence", "write")
+
+# operators whose operands are sorted; + and * chains are flattened first
+COMMUTATIVE = ("+", "*", "=")
+ASSOCIATIVE = ("+", "*")
+
+
+class RowResult(NamedTuple):
+    """
+    Evaluation of one dataset row. normalized_* are None for expressions that
+    don't parse; error_category is the ParseResult category of an invalid y_pred.
+    """
+    index: int
+    y_true: Optional[str]
+    y_pred: Optional[str]
+    true_valid: bool
+    pred_valid: bool
+    error_category: Optional[str]
+    normalized_true: Optional[str]
+    normalized_pred: Optional[str]
+    exact_match: bool
+    equivalent: bool
+    markov_equivalent: bool
+
+
+class EvaluationReport(NamedTuple):
+    """
+    Aggregate metrics of a run. stage_seconds are summed over the workers for
+    the syntax, normalize and equivalence stages, so with several processes
+    they can add up to more than wall_seconds. cache holds the ResultCache
+    counters of the run, if one was used.
+    """
+    rows: int
+    metrics: dict
+    stage_seconds: dict
+    wall_seconds: float
+    cache: Optional[RunInfo] = None
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.wall_seconds if self.wall_seconds else 0.0
+
+    def stage_throughput(self) -> dict:
+        """
+        Rows per second of each stage on its own.
+        """
+        return {stage: self.rows / seconds if seconds else None for stage, seconds in self.stage_seconds.items()}
+
+
+def structure_graph(causal_structure: dict):
+    """
+    DAG of a causal structure in the expr_to_digraph format,
+    {'X': {'Y': {}}} meaning X -> Y. None stays None.
+    """
+    if causal_structure is None:
+        return None
+    G = nx.DiGraph()
+    G.add_nodes_from(causal_structure)
+    G.add_edges_from((parent, child) for parent, children in causal_structure.items() for child in children)
+    check_dag(G)
+    return G
+
+
+def _children(node):
+    for value in (getattr(node, name) for name in node._fields):
+        if isinstance(value, Node):
+            yield value
+        elif isinstance(value, tuple):
+            yield from (item for item in value if isinstance(item, Node))
+
+
+def _post_order(root) -> list:
+    """
+    Distinct nodes of an AST, children before parents, without recursion.
+    """
+    order, seen = [], set()
+    stack = [(root, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            order.append(node)
+        elif node not in seen:
+            seen.add(node)
+            stack.append((node, True))
+            stack.extend((child, False) for child in _children(node))
+    return order
+
+
+def _rebuild(node, done: dict):
+    def mapped(value):
+        if isinstance(value, Node):
+            return done[value]
+        if isinstance(value, tuple):
+            return tuple(done[item] if isinstance(item, Node) else item for item in value)
+        return value
+    return type(node)(*(mapped(getattr(node, name)) for name in node._fields))
+
+
+def _operands(op, node) -> list:
+    # the operands of a left-associative chain of op, already normalized
+    operands = []
+    while isinstance(node, BinaryOp) and node.op == op:
+        operands.append(node.right)
+        node = node.left
+    operands.append(node)
+    return operands
+
+
+def _simplify_conditions(outcome, do: set, obs: set, graph):
+    """
+    Removes conditions and turns do() into observations with rules 1-3 in graph.
+    Terms the rules don't cover (a compound outcome, a variable assigned twice)
+    are left as they are.
+    """
+    assignments = {}
+    for assignment in do | obs:
+        assignments.setdefault(str(assignment.variable), []).append(assignment)
+    if not isinstance(outcome, Variable) or outcome.name in assignments \
+            or any(len(found) > 1 for found in assignments.values()):
+        return do, obs
+    query = CausalQuery((outcome.name,), tuple(sorted(str(a.variable) for a in do)),
+                        tuple(sorted(str(a.variable) for a in obs)))
+    missing = {outcome.name, *assignments} - graph.nodes
+    if missing:
+        graph = graph.copy()
+        graph.add_nodes_from(missing)
+    simplified = simplify_expression(graph, query)
+    return {assignments[v][0] for v in simplified.do}, {assignments[v][0] for v in simplified.obs}
+
+
+def _normalize_term(term, graph):
+    do = {a for condition in term.conditions if isinstance(condition, Do) for a in condition.assignments}
+    obs = {condition for condition in term.conditions if not isinstance(condition, Do)}
+    if graph is not None:
+        do, obs = _simplify_conditions(term.outcome, do, obs, graph)
+    do, obs = sorted(do, key=str), sorted(obs, key=str)
+    return type(term)(term.outcome, ((Do(tuple(do)),) if do else ()) + tuple(obs))
+
+
+def _normalize(root, graph):
+    done = {}
+    for node in _post_order(root):
+        node_ = _rebuild(node, done)
+        if isinstance(node_, Do):
+            node_ = Do(tuple(sorted(set(node_.assignments), key=str)))
+        elif isinstance(node_, (Expectation, Probability)):
+            node_ = _normalize_term(node_, graph)
+        elif isinstance(node_, BinaryOp) and node_.op in COMMUTATIVE:
+            op = node_.op
+            if op in ASSOCIATIVE:
+                operands = _operands(op, node_.left) + _operands(op, node_.right)
+            else:
+                operands = [node_.left, node_.right]
+            operands.sort(key=str)
+            node_ = operands[0]
+            for operand in operands[1:]:
+                node_ = BinaryOp(op, node_, operand)
+        done[node] = node_
+    return done[root]
+
+
+def normalize(node, causal_structure: dict = None) -> Node:
+    """
+    Canonical form of an AST from causal_ast.to_ast. Two expressions that only
+    differ in the order of conditions, do() assignments or the operands of
+    +, * and = normalize to the same node.
+
+    Args:
+        node: The AST
+        causal_structure (dict, optional): Known causal relationships in the
+            expr_to_digraph format. When given, conditions of every E[...] and
+            P(...) term are also simplified with the do-calculus rules.
+    """
+    return _normalize(node, structure_graph(causal_structure))
+
+
+def implied_graph(node) -> nx.DiGraph:
+    """
+    The DAG an expression implies without a known causal structure, as in
+    expr_to_digraph: an arrow from every conditioned or intervened variable
+    to the outcome of each E[...] and P(...) term.
+    """
+    G = nx.DiGraph()
+    for term in _post_order(node):
+        if not isinstance(term, (Expectation, Probability)) or \
+                not isinstance(term.outcome, (Variable, SubscriptedVariable)):
+            continue
+        outcome = str(term.outcome)
+        G.add_node(outcome)
+        for condition in term.conditions:
+            for assignment in (condition.assignments if isinstance(condition, Do) else (condition,)):
+                if str(assignment.variable) != outcome:
+                    G.add_edge(str(assignment.variable), outcome)
+    return G
+
+
+_worker_parser = None
+_worker_graph = None
+
+
+def _init_worker(grammar: str, cache_dir: str, standalone_path: str, causal_structure: dict):
+    global _worker_parser, _worker_graph
+    if standalone_path is not None:
+        _worker_parser = LarkParser.from_standalone(standalone_path, grammar=grammar)
+    else:
+        _worker_parser = LarkParser(grammar, cache_dir=cache_dir)
+    _worker_graph = structure_graph(causal_structure)
+    for cached in (_parse, _normalized, _implied_graph, _markov_equivalent):
+        cached.cache_clear()
+
+
+# generated datasets repeat y_true and most y_pred strings, so each stage is memoized per worker
+
+@lru_cache(maxsize=65536)
+def _parse(expression):
+    if isinstance(expression, str):
+        expression = join_name_words(expression)
+    tree, result = _worker_parser.parse_checked(expression)
+    if tree is None:
+        return None, result.category
+    return to_ast(tree), None
+
+
+@lru_cache(maxsize=65536)
+def _normalized(node):
+    try:
+        return str(_normalize(node, _worker_graph))
+    except RecursionError:
+        # str() of a very deeply nested expression
+        return None
+
+
+@lru_cache(maxsize=65536)
+def _implied_graph(node):
+    return implied_graph(node)
+
+
+@lru_cache(maxsize=65536)
+def _markov_equivalent(true_node, pred_node):
+    return markov_equivalence(_implied_graph(true_node), _implied_graph(pred_node))
+
+
+def _evaluate_block(args):
+    indices, rows = args
+    seconds = dict.fromkeys(("syntax", "normalize", "equivalence"), 0.0)
+    results = []
+    for index, (y_true, y_pred) in zip(indices, rows):
+        t0 = time.perf_counter()
+        true_node, _ = _parse(y_true)
+        pred_node, category = _parse(y_pred)
+        t1 = time.perf_counter()
+        normalized_true = _normalized(true_node) if true_node is not None else None
+        normalized_pred = _normalized(pred_node) if pred_node is not None else None
+        t2 = time.perf_counter()
+        exact = isinstance(y_true, str) and isinstance(y_pred, str) and y_true.strip() == y_pred.strip()
+        equivalent = exact or (normalized_true is not None and normalized_true == normalized_pred)
+        markov = true_node is not None and pred_node is not None and _markov_equivalent(true_node, pred_node)
+        t3 = time.perf_counter()
+        seconds["syntax"] += t1 - t0
+        seconds["normalize"] += t2 - t1
+        seconds["equivalence"] += t3 - t2
+        results.append(RowResult(index, y_true, y_pred, true_node is not None, pred_node is not None,
+                                 category, normalized_true, normalized_pred, exact, equivalent, markov))
+    return results, seconds
+
+
+def _blocks(rows, block_size: int):
+    start, block = 0, []
+    for row in rows:
+        block.append(row)
+        if len(block) == block_size:
+            yield start, block
+            start, block = start + block_size, []
+    if block:
+        yield start, block
+
+
+def result_version(grammar: str = None, causal_structure: dict = None) -> str:
+    """
+    Cache key component for everything a RowResult depends on besides the two
+    expressions: the code of the stages, the grammar and the causal structure.
+    """
+    modules = (__name__, "causal_ast", "dseparation", "markov_equivalence", "normalize_expr", "syntax_eval")
+    code = source_digest(*(sys.modules[name] for name in modules))
+    return content_key(code, grammar_digest(grammar or CausalGrammar().grammar), causal_structure)
+
+
+def evaluate_rows(rows, processes: int = None, chunksize: int = 512, causal_structure: dict = None,
+                  grammar: str = None, cache_dir: str = DEFAULT_CACHE_DIR, standalone_path: str = None,
+                  stage_seconds: dict = None, cache: ResultCache = None):
+    """
+    Evaluates (y_true, y_pred) pairs on a process pool and yields a RowResult
+    per pair, in input order. Like syntax_eval.parse_many, only a bounded number
+    of chunks is in flight, so any iterable streams through in constant memory.
+
+    Args:
+        rows: Iterable of (y_true, y_pred) pairs
+        processes (int, optional): Worker count, 0 evaluates in this process.
+            Defaults to os.cpu_count().
+        chunksize (int, optional): Rows per dispatched chunk. Defaults to 512.
+        causal_structure (dict, optional): See normalize.
+        grammar (str, optional): Grammar text. Defaults to CausalGrammar.
+        cache_dir (str, optional): LALR table cache shared by the workers. Defaults to DEFAULT_CACHE_DIR.
+        standalone_path (str, optional): Load worker parsers from an emit_standalone module instead.
+        stage_seconds (dict, optional): Seconds spent in each stage are added to it.
+        cache (ResultCache, optional): Persistent results, keyed by the two
+            expressions and result_version. Only rows that miss are sent to the
+            workers. Defaults to None.
+    """
+    grammar = grammar or CausalGrammar().grammar
+    structure_graph(causal_structure)  # fail here rather than in every worker
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if stage_seconds is None:
+        stage_seconds = {}
+    version = result_version(grammar, causal_structure) if cache is not None else None
+
+    def add_seconds(stage, elapsed):
+        stage_seconds[stage] = stage_seconds.get(stage, 0.0) + elapsed
+
+    def lookup(start, block):
+        # (start, block, keys, cached values, the rows the workers still have to do)
+        indices = range(start, start + len(block))
+        if cache is None:
+            return start, block, None, {}, (list(indices), block)
+        started = time.perf_counter()
+        keys = [content_key(version, y_true, y_pred) for y_true, y_pred in block]
+        found = cache.get_many(keys)
+        add_seconds("cache", time.perf_counter() - started)
+        todo = [i for i, key in enumerate(keys) if key not in found]
+        return start, block, keys, found, ([indices[i] for i in todo], [block[i] for i in todo])
+
+    def merge(job, block_result):
+        start, block, keys, found, _ = job
+        computed, seconds = block_result
+        for stage, elapsed in seconds.items():
+            add_seconds(stage, elapsed)
+        if keys is None:
+            return computed
+        started = time.perf_counter()
+        computed = iter(computed)
+        results, fresh = [], {}
+        for offset, (row, key) in enumerate(zip(block, keys)):
+            if key in found:
+                results.append(RowResult(start + offset, *row, *found[key]))
+            else:
+                result = next(computed)
+                results.append(result)
+                fresh[key] = result[3:]
+        cache.put_many(fresh)
+        add_seconds("cache", time.perf_counter() - started)
+        return results
+
+    initargs = (grammar, cache_dir, standalone_path, causal_structure)
+    if processes == 0:
+        _init_worker(*initargs)
+        for block in _blocks(rows, chunksize):
+            job = lookup(*block)
+            yield from merge(job, _evaluate_block(job[-1]))
+        return
+
+    if standalone_path is None and cache_dir is not None:
+        LarkParser(grammar, cache_dir=cache_dir)
+    with multiprocessing.Pool(processes, initializer=_init_worker, initargs=initargs) as pool:
+        in_flight = deque()
+        for block in _blocks(rows, chunksize):
+            job = lookup(*block)
+            # fully cached blocks don't go to the pool
+            pending = pool.apply_async(_evaluate_block, (job[-1],)) if job[-1][1] else None
+            in_flight.append((job, pending))
+            if len(in_flight) >= 4 * processes:
+                job, pending = in_flight.popleft()
+                yield from merge(job, pending.get() if pending else ([], {}))
+        while in_flight:
+            job, pending = in_flight.popleft()
+            yield from merge(job, pending.get() if pending else ([], {}))
+
+
+def _timed(iterable, stage_seconds: dict, stage: str):
+    # adds the time spent producing each item to stage_seconds[stage]
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            stage_seconds[stage] += time.perf_counter() - start
+            return
+        stage_seconds[stage] += time.perf_counter() - start
+        yield item
+
+
+def _metrics(counts: Counter, categories: Counter, rows: int) -> dict:
+    metrics = {f"{name}_rate": counts[name] / rows if rows else 0.0
+               for name in ("true_valid", "pred_valid", "exact_match", "equivalent", "markov_equivalent")}
+    metrics["error_categories"] = dict(categories.most_common())
+    return metrics
+
+
+def evaluate_dataset(input_path: str, output_path: str, processes: int = None, chunksize: int = 512,
+                     causal_structure: dict = None, true_column: str = "y_true", pred_column: str = "y_pred",
+                     input_format: str = None, output_format: str = None, read_chunksize: int = 10000,
+                     write_chunksize: int = 8192, metrics_path: str = None, cache: ResultCache = None,
+                     **kwargs) -> EvaluationReport:
+    """
+    Scores a dataset written by generate_pairs.generate_questions (csv, parquet
+    file or parquet directory) and writes one RowResult per row to output_path,
+    plus aggregate metrics and timings as JSON to metrics_path.
+
+    Args:
+        input_path (str): Dataset with y_true and y_pred columns
+        output_path (str): Per-row results, csv or parquet (see DatasetWriter)
+        processes (int, optional): Worker count, 0 evaluates in this process.
+            Defaults to os.cpu_count().
+        chunksize (int, optional): Rows per dispatched chunk. Defaults to 512.
+        causal_structure (dict, optional): See normalize.
+        true_column, pred_column (str, optional): Column names. Default to "y_true" and "y_pred".
+        input_format, output_format (str, optional): "csv" or "parquet". Default to the path extensions.
+        read_chunksize (int, optional): Rows read from input_path at a time. Defaults to 10000.
+        write_chunksize (int, optional): Rows per write to output_path. Defaults to 8192.
+        metrics_path (str, optional): Defaults to output_path + ".metrics.json".
+        cache (ResultCache, optional): See evaluate_rows. The run's hit rate is
+            recorded in the cache and returned in the report. Defaults to None.
+        **kwargs: grammar, cache_dir and standalone_path, passed to evaluate_rows.
+    """
+    started = time.perf_counter()
+    stage_seconds = dict.fromkeys(STAGES, 0.0)
+    chunks = _timed(iter_dataset(input_path, [true_column, pred_column], fmt=input_format, chunksize=read_chunksize),
+                    stage_seconds, "read")
+    rows = (row for chunk in chunks for row in chunk)
+    params = {
+        "input_path": os.path.abspath(input_path),
+        "causal_structure": causal_structure,
+        "grammar": grammar_digest(kwargs.get("grammar") or CausalGrammar().grammar),
+    }
+    counts, categories = Counter(), Counter()
+    total = 0
+
+    writer = DatasetWriter(output_path, RowResult._fields, fmt=output_format, params=params, resume=False)
+    with writer:
+        pending = []
+        for result in evaluate_rows(rows, processes=processes, chunksize=chunksize, causal_structure=causal_structure,
+                                    stage_seconds=stage_seconds, cache=cache, **kwargs):
+            total += 1
+            counts.update(name for name in ("true_valid", "pred_valid", "exact_match", "equivalent",
+                                            "markov_equivalent") if getattr(result, name))
+            if result.error_category is not None:
+                categories[result.error_category] += 1
+            pending.append(tuple(result))
+            if len(pending) == write_chunksize:
+                start = time.perf_counter()
+                writer.write(pending)
+                stage_seconds["write"] += time.perf_counter() - start
+                pending = []
+        start = time.perf_counter()
+        writer.write(pending)
+        stage_seconds["write"] += time.perf_counter() - start
+
+    run = cache.end_run(os.path.abspath(input_path)) if cache is not None else None
+    report = EvaluationReport(total, _metrics(counts, categories, total), stage_seconds,
+                              time.perf_counter() - started, run)
+    with open(metrics_path or output_path + ".metrics.json", "w") as f:
+        json.dump({
+            "rows": report.rows,
+            "metrics": report.metrics,
+            "stage_seconds": report.stage_seconds,
+            "stage_rows_per_sec": report.stage_throughput(),
+            "wall_seconds": report.wall_seconds,
+            "rows_per_sec": report.rows_per_sec,
+            "cache": dict(run._asdict(), hit_rate=run.hit_rate) if run is not None else None,
+        }, f, indent=2)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a generated (y_true, y_pred) dataset.")
+    parser.add_argument("input_path")
+    parser.add_argument("output_path")
+    parser.add_argument("--processes", type=int, default=None, help="0 runs in this process")
+    parser.add_argument("--chunksize", type=int, default=512)
+    parser.add_argument("--causal-structure", default=None,
+                        help="JSON file with known causal relationships, {\"X\": {\"Y\": {}}} for X -> Y")
+    parser.add_argument("--true-column", default="y_true")
+    parser.add_argument("--pred-column", default="y_pred")
+    parser.add_argument("--metrics-path", default=None)
+    parser.add_argument("--cache", nargs="?", const=DEFAULT_PATH, default=None,
+                        help=f"reuse results from earlier runs, kept in this SQLite file (default {DEFAULT_PATH})")
+    parser.add_argument("--cache-maxsize", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    causal_structure = None
+    if args.causal_structure is not None:
+        with open(args.causal_structure) as f:
+            causal_structure = json.load(f)
+    cache = ResultCache(args.cache, maxsize=args.cache_maxsize) if args.cache is not None else None
+    try:
+        report = evaluate_dataset(args.input_path, args.output_path, processes=args.processes,
+                                  chunksize=args.chunksize, causal_structure=causal_structure,
+                                  true_column=args.true_column, pred_column=args.pred_column,
+                                  metrics_path=args.metrics_path, cache=cache)
+    finally:
+        if cache is not None:
+            cache.close()
+
+    print(f"{report.rows} rows in {report.wall_seconds:.2f}s ({report.rows_per_sec:.0f} rows/s)")
+    for name, value in report.metrics.items():
+        print(f"  {name}: {value:.4f}" if isinstance(value, float) else f"  {name}: {value}")
+    throughput = report.stage_throughput()
+    for stage in STAGES:
+        rate = f"{throughput[stage]:.0f} rows/s" if throughput[stage] else "-"
+        print(f"  {stage}: {report.stage_seconds[stage]:.2f}s ({rate})")
+    if report.cache is not None:
+        print(f"  cache: {report.cache.hits} hits, {report.cache.misses} misses ({report.cache.hit_rate:.1%}), "
+              f"{report.cache.evictions} evicted, {report.cache.currsize} entries")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,11 @@
+import copy
+import functools
 import random
-import pandas as pd
-from transformers import AutoModelForCausalLM,  AutoTokenizer
 
-from huggingface_hub import login
+from dataset_writer import DatasetWriter
+
 API_KEY = 'API_KEY'
-login(API_KEY)
+MODEL_NAME = "meta-llama/Meta-Llama-3-8B-Instruct"
 
 # use open AIs
 
@@ -28,21 +29,42 @@ VARIABLES = [
     ("advertising", "sales", "consumer preference")
 ]
 
-def generate_questions(num_questions: int, variables: list, templates: list, math_expressions: list):
-    data = []
+EXAMPLE = "What is the effect of changing the treatment smoking from 0 to 1 on the outcome lung cancer while holding age constant at some value 27?,E[smoking|do(lung cancer=1,age=27)] - E[smoking|do(lung cancer=0,age=27)]"
+
+# the expression is a single line, so the first newline ends the answer
+STOP_SEQUENCES = ["\n"]
+
+
+# instruction and example come first so every prompt shares one cacheable prefix
+PROMPT_PREFIX = f"Only provide the mathematical expression with no extra text. For example: {EXAMPLE}\n"
+
+
+def build_question_prompt(question: str) -> str:
+    return f"Given the question: {question}\n"
+
+
+def build_prompt(question: str) -> str:
+    return PROMPT_PREFIX + build_question_prompt(question)
+
+
+def sample_rows(num_questions: int, variables: list, templates: list, math_expressions: list,
+                seed: int = None, start: int = 0):
+    """
+    Draws (question, y_true) pairs from the templates without touching the model.
+
+    With a seed, row i is drawn from its own generator seeded by (seed, start + i),
+    so any range of rows can be reproduced without drawing the ones before it.
+    """
     assert len(templates) == len(math_expressions)
-    model_name = "meta-llama/Meta-Llama-3-8B-Instruct"
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
-    model = AutoModelForCausalLM.from_pretrained(model_name)
+    rows = []
     num_templates = len(templates)
-    for _ in range(num_questions):  
-        T, Y, X = random.choice(variables)
-        x_value = random.randint(0, 188)  
-        template_idx = random.randint(0, num_templates - 1)
+    for i in range(num_questions):
+        rng = random.Random(f"{seed}:{start + i}") if seed is not None else random
+        T, Y, X = rng.choice(variables)
+        x_value = rng.randint(0, 188)
+        template_idx = rng.randint(0, num_templates - 1)
         question_template = templates[template_idx]
         math_expr = math_expressions[template_idx]
-        # question_template = random.choice(templates)
-        # math_expr = random.choice(math_expressions)
 
         math_expr = (
             math_expr.replace("Δ", T)
@@ -51,20 +73,405 @@ def generate_questions(num_questions: int, variables: list, templates: list, mat
             .replace("λ", str(x_value))
         )
 
-        math_expr = math_expr.replace(f"{X}(", f"{X}(")  
-
         question = question_template.format(Δ=T, Γ=Y, Λ=X, λ=x_value)
-        example = "What is the effect of changing the treatment smoking from 0 to 1 on the outcome lung cancer while holding age constant at some value 27?,E[smoking|do(lung cancer=1,age=27)] - E[smoking|do(lung cancer=0,age=27)]"
-        prompt = f"Given the question: {question}\n Only provide the mathematical expression with no extra text. For example: {example}"
-        inputs = tokenizer(prompt, return_tensors='pt')
-        model_output = model.generate(**inputs, max_length=len(input)+10)
-        response = tokenizer.decode(model_output[0], skip_special_tokens=True)
-        print(response)
+        rows.append((question, math_expr))
+    return rows
+
+
+def _torch():
+    """
+    torch, imported on first use so that importing this module stays cheap.
+    """
+    import torch
+    return torch
+
+
+def _no_grad(method):
+    """
+    torch.no_grad() as a decorator, importing torch on the first call instead of
+    when the class is defined.
+    """
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with _torch().no_grad():
+            return method(*args, **kwargs)
+    return wrapper
+
+
+class ByteTokenizer:
+    """
+    Byte-level tokenizer for the stand-in model, needs no download.
+    Ids 0-255 are raw UTF-8 bytes, followed by the pad and eos tokens.
+    """
+    pad_token_id = 256
+    eos_token_id = 257
+    vocab_size = 258
+
+    def encode(self, text: str, add_special_tokens: bool = True) -> list:
+        return list(text.encode("utf-8"))
+
+    def decode(self, ids, skip_special_tokens: bool = True) -> str:
+        return bytes(int(i) for i in ids if int(i) < 256).decode("utf-8", errors="replace")
+
+
+class GenerationBackend:
+    def __init__(self, model, tokenizer, device: str = "cpu", name: str = None):
+        """
+        Wraps a causal LM and its tokenizer for batched greedy generation.
+
+        Args:
+            model: A Hugging Face causal LM (anything returning .logits and .past_key_values)
+            tokenizer: Object with encode(text) and decode(ids, skip_special_tokens=True)
+            device (str, optional): Torch device. Defaults to "cpu".
+            name (str, optional): Which model this is, recorded with generated datasets.
+                Defaults to the model's name_or_path, or its class name.
+        """
+        self.name = name or getattr(model, "name_or_path", None) or type(model).__name__
+        self.model = model.to(device).eval()
+        self.tokenizer = tokenizer
+        self.device = device
+        self.eos_token_id = tokenizer.eos_token_id
+        self.pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+        self.stats = {"calls": 0, "prompt_tokens": 0, "generated_tokens": 0, "prefix_encodes": 0,
+                      "forced_completions": 0}
+        self._prefix_cache = {}
+        self._token_texts = None
+
+    @classmethod
+    def from_pretrained(cls, model_name: str = MODEL_NAME, device: str = "cpu", api_key: str = API_KEY):
+        """
+        Logs into the Hugging Face hub and loads the model once.
+        """
+        from huggingface_hub import login
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+        login(api_key)
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForCausalLM.from_pretrained(model_name)
+        return cls(model, tokenizer, device=device, name=model_name)
+
+    @classmethod
+    def tiny_random(cls, seed: int = 0, hidden_size: int = 64, num_layers: int = 2, device: str = "cpu"):
+        """
+        Randomly initialised Llama-shaped model over ByteTokenizer, for measuring
+        throughput and exercising the pipeline on a CPU-only box.
+        """
+        torch = _torch()
+        from transformers import LlamaConfig, LlamaForCausalLM
+        tokenizer = ByteTokenizer()
+        config = LlamaConfig(
+            vocab_size=tokenizer.vocab_size,
+            hidden_size=hidden_size,
+            intermediate_size=2 * hidden_size,
+            num_hidden_layers=num_layers,
+            num_attention_heads=4,
+            num_key_value_heads=4,
+            max_position_embeddings=4096,
+            pad_token_id=tokenizer.pad_token_id,
+            eos_token_id=tokenizer.eos_token_id,
+        )
+        torch.manual_seed(seed)
+        return cls(LlamaForCausalLM(config), tokenizer, device=device,
+                   name=f"tiny_random(seed={seed}, hidden_size={hidden_size}, num_layers={num_layers})")
+
+    def _pad_left(self, sequences: list):
+        """
+        Left-pads token id lists so every row ends at the last column.
+        """
+        torch = _torch()
+        width = max(len(seq) for seq in sequences)
+        input_ids = torch.full((len(sequences), width), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(sequences), width), dtype=torch.long)
+        for i, seq in enumerate(sequences):
+            if seq:
+                input_ids[i, width - len(seq):] = torch.tensor(seq, dtype=torch.long)
+                attention_mask[i, width - len(seq):] = 1
+        return input_ids.to(self.device), attention_mask.to(self.device)
+
+    @_no_grad
+    def _encode_prefix(self, prefix: str):
+        """
+        Runs the shared prefix through the model once and keeps its KV cache.
+        """
+        torch = _torch()
+        if prefix not in self._prefix_cache:
+            prefix_ids = self.tokenizer.encode(prefix)
+            input_ids = torch.tensor([prefix_ids], dtype=torch.long, device=self.device)
+            out = self.model(input_ids=input_ids, use_cache=True, logits_to_keep=1)
+            self.stats["prefix_encodes"] += 1
+            self._prefix_cache[prefix] = (prefix_ids, out.past_key_values)
+        return self._prefix_cache[prefix]
+
+    @staticmethod
+    def _expand_cache(past_key_values, batch_size: int):
+        """
+        Copies a batch-1 KV cache out to batch_size rows. Decoding appends to the
+        cache in place, so the stored prefix cache is never handed out directly.
+        """
+        if isinstance(past_key_values, tuple):
+            return tuple(
+                tuple(t.expand(batch_size, *t.shape[1:]).contiguous() for t in layer)
+                for layer in past_key_values
+            )
+        past_key_values = copy.deepcopy(past_key_values)
+        past_key_values.batch_repeat_interleave(batch_size)
+        return past_key_values
+
+    def _finished(self, ids: list, stop: list) -> bool:
+        if ids and ids[-1] == self.eos_token_id:
+            return True
+        if not stop:
+            return False
+        text = self.tokenizer.decode(ids, skip_special_tokens=True).lstrip()
+        return any(s in text for s in stop)
+
+    def _truncate(self, ids: list, stop: list) -> str:
+        text = self.tokenizer.decode(ids, skip_special_tokens=True).lstrip()
+        cut = len(text)
+        for s in stop or []:
+            idx = text.find(s)
+            if idx != -1:
+                cut = min(cut, idx)
+        return text[:cut].strip()
+
+    def _token_text(self, token_id: int) -> str:
+        if self._token_texts is None:
+            vocab_size = self.model.get_output_embeddings().weight.shape[0]
+            self._token_texts = [self.tokenizer.decode([i], skip_special_tokens=True) for i in range(vocab_size)]
+        return self._token_texts[token_id]
+
+    def _constrained_step(self, logits, constraint, states: list, generated: list, done: list, stop: list):
+        """
+        Picks, per row, the highest scoring token that keeps the output a viable
+        prefix of the grammar, which is greedy decoding over masked logits.
+        Eos and stop sequences are only allowed once the output parses.
+        """
+        torch = _torch()
+        next_ids = []
+        for i in range(logits.shape[0]):
+            if done[i]:
+                next_ids.append(self.pad_token_id)
+                continue
+            choice = None
+            for token_id in torch.argsort(logits[i], descending=True).tolist():
+                if token_id == self.eos_token_id:
+                    if constraint.is_complete(states[i]):
+                        choice, done[i] = token_id, True
+                        break
+                    continue
+                text = self._token_text(token_id)
+                # empty (special) tokens and partial multi-byte characters can't be checked
+                if not text or "\ufffd" in text:
+                    continue
+                cuts = [text.find(s) for s in stop or [] if s in text]
+                if cuts:
+                    head = constraint.advance(states[i], text[:min(cuts)])
+                    if head is not None and constraint.is_complete(head):
+                        choice, states[i], done[i] = token_id, head, True
+                        break
+                    continue
+                state = constraint.advance(states[i], text)
+                if state is not None:
+                    choice, states[i] = token_id, state
+                    break
+            if choice is None:
+                # nothing in the vocabulary continues the expression
+                done[i] = True
+                choice = self.pad_token_id
+            else:
+                generated[i].append(choice)
+            next_ids.append(choice)
+        return torch.tensor(next_ids, dtype=torch.long, device=self.device)
+
+    @_no_grad
+    def _decode_loop(self, input_ids, attention_mask, max_new_tokens: int, stop: list, past_key_values=None,
+                     constraint=None):
+        """
+        Greedy decoding over a left-padded batch, reusing the KV cache between steps.
+        Rows stop independently on eos or any stop sequence. With a constraint
+        (see constrained_decoding.GrammarConstraint) tokens are masked to the grammar.
+        """
+        torch = _torch()
+        batch_size = input_ids.shape[0]
+        generated = [[] for _ in range(batch_size)]
+        done = [False] * batch_size
+        states = [constraint.start() for _ in range(batch_size)] if constraint is not None else None
+
+        position_ids = (attention_mask.cumsum(-1) - 1).clamp(min=0)
+        step_ids = input_ids
+        step_positions = position_ids[:, -input_ids.shape[1]:]
+        next_position = position_ids[:, -1:] + 1
+
+        for _ in range(max_new_tokens):
+            out = self.model(
+                input_ids=step_ids,
+                attention_mask=attention_mask,
+                position_ids=step_positions,
+                past_key_values=past_key_values,
+                use_cache=True,
+                logits_to_keep=1,
+            )
+            past_key_values = out.past_key_values
+            if constraint is not None:
+                next_ids = self._constrained_step(out.logits[:, -1, :], constraint, states, generated, done, stop)
+            else:
+                next_ids = out.logits[:, -1, :].argmax(dim=-1)
+                for i in range(batch_size):
+                    if done[i]:
+                        continue
+                    generated[i].append(int(next_ids[i]))
+                    done[i] = self._finished(generated[i], stop)
+            if all(done):
+                break
+
+            # finished rows keep decoding pad tokens so the batch stays rectangular
+            next_ids = torch.where(torch.tensor(done, device=self.device), self.pad_token_id, next_ids)
+            step_ids = next_ids[:, None]
+            step_positions = next_position
+            next_position = next_position + 1
+            attention_mask = torch.cat([attention_mask, torch.ones((batch_size, 1), dtype=attention_mask.dtype, device=self.device)], dim=1)
+
+        self.stats["generated_tokens"] += sum(len(ids) for ids in generated)
+        outputs = [self._truncate(ids, stop) for ids in generated]
+        if constraint is not None:
+            for i, state in enumerate(states):
+                if constraint.is_complete(state):
+                    continue
+                # out of budget mid-expression: close it so the row still parses
+                tail = constraint.completion(state)
+                if tail is not None:
+                    self.stats["forced_completions"] += 1
+                    outputs[i] = (self.tokenizer.decode(generated[i], skip_special_tokens=True) + tail).strip()
+        return outputs
+
+    def generate(self, prompts: list, max_new_tokens: int = 64, stop: list = STOP_SEQUENCES,
+                 prefix: str = None, prefix_cache: bool = True, constraint=None) -> list:
+        """
+        Generates a completion for each prompt in a single padded batch.
+
+        Args:
+            prompts (list): Prompt strings, placed after prefix if one is given
+            max_new_tokens (int, optional): Generation budget per prompt. Defaults to 64.
+            stop (list, optional): Stop sequences, output is cut before the first one.
+            prefix (str, optional): Text shared by every prompt. Defaults to None.
+            prefix_cache (bool, optional): Encode prefix once and reuse its KV cache
+                instead of re-encoding it in every row. Defaults to True.
+            constraint (GrammarConstraint, optional): Restrict output to a grammar. Defaults to None.
+
+        Returns:
+            List of completions, aligned with prompts
+        """
+        torch = _torch()
+        self.stats["calls"] += 1
+        if not prefix:
+            sequences = [self.tokenizer.encode(p) for p in prompts]
+            self.stats["prompt_tokens"] += sum(len(seq) for seq in sequences)
+            input_ids, attention_mask = self._pad_left(sequences)
+            return self._decode_loop(input_ids, attention_mask, max_new_tokens, stop, constraint=constraint)
+
+        # prefix and prompts are tokenized separately in both modes so the
+        # model sees the same ids whether or not the cache is used
+        suffixes = [self.tokenizer.encode(p, add_special_tokens=False) for p in prompts]
+        if not prefix_cache:
+            prefix_ids = self.tokenizer.encode(prefix)
+            sequences = [prefix_ids + seq for seq in suffixes]
+            self.stats["prompt_tokens"] += sum(len(seq) for seq in sequences)
+            input_ids, attention_mask = self._pad_left(sequences)
+            return self._decode_loop(input_ids, attention_mask, max_new_tokens, stop, constraint=constraint)
+
+        prefix_ids, prefix_past = self._encode_prefix(prefix)
+        self.stats["prompt_tokens"] += sum(len(seq) for seq in suffixes)
+        input_ids, suffix_mask = self._pad_left(suffixes)
+        # padding sits between prefix and prompt, the mask hides it and
+        # positions are taken from the mask so they stay contiguous
+        prefix_mask = torch.ones((len(prompts), len(prefix_ids)), dtype=suffix_mask.dtype, device=self.device)
+        attention_mask = torch.cat([prefix_mask, suffix_mask], dim=1)
+        past_key_values = self._expand_cache(prefix_past, len(prompts))
+        return self._decode_loop(input_ids, attention_mask, max_new_tokens, stop, past_key_values=past_key_values,
+                                 constraint=constraint)
+
+
+def generate_batched(backend: GenerationBackend, prompts: list, batch_size: int = 8,
+                     max_new_tokens: int = 64, stop: list = STOP_SEQUENCES,
+                     prefix: str = None, prefix_cache: bool = True, constraint=None) -> list:
+    """
+    Runs prompts through the backend in batches of batch_size. Prompts are
+    grouped by length to keep padding low; results come back in input order.
+    prefix and constraint are passed through to GenerationBackend.generate.
+    """
+    order = sorted(range(len(prompts)), key=lambda i: len(prompts[i]))
+    responses = [None] * len(prompts)
+    for start in range(0, len(order), batch_size):
+        idx = order[start:start + batch_size]
+        outputs = backend.generate([prompts[i] for i in idx], max_new_tokens=max_new_tokens, stop=stop,
+                                   prefix=prefix, prefix_cache=prefix_cache, constraint=constraint)
+        for i, response in zip(idx, outputs):
+            responses[i] = response
+    return responses
+
+
+def generate_questions(num_questions: int, variables: list, templates: list, math_expressions: list,
+                       backend: GenerationBackend = None, batch_size: int = 8, max_new_tokens: int = 64,
+                       stop: list = STOP_SEQUENCES, prefix_cache: bool = True, constrained: bool = False,
+                       output_path: str = "causal_questions_dataset.csv", output_format: str = None,
+                       chunk_size: int = 256, seed: int = 0, resume: bool = True):
+    """
+    Samples questions and generates y_pred in batches, streaming rows to
+    output_path one chunk at a time. An interrupted run with the same arguments
+    resumes after the last written chunk and produces the same rows, a
+    finished one is returned as it is. Any other arguments, model included,
+    start a new dataset.
+
+    Args:
+        backend (GenerationBackend, optional): Loaded model. Defaults to MODEL_NAME from the hub.
+        batch_size (int, optional): Prompts per model call. Defaults to 8.
+        max_new_tokens (int, optional): Generation budget per prompt. Defaults to 64.
+        stop (list, optional): Stop sequences. Defaults to STOP_SEQUENCES.
+        prefix_cache (bool, optional): Reuse the KV cache of PROMPT_PREFIX. Defaults to True.
+        constrained (bool, optional): Mask tokens so y_pred always follows CausalGrammar. Defaults to False.
+        output_format (str, optional): "csv" or "parquet". Defaults to the output_path extension.
+        chunk_size (int, optional): Rows per write and checkpoint. Defaults to 256.
+        seed (int, optional): Seed for the template and variable draws. Defaults to 0.
+        resume (bool, optional): Continue an interrupted run. Defaults to True.
+
+    Returns:
+        The DatasetWriter manifest
+    """
+    params = {
+        "num_questions": num_questions,
+        "seed": seed,
+        "variables": [list(v) for v in variables],
+        "templates": list(templates),
+        "math_expressions": list(math_expressions),
+        "max_new_tokens": max_new_tokens,
+        "constrained": constrained,
+        "model": backend.name if backend is not None else MODEL_NAME,
+        "batch_size": batch_size,
+        "prefix_cache": prefix_cache,
+        "stop": list(stop),
+    }
+    writer = DatasetWriter(output_path, ["Natural Language Question", "y_true", "y_pred"],
+                           fmt=output_format, params=params, resume=resume)
+    if writer.complete:
+        return writer.manifest
 
-        data.append((question, math_expr, response))
+    if backend is None:
+        backend = GenerationBackend.from_pretrained(MODEL_NAME)
+    constraint = None
+    if constrained:
+        from constrained_decoding import GrammarConstraint
+        from syntax_eval import CausalGrammar
+        constraint = GrammarConstraint.from_grammar(CausalGrammar().grammar)
 
-    df = pd.DataFrame(data, columns=["Natural Language Question", "y_true", "y_pred"])
-    df.to_csv("causal_questions_dataset.csv", index=False)
+    with writer:
+        for start in range(writer.rows_written, num_questions, chunk_size):
+            rows = sample_rows(min(chunk_size, num_questions - start), variables, templates, math_expressions,
+                               seed=seed, start=start)
+            prompts = [build_question_prompt(question) for question, _ in rows]
+            responses = generate_batched(backend, prompts, batch_size=batch_size, max_new_tokens=max_new_tokens,
+                                         stop=stop, prefix=PROMPT_PREFIX, prefix_cache=prefix_cache,
+                                         constraint=constraint)
+            writer.write([(question, math_expr, response) for (question, math_expr), response in zip(rows, responses)])
+    return writer.manifest
 
 def main():
     generate_questions(10, variables=VARIABLES, templates=TEMPLATES, math_expressions=MATH_EXPRESSIONS)
@@ -0,0 +1,156 @@
+"""
+Bit-matrix backend for checking many small DAGs at once.
+
+A GraphBatch stacks B graphs over one shared node list as a packed
+(B, n, ceil(n / 8)) uint8 array, bit [b, i, j] set for an edge i -> j: 8x
+smaller than a bool matrix and far smaller than networkx dicts-of-dicts. The
+checks below unpack a chunk of graphs at a time and run as array operations
+across the whole chunk.
+
+    batch = GraphBatch.from_graphs(graphs)
+    acyclic = batch.is_acyclic()
+    same_class = batch.markov_equivalent(GraphBatch.from_graphs(gold, nodes=batch.nodes))
+"""
+
+import networkx as nx
+import numpy as np
+
+
+class GraphBatch:
+    def __init__(self, nodes: list, packed, present=None):
+        """
+        Args:
+            nodes (list): Node labels, shared by all graphs
+            packed: uint8 array of shape (B, n, ceil(n / 8)), see np.packbits
+            present (optional): bool array (B, n), which nodes each graph has.
+                Defaults to all of them.
+        """
+        self.nodes = list(nodes)
+        self.index = {v: i for i, v in enumerate(self.nodes)}
+        self.packed = packed
+        if present is None:
+            present = np.ones((len(packed), len(self.nodes)), dtype=bool)
+        self.present = present
+
+    @classmethod
+    def from_graphs(cls, graphs, nodes=None):
+        """
+        Args:
+            graphs: networkx DiGraphs
+            nodes (list, optional): Node order. Defaults to every node of the
+                graphs, sorted by str.
+        """
+        graphs = list(graphs)
+        if nodes is None:
+            nodes = sorted({v for G in graphs for v in G}, key=str)
+        index = {v: i for i, v in enumerate(nodes)}
+        n = len(nodes)
+        adjacency = np.zeros((len(graphs), n, n), dtype=bool)
+        present = np.zeros((len(graphs), n), dtype=bool)
+        for b, G in enumerate(graphs):
+            present[b, [index[v] for v in G]] = True
+            if G.number_of_edges():
+                sources, targets = zip(*((index[u], index[v]) for u, v in G.edges))
+                adjacency[b, list(sources), list(targets)] = True
+        return cls(nodes, np.packbits(adjacency, axis=-1), present)
+
+    def __len__(self):
+        return len(self.packed)
+
+    def adjacency(self, start: int = 0, stop: int = None):
+        """
+        Unpacked bool adjacency (B, n, n) of graphs start:stop.
+        """
+        n = len(self.nodes)
+        return np.unpackbits(self.packed[start:stop], axis=-1, count=n).astype(bool)
+
+    def to_graph(self, b: int) -> nx.DiGraph:
+        G = nx.DiGraph()
+        G.add_nodes_from(v for v, here in zip(self.nodes, self.present[b]) if here)
+        sources, targets = np.nonzero(self.adjacency(b, b + 1)[0])
+        G.add_edges_from((self.nodes[i], self.nodes[j]) for i, j in zip(sources, targets))
+        return G
+
+    def to_graphs(self) -> list:
+        return [self.to_graph(b) for b in range(len(self))]
+
+    def _chunks(self, chunk_size):
+        for start in range(0, len(self), chunk_size):
+            yield start, self.adjacency(start, start + chunk_size)
+
+    def skeletons(self, chunk_size: int = 65536):
+        """
+        Symmetric bool adjacency (B, n, n) of the undirected skeletons.
+        """
+        return np.concatenate([adj | adj.transpose(0, 2, 1) for _, adj in self._chunks(chunk_size)]) \
+            if len(self) else np.zeros((0, len(self.nodes), len(self.nodes)), dtype=bool)
+
+    @staticmethod
+    def _v_structure_mask(adj):
+        # [b, p, c, q]: p -> c <- q, p and q non-adjacent, p < q
+        skeleton = adj | adj.transpose(0, 2, 1)
+        n = adj.shape[-1]
+        upper = np.triu(np.ones((n, n), dtype=bool), k=1)
+        return adj[:, :, :, None] & adj.transpose(0, 2, 1)[:, None, :, :] \
+            & (~skeleton & upper)[:, :, None, :]
+
+    def v_structures(self, b: int) -> set:
+        """
+        v-structures of graph b, as markov_equivalence.get_v_structures returns them.
+        """
+        mask = self._v_structure_mask(self.adjacency(b, b + 1))[0]
+        found = set()
+        for p, c, q in zip(*np.nonzero(mask)):
+            parents = sorted((self.nodes[p], self.nodes[q]), key=str)
+            found.add((parents[0], self.nodes[c], parents[1]))
+        return found
+
+    def count_v_structures(self, chunk_size: int = 4096):
+        """
+        Number of v-structures per graph, (B,) int array.
+        """
+        counts = [self._v_structure_mask(adj).sum(axis=(1, 2, 3)) for _, adj in self._chunks(chunk_size)]
+        return np.concatenate(counts) if counts else np.zeros(0, dtype=int)
+
+    @staticmethod
+    def _closure(adj):
+        # paths of length 1..2^k after k squarings; float32 so the path counts
+        # can't overflow and matmul goes through BLAS
+        reach = adj.astype(np.float32)
+        n = adj.shape[-1]
+        for _ in range(max(1, int(np.ceil(np.log2(max(n, 2)))))):
+            reach = ((reach + np.matmul(reach, reach)) > 0).astype(np.float32)
+        return reach.astype(bool)
+
+    def ancestor_closure(self, chunk_size: int = 16384):
+        """
+        Bool (B, n, n), [b, i, j] set when there is a directed path i -> ... -> j,
+        i.e. i is an ancestor of j.
+        """
+        n = len(self.nodes)
+        parts = [self._closure(adj) for _, adj in self._chunks(chunk_size)]
+        return np.concatenate(parts) if parts else np.zeros((0, n, n), dtype=bool)
+
+    def is_acyclic(self, chunk_size: int = 16384):
+        """
+        (B,) bool, True for graphs without a directed cycle.
+        """
+        parts = [~np.diagonal(self._closure(adj), axis1=1, axis2=2).any(axis=1) for _, adj in self._chunks(chunk_size)]
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=bool)
+
+    def markov_equivalent(self, other, chunk_size: int = 4096):
+        """
+        Element-wise markov_equivalence of self[b] and other[b], (B,) bool.
+        Both batches must use the same node list.
+        """
+        if self.nodes != other.nodes or len(self) != len(other):
+            raise ValueError("batches must have the same nodes and length")
+        result = np.all(self.present == other.present, axis=1)
+        for start, adj in self._chunks(chunk_size):
+            stop = start + len(adj)
+            other_adj = other.adjacency(start, stop)
+            same_skeleton = np.all((adj | adj.transpose(0, 2, 1)) == (other_adj | other_adj.transpose(0, 2, 1)),
+                                   axis=(1, 2))
+            same_v = np.all(self._v_structure_mask(adj) == self._v_structure_mask(other_adj), axis=(1, 2, 3))
+            result[start:stop] &= same_skeleton & same_v
+        return result
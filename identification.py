@@ -0,0 +1,381 @@
+"""
+Identification of causal effects with the ID algorithm (Shpitser & Pearl,
+"Identification of Joint Interventional Distributions in Recursive
+Semi-Markovian Causal Models", 2006).
+
+Unlike the rule loop in normalize_expr, ID always terminates, runs in
+polynomial time and is complete: it returns either an estimand in terms of
+the observational distribution or a hedge proving none exists.
+
+Graphs are networkx DiGraphs as built by expr_to_digraph. Unobserved
+confounding is given either as bidirected pairs or as latent nodes of the
+DiGraph, which are projected out.
+
+    result = identify(G, {"Y"}, {"X"}, bidirected=[("X", "Z")])
+    print(result.estimand if result.identifiable else result.hedge)
+"""
+
+from typing import NamedTuple
+
+import networkx as nx
+
+from causal_ast import Node
+from dseparation import MutilatedGraph, check_dag, node_set
+
+
+class Prob(Node):
+    """
+    P(outcome | given) of the observational distribution.
+    """
+    __slots__ = ("outcome", "given")
+    _fields = ("outcome", "given")
+
+    def __str__(self):
+        outcome = ",".join(map(str, self.outcome))
+        if self.given:
+            return f"P({outcome}|{','.join(map(str, self.given))})"
+        return f"P({outcome})"
+
+
+class Sum(Node):
+    __slots__ = ("over", "body")
+    _fields = ("over", "body")
+
+    def __str__(self):
+        body = f"({self.body})" if isinstance(self.body, Ratio) else str(self.body)
+        return "".join(f"Σ_{{{v}}} " for v in self.over) + body
+
+
+class Product(Node):
+    __slots__ = ("terms",)
+    _fields = ("terms",)
+
+    def __str__(self):
+        if not self.terms:
+            return "1"
+        return " * ".join(str(t) if isinstance(t, Prob) else f"({t})" for t in self.terms)
+
+
+class Ratio(Node):
+    __slots__ = ("numerator", "denominator")
+    _fields = ("numerator", "denominator")
+
+    def __str__(self):
+        return f"({self.numerator}) / ({self.denominator})"
+
+
+class Hedge(NamedTuple):
+    """
+    Witness of non-identifiability: two C-forests F' ⊂ F sharing their root set.
+    """
+    F: frozenset
+    F_prime: frozenset
+
+
+class IdentificationResult(NamedTuple):
+    outcome: frozenset
+    treatment: frozenset
+    conditions: frozenset
+    estimand: Node = None
+    hedge: Hedge = None
+
+    @property
+    def identifiable(self) -> bool:
+        return self.hedge is None
+
+
+class _HedgeFound(Exception):
+    def __init__(self, hedge):
+        self.hedge = hedge
+
+
+class _Latent:
+    """
+    Explicit latent parent standing in for a bidirected edge in d-separation tests.
+    """
+    __slots__ = ("pair",)
+
+    def __init__(self, pair):
+        self.pair = pair
+
+    def __repr__(self):
+        return f"U{tuple(self.pair)}"
+
+
+def project_latent(G, latent) -> tuple:
+    """
+    Latent projection of G onto its observed nodes.
+
+    Returns:
+        (directed, bidirected): a DiGraph over the observed nodes, and the set of
+        bidirected pairs (frozensets) between observed nodes sharing a latent ancestor
+    """
+    latent = set(latent)
+    observed = [v for v in G if v not in latent]
+
+    def observed_via_latent(starts):
+        # observed nodes reached from starts along paths whose inner nodes are latent
+        reached, seen, stack = set(), set(), list(starts)
+        while stack:
+            node = stack.pop()
+            if node not in latent:
+                reached.add(node)
+            elif node not in seen:
+                seen.add(node)
+                stack.extend(G.successors(node))
+        return reached
+
+    directed = nx.DiGraph()
+    directed.add_nodes_from(observed)
+    for u in observed:
+        directed.add_edges_from((u, v) for v in observed_via_latent(G.successors(u)))
+    bidirected = set()
+    for l in latent:
+        children = sorted(observed_via_latent(G.successors(l)), key=str)
+        bidirected.update(frozenset((a, b)) for i, a in enumerate(children) for b in children[i + 1:])
+    return directed, bidirected
+
+
+class ADMG:
+    """
+    Acyclic directed mixed graph: directed edges plus bidirected edges for
+    unobserved confounding. Sub-graphs in the algorithm are node sets over one
+    ADMG, so nothing is copied during recursion.
+    """
+
+    def __init__(self, directed, bidirected=()):
+        check_dag(directed)
+        self.directed = directed
+        self.siblings = {v: set() for v in directed}
+        for pair in bidirected:
+            a, b = tuple(pair)
+            if a not in directed or b not in directed:
+                raise nx.NodeNotFound(f"Bidirected edge {a}<->{b} has a node not in G")
+            self.siblings[a].add(b)
+            self.siblings[b].add(a)
+        self.order = {v: i for i, v in enumerate(nx.lexicographical_topological_sort(directed, key=str))}
+
+    @classmethod
+    def from_graph(cls, G, bidirected=(), latent=()):
+        if latent:
+            G, projected = project_latent(G, latent)
+            bidirected = projected | {frozenset(pair) for pair in bidirected}
+        return cls(G, bidirected)
+
+    def sorted(self, nodes) -> tuple:
+        return tuple(sorted(nodes, key=self.order.__getitem__))
+
+    def ancestors(self, nodes, within, cut_incoming=frozenset()) -> frozenset:
+        """
+        Ancestors of nodes (nodes included) in the sub-graph over within, with
+        the arrows into cut_incoming removed.
+        """
+        seen = set(nodes)
+        stack = list(nodes)
+        while stack:
+            node = stack.pop()
+            if node in cut_incoming:
+                continue
+            for parent in self.directed._pred[node]:
+                if parent in within and parent not in seen:
+                    seen.add(parent)
+                    stack.append(parent)
+        return frozenset(seen)
+
+    def districts(self, within) -> list:
+        """
+        C-components of the sub-graph over within.
+        """
+        remaining = set(within)
+        components = []
+        while remaining:
+            start = remaining.pop()
+            component, stack = {start}, [start]
+            while stack:
+                for sibling in self.siblings[stack.pop()]:
+                    if sibling in remaining:
+                        remaining.discard(sibling)
+                        component.add(sibling)
+                        stack.append(sibling)
+            components.append(frozenset(component))
+        return components
+
+    def with_latents(self) -> nx.DiGraph:
+        """
+        DAG with a _Latent parent per bidirected edge, for d-separation tests.
+        """
+        G = self.directed.copy()
+        pairs = {frozenset((a, b)) for a in self.siblings for b in self.siblings[a]}
+        for pair in pairs:
+            latent = _Latent(pair)
+            G.add_edges_from((latent, v) for v in pair)
+        return G
+
+
+def _marginal(P, over, variables):
+    """
+    Σ_over P, simplified where possible. variables is the set P is over.
+    """
+    over = frozenset(over) & variables
+    if not over:
+        return P
+    if isinstance(P, Prob) and not P.given:
+        return Prob(tuple(v for v in P.outcome if v not in over), ())
+    if isinstance(P, Sum):
+        return _marginal(P.body, over | frozenset(P.over), variables | frozenset(P.over))
+    if isinstance(P, Product) and all(isinstance(term, Prob) for term in P.terms):
+        # Σ_v P(v|...) = 1 when v appears in no other term
+        terms, over = list(P.terms), set(over)
+        removable = [t for t in terms if len(t.outcome) == 1 and t.outcome[0] in over]
+        while removable:
+            term = removable.pop()
+            v = term.outcome[0]
+            if not any(v in other.given or v in other.outcome for other in terms if other is not term):
+                terms.remove(term)
+                over.discard(v)
+                removable = [t for t in terms if len(t.outcome) == 1 and t.outcome[0] in over]
+        P = _product(tuple(terms)) if terms else Product(())
+        if not over:
+            return P
+    return Sum(tuple(sorted(over, key=str)), P)
+
+
+def _conditional(P, v, given, variables):
+    """
+    P(v | given) from P, a distribution over variables.
+    """
+    if isinstance(P, Prob) and not P.given:
+        return Prob((v,), given)
+    if isinstance(P, Product):
+        # a chain of conditionals in topological order factorizes P already
+        for term in P.terms:
+            if isinstance(term, Prob) and term.outcome == (v,) and frozenset(term.given) & variables == frozenset(given):
+                return term
+    numerator = _marginal(P, variables - frozenset(given) - {v}, variables)
+    if not given:
+        return numerator
+    return Ratio(numerator, _marginal(P, variables - frozenset(given), variables))
+
+
+class _Identifier:
+    def __init__(self, admg):
+        self.admg = admg
+        self._memo = {}
+
+    def identify(self, y, x, P, within):
+        key = (y, x, P, within)
+        if key not in self._memo:
+            self._memo[key] = self._identify(y, x, P, within)
+        return self._memo[key]
+
+    def _prefix(self, v, within):
+        order = self.admg.order
+        return self.admg.sorted(u for u in within if order[u] < order[v])
+
+    def _identify(self, y, x, P, V):
+        admg = self.admg
+        # line 1: no intervention, marginalize
+        if not x:
+            return _marginal(P, V - y, V)
+
+        # line 2: drop everything that is not an ancestor of y
+        ancestors = admg.ancestors(y, V)
+        if ancestors != V:
+            return self.identify(y, x & ancestors, _marginal(P, V - ancestors, V), ancestors)
+
+        # line 3: intervene on nodes that do not affect y once x is fixed
+        w = (V - x) - admg.ancestors(y, V, cut_incoming=x)
+        if w:
+            return self.identify(y, x | w, P, V)
+
+        districts = admg.districts(V - x)
+        # line 4: factorize over the c-components of G \ X
+        if len(districts) > 1:
+            factors = [self.identify(s, V - s, P, V) for s in districts]
+            return _marginal(Product(tuple(_flatten(factors))), V - (y | x), V)
+
+        s = districts[0]
+        top = admg.districts(V)
+        # line 5: G is a single c-component, hedge
+        if len(top) == 1:
+            raise _HedgeFound(Hedge(V, s))
+
+        # line 6: s is a c-component of G
+        if s in top:
+            factors = tuple(_conditional(P, v, self._prefix(v, V), V) for v in admg.sorted(s))
+            return _marginal(_product(factors), s - y, s)
+
+        # line 7: s lies inside a larger c-component s_prime
+        s_prime = next(d for d in top if s < d)
+        factors = tuple(_conditional(P, v, self._prefix(v, V), V) for v in admg.sorted(s_prime))
+        return self.identify(y, x & s_prime, _product(factors), s_prime)
+
+
+def _flatten(factors):
+    for factor in factors:
+        if isinstance(factor, Product):
+            yield from factor.terms
+        else:
+            yield factor
+
+
+def _product(factors):
+    return factors[0] if len(factors) == 1 else Product(factors)
+
+
+def identify(G, outcome, treatment=(), conditions=(), bidirected=(), latent=()) -> IdentificationResult:
+    """
+    Identifies P(outcome | do(treatment), conditions).
+
+    Conditions are handled as in IDC (Shpitser & Pearl 2006): a condition that
+    rule 2 can turn into an action moves into the treatment, and the rest is
+    conditioned on at the end.
+
+    Args:
+        G: networkx DiGraph of the causal structure.
+        outcome, treatment, conditions: Nodes or iterables of nodes.
+        bidirected (optional): Pairs of nodes with an unobserved common cause.
+        latent (optional): Nodes of G that are unobserved; they are projected out.
+
+    Returns:
+        IdentificationResult with the estimand, or the hedge if not identifiable.
+        The estimand may mention non-ancestors of the outcome that ID adds to the
+        treatment; its value is the same for any setting of them.
+    """
+    admg = ADMG.from_graph(G, bidirected, latent)
+    y, x, z = node_set(G, outcome), node_set(G, treatment), node_set(G, conditions)
+    missing = (y | x | z) - admg.directed.nodes
+    if missing:
+        raise nx.NodeNotFound(f"The node(s) {missing} are not found in G")
+    if y & x or y & z or x & z:
+        raise ValueError("outcome, treatment and conditions must be disjoint")
+
+    if z:
+        dag = admg.with_latents()
+        moved = True
+        while moved:
+            moved = False
+            for w in admg.sorted(z):
+                # rule 2 in G with arrows into x and out of w removed
+                view = MutilatedGraph(dag, cut_incoming=x, cut_outgoing={w})
+                if view.is_d_separator(set(y), {w}, set(x | z - {w})):
+                    x, z = x | {w}, z - {w}
+                    moved = True
+                    break
+
+    V = frozenset(admg.directed.nodes)
+    try:
+        joint = _Identifier(admg).identify(y | z, x, Prob(admg.sorted(V), ()), V)
+    except _HedgeFound as found:
+        return IdentificationResult(y, x, z, hedge=found.hedge)
+    estimand = joint if not z else Ratio(joint, _marginal(joint, y, y | z))
+    return IdentificationResult(y, x, z, estimand=estimand)
+
+
+def identify_query(G, expression, bidirected=(), latent=()) -> IdentificationResult:
+    """
+    identify for an expression such as "P(Y | do(X), Z)" or a CausalQuery.
+    """
+    from normalize_expr import CausalQuery, parse_query
+    query = expression if isinstance(expression, CausalQuery) else parse_query(expression)
+    return identify(G, query.outcome, query.do, query.obs, bidirected=bidirected, latent=latent)
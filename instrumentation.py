@@ -0,0 +1,171 @@
+"""
+Opt-in counters, timers and events for the do-calculus simplifier.
+
+Nothing is recorded unless a Recorder is active; the instrumented functions
+then only pay for one global lookup per call.
+
+    with instrumentation.record() as recorder:
+        simplify_expression(G, "P(Y | do(X), Z)")
+    print(recorder.counts["d_separation"], recorder.seconds["d_separation"])
+    recorder.export_trace("trace.jsonl")
+
+Counter names (timed ones also have an entry in seconds):
+
+- simplify_expression, dag_to_causal_expression: calls (timed)
+- fixpoint_iterations: passes of the rule loop in simplify_expression
+- rule_1, rule_2, rule_3: rule attempts (timed); rule_n_applied: successes
+- cache_hits, cache_misses: SimplifyCache lookups
+- acyclicity_checks: check_dag (timed)
+- mutilations: MutilatedGraph views; edge_removals: arrows they mask
+- graph_copies: MutilatedGraph.to_graph materialisations (timed)
+- d_separation: Bayes-ball traversals, each answering one d-separation query
+  or a batch of them (timed, includes the ancestors it needs)
+- ancestors: ancestor computations (timed)
+
+Every outermost call to simplify_expression or dag_to_causal_expression is
+recorded as a Trace with its own counters and events.
+"""
+
+import contextlib
+import functools
+import json
+import time
+from collections import Counter, defaultdict
+from typing import NamedTuple
+
+# the active Recorder, None when instrumentation is off
+recorder = None
+
+_OFF = contextlib.nullcontext()
+
+
+class Event(NamedTuple):
+    """
+    kind is "rule_applied" or "trace" (sent to the callback when a trace ends).
+    at is in seconds since the start of the enclosing trace.
+    """
+    kind: str
+    at: float
+    data: dict
+
+
+class Trace(NamedTuple):
+    name: str
+    expression: str
+    seconds: float
+    counts: dict
+    timings: dict
+    events: list
+
+
+class Recorder:
+    def __init__(self, callback=None, keep_traces: bool = True):
+        """
+        Args:
+            callback (optional): Called with every Event as it happens.
+            keep_traces (bool, optional): Keep a Trace per outermost call in
+                self.traces. Defaults to True.
+        """
+        self.callback = callback
+        self.keep_traces = keep_traces
+        self.counts = Counter()
+        self.seconds = defaultdict(float)
+        self.traces = []
+        self._depth = 0
+        self._started = time.perf_counter()
+        self._events = []
+
+    def count(self, name: str, n: int = 1):
+        self.counts[name] += n
+
+    def add_time(self, name: str, seconds: float):
+        self.counts[name] += 1
+        self.seconds[name] += seconds
+
+    def event(self, kind: str, **data):
+        event = Event(kind, time.perf_counter() - self._started, data)
+        if self._depth:
+            self._events.append(event)
+        if self.callback is not None:
+            self.callback(event)
+
+    @contextlib.contextmanager
+    def trace(self, name: str, expression):
+        """
+        Times a call as name. The outermost one also becomes a Trace.
+        """
+        start = time.perf_counter()
+        outer = self._depth == 0
+        if outer:
+            self._started = start
+            self._events = []
+            counts, seconds = self.counts.copy(), dict(self.seconds)
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            elapsed = time.perf_counter() - start
+            self.add_time(name, elapsed)
+            if outer:
+                trace = Trace(name, str(expression), elapsed, dict(self.counts - counts),
+                              {k: v - seconds.get(k, 0.0) for k, v in self.seconds.items() if v != seconds.get(k)},
+                              self._events)
+                if self.keep_traces:
+                    self.traces.append(trace)
+                if self.callback is not None:
+                    self.callback(Event("trace", elapsed, {"name": name, "expression": trace.expression,
+                                                           "counts": trace.counts}))
+
+    def summary(self) -> dict:
+        return {"counts": dict(self.counts), "seconds": dict(self.seconds), "traces": len(self.traces)}
+
+    def export_trace(self, path: str):
+        """
+        Writes one JSON line per Trace, with its counters, timings and events.
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            for trace in self.traces:
+                record = trace._asdict()
+                record["events"] = [dict(event.data, kind=event.kind, at=event.at) for event in trace.events]
+                f.write(json.dumps(record, default=str) + "\n")
+
+
+@contextlib.contextmanager
+def record(callback=None, keep_traces: bool = True):
+    """
+    Activates a new Recorder for the duration of the block and yields it.
+    """
+    global recorder
+    previous = recorder
+    recorder = Recorder(callback, keep_traces)
+    try:
+        yield recorder
+    finally:
+        recorder = previous
+
+
+def trace(name: str, expression):
+    """
+    recorder.trace(name, expression), or a no-op context when nothing is recorded.
+    """
+    return _OFF if recorder is None else recorder.trace(name, expression)
+
+
+def timed(name: str):
+    """
+    Decorator: counts and times calls as name while a Recorder is active.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            active = recorder
+            if active is None:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                active.add_time(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
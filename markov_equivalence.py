@@ -1,3 +1,4 @@
+import hashlib
 import networkx as nx
 
 def get_skeleton(G):
@@ -5,35 +6,127 @@ def get_skeleton(G):
     return skeleton
 
 
+def get_skeleton_edges(G):
+    """
+    Labeled skeleton as a set of unordered node pairs, O(V + E).
+    """
+    return {frozenset(edge) for edge in G.edges}
+
+
 def get_v_structures(G):
+    """
+    All immoralities parent1 -> node <- parent2 with the parents non-adjacent,
+    at nodes with any number of parents. Returned as (parent1, node, parent2)
+    with the parents in a fixed order.
+
+    Runs in O(V + E) plus the number of parent pairs, which is the number of
+    v-structures plus the number of shielded (adjacent) parent pairs.
+    """
     v_structures = set()
+    pred, succ = G._pred, G._succ
     for node in G.nodes:
-        parents = list(G.predecessors(node))
-        if len(parents) == 2:
-            parent1, parent2 = parents
-            if not G.has_edge(parent1, parent2) and not G.has_edge(parent2, parent1):
-                v_structures.add(tuple(sorted([parent1, node, parent2])))  # V-structure (X -> Z <- Y)
+        parents = sorted(pred[node], key=str)
+        for i, parent1 in enumerate(parents):
+            for parent2 in parents[i + 1:]:
+                if parent2 not in succ[parent1] and parent2 not in pred[parent1]:
+                    v_structures.add((parent1, node, parent2))  # V-structure (X -> Z <- Y)
     return v_structures
 
 def markov_equivalence(G1, G2):
     """
     Two graphs are Markov Equivalent iff they have the same
-    skeleton and same immoralities
+    skeleton and same immoralities. Nodes are compared by label, so this
+    is linear in the size of the graphs plus their v-structures.
     """
-    if (G1.nodes != G2.nodes):
+    if set(G1.nodes) != set(G2.nodes):
         return False
-    
-    skeleton1 = get_skeleton(G1)
-    skeleton2 = get_skeleton(G2)
-
-    if not nx.is_isomorphic(skeleton1, skeleton2):
-        return False  
-    
-    # immoralities 
+
+    if G1.number_of_edges() != G2.number_of_edges():
+        return False
+    if get_skeleton_edges(G1) != get_skeleton_edges(G2):
+        return False
+
+    # immoralities
     v_structures1 = get_v_structures(G1)
     v_structures2 = get_v_structures(G2)
-    
+
     if v_structures1 == v_structures2:
-        return True 
+        return True
     else:
         return False
+
+
+def _label_edges(G):
+    """
+    Chickering's edge labelling: marks every edge of the DAG as compelled
+    (same direction in the whole equivalence class) or reversible.
+    """
+    order = {v: i for i, v in enumerate(nx.lexicographical_topological_sort(G, key=str))}
+    pred = G._pred
+    # edges x -> y by increasing y, then decreasing x
+    edges = sorted(G.edges, key=lambda e: (order[e[1]], -order[e[0]]))
+    label = {}
+    for x, y in edges:
+        if (x, y) in label:
+            continue
+        done = False
+        for w in pred[x]:
+            if label[(w, x)] != "compelled":
+                continue
+            if w not in pred[y]:
+                for z in pred[y]:
+                    label[(z, y)] = "compelled"
+                done = True
+                break
+            label[(w, y)] = "compelled"
+        if done:
+            continue
+        # another parent of y not adjacent to x makes x -> y part of a v-structure
+        compelled = any(z != x and z not in pred[x] for z in pred[y])
+        for z in pred[y]:
+            if (z, y) not in label:
+                label[(z, y)] = "compelled" if compelled else "reversible"
+    return label
+
+
+def get_cpdag(G):
+    """
+    CPDAG (essential graph) of a DAG: compelled edges stay directed, reversible
+    ones appear in both directions.
+    """
+    cpdag = nx.DiGraph()
+    cpdag.add_nodes_from(G.nodes)
+    for (x, y), kind in _label_edges(G).items():
+        cpdag.add_edge(x, y)
+        if kind == "reversible":
+            cpdag.add_edge(y, x)
+    return cpdag
+
+
+def cpdag_hash(G):
+    """
+    Stable hash of the Markov equivalence class of a DAG: two DAGs over the same
+    node labels get the same hash iff they are Markov equivalent. Nodes are
+    identified by str(), so the hash is the same across processes.
+    """
+    directed, undirected = [], []
+    for (x, y), kind in _label_edges(G).items():
+        if kind == "compelled":
+            directed.append((str(x), str(y)))
+        else:
+            undirected.append(tuple(sorted((str(x), str(y)))))
+    canonical = repr((sorted(map(str, G.nodes)), sorted(directed), sorted(undirected)))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def equivalence_classes(graphs):
+    """
+    Groups DAGs into Markov equivalence classes in one pass.
+
+    Returns:
+        dict from cpdag_hash to the positions of the graphs in that class
+    """
+    classes = {}
+    for i, G in enumerate(graphs):
+        classes.setdefault(cpdag_hash(G), []).append(i)
+    return classes
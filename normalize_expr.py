@@ -1,15 +1,20 @@
 import re
 import itertools
+import heapq
+import time
+import weakref
 import networkx as nx
-import sympy as sp
 from itertools import chain
 import logging
-import matplotlib.pyplot as plt
+from collections import OrderedDict
+from functools import lru_cache, wraps
+from typing import NamedTuple
 
+import instrumentation
+from dseparation import MutilatedGraph, check_dag
 
-logging.basicConfig()
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+
+logger = logging.getLogger(__name__)
 
 
 # def expr_to_digraph(expr: str):
@@ -105,6 +110,200 @@ def expr_to_digraph(expr: str, causal_structure=None):
     return G
 
 
+class CausalQuery(NamedTuple):
+    """
+    Immutable form of P(outcome | do(X), ..., Z, ...) that the rules work on.
+    do and obs keep their order of appearance, without duplicates.
+    Strings are only parsed and produced at the boundary (parse_query / str()).
+    """
+    outcome: tuple
+    do: tuple = ()
+    obs: tuple = ()
+
+    def __str__(self):
+        outcome = ','.join(self.outcome)
+        terms = [f'do({x})' for x in self.do] + list(self.obs)
+        if terms:
+            return f"P({outcome}|{','.join(terms)})"
+        return f"P({outcome})"
+
+
+def _split_top_level(text, sep):
+    """
+    Splits text on sep, ignoring separators nested inside brackets.
+    """
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(text):
+        if ch in '([{':
+            depth += 1
+        elif ch in ')]}':
+            depth -= 1
+        elif ch == sep and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return parts
+
+
+def _unique(items):
+    return tuple(dict.fromkeys(items))
+
+
+@lru_cache(maxsize=4096)
+def parse_query(expression):
+    """
+    Parses 'P(Y | do(X), do(Z,W), V)' into a CausalQuery. do() may hold
+    several variables and terms may contain nested brackets.
+    """
+    expression = ''.join(expression.split())
+    if not (expression.startswith('P(') and expression.endswith(')')):
+        raise ValueError(f"Invalid causal expression: {expression}")
+    body = expression[2:-1]
+    sides = _split_top_level(body, '|')
+    if len(sides) > 2:
+        raise ValueError(f"Invalid causal expression: {expression}")
+
+    outcome = tuple(v for v in _split_top_level(sides[0], ',') if v)
+    do_terms, condition_terms = [], []
+    if len(sides) == 2:
+        for term in _split_top_level(sides[1], ','):
+            if term.startswith('do(') and term.endswith(')'):
+                do_terms.extend(v for v in _split_top_level(term[3:-1], ',') if v)
+            elif term:
+                condition_terms.append(term)
+    if not outcome:
+        raise ValueError(f"Invalid causal expression: {expression}")
+    return CausalQuery(outcome, _unique(do_terms), _unique(condition_terms))
+
+
+def _rule_1_candidates(G, query):
+    """
+    Conditions that rule 1 can remove from query.
+    """
+    if not query.obs:
+        return set()
+    # remove all incoming edges into a do() term
+    G_modified = MutilatedGraph(G, cut_incoming=query.do)
+
+    # a condition z can be removed if the outcome is independent of it given
+    # X and the other conditions; one traversal answers every z
+    return G_modified.leave_one_out_separated(set(query.outcome), set(query.obs), set(query.do))
+
+
+def _rule_2_candidates(G, query):
+    """
+    do() terms that rule 2 can turn into conditions.
+    """
+    if not query.do:
+        return set()
+
+    # here we try to convert each do(Z) to Z
+    candidates = set(query.do[1:] if len(query.do) > 1 else query.do)
+
+    # G-{UX:U\in V(G)} - {ZU:U\in V(G)}. Cutting the arrows out of every
+    # candidate at once is safe: the other candidates are conditioned on
+    # and have no incoming arrows left, so their outgoing ones are blocked anyway
+    G_modified = MutilatedGraph(G, cut_incoming=query.do, cut_outgoing=candidates)
+
+    # if Y and Z are d-seperated by X \cup W in G** Where G** = G-{UX:U\in V(G)} - {ZU:U\in V(G)}
+    # with W the other interventions
+    return G_modified.leave_one_out_separated(
+        set(query.outcome), candidates, (set(query.do) - candidates) | set(query.obs))
+
+
+def _rule_3_candidates(G, query):
+    """
+    do() terms that rule 3 can remove from query.
+    """
+    if len(query.do) < 2:
+        return set()
+
+    primary_intervention = query.do[0]
+    secondary_interventions = query.do[1:]
+
+    # G* = G-{UX:U\in V(G)}
+    G_star = MutilatedGraph(G, cut_incoming=query.do)
+
+    # G** = G* - {UZ : U \in V(G*) \land UW \not in E(G*)}. Every Z is a do()
+    # variable whose incoming arrows are already gone in G*, so G** = G* for
+    # all of them and one traversal answers every Z
+    conditioning_set = set([primary_intervention]) | set(query.obs)
+    return G_star.separated_from(set(query.outcome), set(secondary_interventions), conditioning_set)
+
+
+def _instrumented_rule(number):
+    """
+    Counts and times attempts of a rule while a Recorder is active, and records
+    every application as a rule_applied event.
+    """
+    name = f"rule_{number}"
+
+    def decorator(rule):
+        @wraps(rule)
+        def wrapper(G, query):
+            recorder = instrumentation.recorder
+            if recorder is None:
+                return rule(G, query)
+            start = time.perf_counter()
+            result = rule(G, query)
+            recorder.add_time(name, time.perf_counter() - start)
+            if result != query:
+                recorder.count(f"{name}_applied")
+                recorder.event("rule_applied", rule=number, before=str(query), after=str(result))
+            return result
+        return wrapper
+    return decorator
+
+
+@_instrumented_rule(1)
+def _rule_1(G, query):
+    if not query.obs:
+        return query
+    check_dag(G)
+    removable_conditions = _rule_1_candidates(G, query)
+
+    if removable_conditions:
+        return query._replace(obs=tuple(c for c in query.obs if c not in removable_conditions))
+    return query
+
+
+@_instrumented_rule(2)
+def _rule_2(G, query):
+    if not query.do:
+        return query
+    check_dag(G)
+    convertible_interventions = _rule_2_candidates(G, query)
+
+    if convertible_interventions:
+        # Convert applicable do(Z) terms to observation Z
+        return query._replace(do=tuple(x for x in query.do if x not in convertible_interventions),
+                              obs=_unique(query.obs + tuple(x for x in query.do if x in convertible_interventions)))
+    return query
+
+
+@_instrumented_rule(3)
+def _rule_3(G, query):
+    if len(query.do) < 2:
+        return query
+    check_dag(G)
+    removable_interventions = _rule_3_candidates(G, query)
+
+    if removable_interventions:
+        return query._replace(do=tuple(x for x in query.do if x not in removable_interventions))
+    return query
+
+
+def _at_boundary(rule, G, expression):
+    """
+    Runs a rule on a CausalQuery, or parses and re-formats a string.
+    """
+    if isinstance(expression, CausalQuery):
+        return rule(G, expression)
+    query = parse_query(expression)
+    result = rule(G, query)
+    return str(result) if result is not query else expression.replace(" ", "")
+
+
 def apply_rule_1(G, expression):
     """
     https://plato.stanford.edu/entries/causal-models/do-calculus.html
@@ -117,58 +316,10 @@ def apply_rule_1(G, expression):
 
     Args:
         G: The DAG representing causal relationships.
-        expression: The causal expression
+        expression: The causal expression, a string or CausalQuery.
+            The result has the same type.
     """
-    expression = expression.replace(" ", "")
-
-    parts = expression.split('|')  
-    outcome = parts[0].replace('P(', '').replace(')', '') 
-    
-    right_side = parts[1].replace(')', '')  
-    terms = right_side.split(',')  # :: List[Str]
-    logger.debug(terms)
-    logger.debug(G.nodes)
-    
-    do_terms = []
-    condition_terms = []
-    
-    for term in terms:
-        if 'do(' in term:
-            do_terms.append(term.replace('do(', ''))
-        else:
-            condition_terms.append(term)
-    
-    G_modified = G.copy()
-    for do_var in do_terms:
-        # remove all incoming edges into a do() term
-        for predecessor in list(G.predecessors(do_var)):
-            G_modified.remove_edge(predecessor, do_var)
-    
-    # check each conditoning variable to see if it can be removed
-    removable_conditions = []
-    for z in condition_terms:
-        # check if outcome is independent of z 
-        other_conditions = [c for c in condition_terms if c != z]
-        
-
-        if nx.is_d_separator(G_modified, outcome, z, set(do_terms) | set(other_conditions)):
-            removable_conditions.append(z)
-    
-    if removable_conditions:
-        new_conditions = [c for c in condition_terms if c not in removable_conditions]
-        
-        if do_terms and new_conditions:
-            new_expression = f"P({outcome}|{','.join(['do(' + x + ')' for x in do_terms])},{','.join(new_conditions)})"
-        elif do_terms:
-            new_expression = f"P({outcome}|{','.join(['do(' + x + ')' for x in do_terms])})"
-        elif new_conditions:
-            new_expression = f"P({outcome}|{','.join(new_conditions)})"
-        else:
-            new_expression = f"P({outcome})"
-        print('APPLIED RULE 1')
-        return new_expression
-    else:
-        return expression
+    return _at_boundary(_rule_1, G, expression)
 
 def apply_rule_2(G, expression):
     """
@@ -179,68 +330,7 @@ def apply_rule_2(G, expression):
     In the DAG, we remove the arrow going into X and out of Z
     (Generalization of the Back-Door Criteria)
     """
-    expression = expression.replace(" ", "") 
-    
-    parts = expression.split('|')
-    outcome = parts[0].replace('P(', '').replace(')', '')
-    
-    right_side = parts[1].replace(')', '')
-    terms = right_side.split(',')
-    
-    do_terms = []
-    condition_terms = []
-    
-    for term in terms:
-        if 'do(' in term:
-            do_terms.append(term.replace('do(', '').replace(')', ''))
-        else:
-            condition_terms.append(term)
-    
-    if not do_terms:
-        return expression
-    
-    # here we try to convert each do(Z) to Z
-    convertible_interventions = []
-    
-    for z_var in do_terms:
-        if len(do_terms) > 1 and z_var == do_terms[0]:
-            continue
-            
-        # G-{UX:U\in V(G)}
-        G_modified = G.copy()
-        for do_var in do_terms:
-            for predecessor in list(G.predecessors(do_var)):
-                G_modified.remove_edge(predecessor, do_var)
-
-        #  G-{UX:U\in V(G)} - {ZU:U\in V(G)}
-        for successor in list(G.successors(z_var)):
-            G_modified.remove_edge(z_var, successor)
-        
-        # Other interventions (W)
-        other_interventions = [x for x in do_terms if x != z_var]
-        
-        # if Y and Z are d-seperated by X \cup W in G** Where G** = G-{UX:U\in V(G)} - {ZU:U\in V(G)}
-        if nx.is_d_separator(G_modified, {outcome}, {z_var}, set(other_interventions) | set(condition_terms)):
-            convertible_interventions.append(z_var)
-    
-    if convertible_interventions:
-        # Convert applicable do(Z) terms to observation Z
-        new_do_terms = [x for x in do_terms if x not in convertible_interventions]
-        new_conditions = condition_terms + convertible_interventions
-        
-        if new_do_terms and new_conditions:
-            new_expression = f"P({outcome}|{','.join(['do(' + x + ')' for x in new_do_terms])},{','.join(new_conditions)})"
-        elif new_do_terms:
-            new_expression = f"P({outcome}|{','.join(['do(' + x + ')' for x in new_do_terms])})"
-        elif new_conditions:
-            new_expression = f"P({outcome}|{','.join(new_conditions)})"
-        else:
-            new_expression = f"P({outcome})"
-        print(f'APPLIED RULE 2')
-
-        return new_expression
-    else:
-        return expression
+    return _at_boundary(_rule_2, G, expression)
 
 
 def apply_rule_3(G, expression):
@@ -252,99 +342,319 @@ def apply_rule_3(G, expression):
     In the DAG we remove all arrow going out of X and all nodes of Z that are not 
     ancestors of W.
     """
-    expression = expression.replace(" ", "")
-    
-    parts = expression.split('|')
-    outcome = parts[0].replace('P(', '').replace(')', '')
-    
-    right_side = parts[1].replace(')', '')
-    terms = right_side.split(',')
-    
-    do_terms = []
-    condition_terms = []
-    
-    for term in terms:
-        if 'do(' in term:
-            do_terms.append(term.replace('do(', '').replace(')', ''))
-        else:
-            condition_terms.append(term)
-    
-    if len(do_terms) < 2:
-        return expression
-    
-    removable_interventions = []
-    
-    primary_intervention = do_terms[0]
-    secondary_interventions = do_terms[1:]
-    
-    for z_var in secondary_interventions:
-        G_star = G.copy()
-        
-        # Create G* = G-{UX:U\in V(G)}
-        for do_var in do_terms:
-            for predecessor in list(G.predecessors(do_var)):
-                G_star.remove_edge(predecessor, do_var)
-        
-        ancestors_of_W = set()
-        for w in condition_terms:
-            if w in G_star.nodes:
-                ancestors = nx.ancestors(G_star, w)
-                ancestors_of_W.update(ancestors)
-                ancestors_of_W.add(w) 
-
-        # G** = G* - {UZ : U \in V(G*) \land UW \not in E(G*)}
-        G_modified = G_star.copy()
-        for predecessor in list(G_star.predecessors(z_var)):
-            if predecessor not in ancestors_of_W:
-                G_modified.remove_edge(predecessor, z_var)
-        
-        conditioning_set = set([primary_intervention]) | set(condition_terms)
-        
-        if nx.is_d_separator(G_modified, {outcome}, {z_var}, conditioning_set):
-            removable_interventions.append(z_var)
-    
-    if removable_interventions:
-        new_do_terms = [x for x in do_terms if x not in removable_interventions]
-        
-        if new_do_terms and condition_terms:
-            new_expression = f"P({outcome}|{','.join(['do(' + x + ')' for x in new_do_terms])},{','.join(condition_terms)})"
-        elif new_do_terms:
-            new_expression = f"P({outcome}|{','.join(['do(' + x + ')' for x in new_do_terms])})"
-        elif condition_terms:
-            new_expression = f"P({outcome}|{','.join(condition_terms)})"
+    return _at_boundary(_rule_3, G, expression)
+
+
+
+class GraphKey:
+    """
+    Interned structure of a graph: there is one GraphKey per distinct pair of
+    node and edge sets alive at a time, so keys compare by identity and every
+    cache entry for a graph shares the same sets.
+    """
+    __slots__ = ("nodes", "edges", "__weakref__")
+
+    def __init__(self, nodes, edges):
+        self.nodes = nodes
+        self.edges = edges
+
+
+_GRAPH_KEYS = weakref.WeakValueDictionary()
+
+# entry of G.__networkx_cache__, which networkx clears whenever G is mutated
+_GRAPH_KEY_ENTRY = "normalize_expr.graph_fingerprint"
+
+
+def graph_fingerprint(G):
+    """
+    Canonical key for the structure of G: the same GraphKey exactly for graphs
+    with the same nodes and edges, whatever order they were added in. Building
+    it is O(V + E), no sorting, and happens once per graph object: the key is
+    kept in G.__networkx_cache__ until G changes. Views don't get one, since
+    changes to the graph they look at don't clear it.
+    """
+    memo = None if hasattr(G, "_graph") else getattr(G, "__networkx_cache__", None)
+    if memo is not None:
+        key = memo.get(_GRAPH_KEY_ENTRY)
+        if key is not None:
+            return key
+    structure = frozenset(G.nodes), frozenset(G.edges)
+    key = _GRAPH_KEYS.get(structure)
+    if key is None:
+        key = _GRAPH_KEYS[structure] = GraphKey(*structure)
+    if memo is not None:
+        memo[_GRAPH_KEY_ENTRY] = key
+    return key
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    maxsize: int
+    currsize: int
+
+
+class SimplifyCache:
+    """
+    Bounded LRU of rule results keyed by (graph fingerprint, rule, CausalQuery).
+    simplify_expression stores its final result under the rule "simplify" and
+    every intermediate rule application under the rule's name.
+    """
+
+    def __init__(self, maxsize=65536):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        result = self._entries.get(key)
+        if result is None:
+            self.misses += 1
         else:
-            new_expression = f"P({outcome})"
-        print(f'APPLIED RULE 3')
+            self.hits += 1
+            self._entries.move_to_end(key)
+        return result
 
-        return new_expression
-    else:
-        return expression
+    def put(self, key, result):
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        self._evict()
 
+    def _evict(self):
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
 
+    def resize(self, maxsize):
+        self.maxsize = maxsize
+        self._evict()
 
-def simplify_expression(G, expr):
-    prev_expr = None
-    expr = expr.replace(' ', '')
-    while prev_expr != expr:  
-        prev_expr = expr
-        expr = apply_rule_1(G, expr)
-        expr = apply_rule_2(G, expr)
-        expr = apply_rule_3(G, expr)
-        expr = expr.replace(' ', '')
-    return expr
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.evictions, self.maxsize, len(self._entries))
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+
+SIMPLIFY_CACHE = SimplifyCache()
+
+
+def _cached(cache, fingerprint, name, compute, query):
+    if cache is None:
+        return compute(query)
+    key = (fingerprint, name, query)
+    result = cache.get(key)
+    recorder = instrumentation.recorder
+    if recorder is not None:
+        recorder.count("cache_misses" if result is None else "cache_hits")
+    if result is None:
+        result = compute(query)
+        cache.put(key, result)
+    return result
+
+
+def simplify_expression(G, expr, cache=SIMPLIFY_CACHE):
+    """
+    Applies rules 1-3 until the expression stops changing. The expression is
+    parsed once and the loop runs on CausalQuery values.
+
+    Args:
+        G: The DAG representing causal relationships.
+        expr: The causal expression, a string or CausalQuery.
+            The result has the same type.
+        cache (SimplifyCache, optional): Where final and intermediate results are
+            memoized. Defaults to SIMPLIFY_CACHE, None disables caching.
 
+    Counted and traced while an instrumentation.record() block is active.
+    """
+    with instrumentation.trace("simplify_expression", expr):
+        return _simplify_expression(G, expr, cache)
+
+
+def _simplify_expression(G, expr, cache):
+    query = expr if isinstance(expr, CausalQuery) else parse_query(expr)
+    fingerprint = graph_fingerprint(G) if cache is not None else None
+    recorder = instrumentation.recorder
+
+    def fixpoint(query):
+        prev_query = None
+        while prev_query != query:  
+            if recorder is not None:
+                recorder.count("fixpoint_iterations")
+            prev_query = query
+            query = _cached(cache, fingerprint, "rule_1", lambda q: _rule_1(G, q), query)
+            query = _cached(cache, fingerprint, "rule_2", lambda q: _rule_2(G, q), query)
+            query = _cached(cache, fingerprint, "rule_3", lambda q: _rule_3(G, q), query)
+        return query
+
+    query = _cached(cache, fingerprint, "simplify", fixpoint, query)
+    return query if isinstance(expr, CausalQuery) else str(query)
+
+
+
+class SearchStats(NamedTuple):
+    """
+    exhausted is True when every expression within max_depth was expanded
+    before a budget ran out.
+    """
+    expansions: int
+    generated: int
+    table_hits: int
+    max_depth: int
+    seconds: float
+    exhausted: bool
+
+
+class SearchResult(NamedTuple):
+    """
+    expression has the type of the input. steps are the (rule, variable)
+    rewrites from the input to it, inserted observations marked "rule_1^-1".
+    """
+    expression: object
+    cost: tuple
+    steps: tuple
+    stats: SearchStats
+
+
+def rewrite_cost(query):
+    """
+    Default search cost: fewest do() terms, then fewest terms overall.
+    """
+    return (len(query.do), len(query.do) + len(query.obs))
+
+
+def _canonical(query):
+    # the order of the conditions does not change what an expression means or
+    # which rules apply, but rules 2 and 3 treat the first do() term specially
+    return (query.outcome, query.do, frozenset(query.obs))
 
 
-def dag_to_causal_expression(G, outcome):
+def _rewrites(G, query):
+    """
+    Yields (step, query) for every single-variable rule 1-3 rewrite of query,
+    and every observation rule 1 allows inserting. Only rule 1's test is the
+    exact do-calculus condition, so it is the only one that also holds
+    backwards: rules 2 and 3 test in graphs with the arrows into the
+    candidate itself removed, which makes them one-way. Insertions only
+    consider nodes adjacent to a variable of the query, which keeps the
+    branching factor independent of the size of G.
+    """
+    removable = _rule_1_candidates(G, query)
+    for z in query.obs:
+        if z in removable:
+            yield ("rule_1", z), query._replace(obs=tuple(c for c in query.obs if c != z))
+    convertible = _rule_2_candidates(G, query)
+    for z in query.do:
+        if z in convertible:
+            yield ("rule_2", z), query._replace(do=tuple(x for x in query.do if x != z), obs=query.obs + (z,))
+    removable = _rule_3_candidates(G, query)
+    for z in query.do:
+        if z in removable:
+            yield ("rule_3", z), query._replace(do=tuple(x for x in query.do if x != z))
+
+    used = set(query.outcome) | set(query.do) | set(query.obs)
+    adjacent = dict.fromkeys(v for u in chain(query.outcome, query.do, query.obs) if u in G
+                             for v in chain(G._pred[u], G._succ[u]))
+    unused = [v for v in adjacent if v not in used]
+    # adding z as a condition, rule 1 would remove it again iff Y and z are
+    # d-separated by X and W in G-{UX}: one traversal for every z
+    insertable = MutilatedGraph(G, cut_incoming=query.do).separated_from(
+        set(query.outcome), set(unused), set(query.do) | set(query.obs))
+    for z in unused:
+        if z in insertable:
+            yield ("rule_1^-1", z), query._replace(obs=query.obs + (z,))
+
+
+def search_simplify(G, expr, max_expansions=10000, max_seconds=1.0, max_depth=4, cost=rewrite_cost):
+    """
+    Best-first search over single-variable rule 1-3 rewrites and rule 1
+    insertions, so it can reach forms the greedy loop in simplify_expression
+    misses. Each expression is expanded once (transposition table keyed by the
+    expression up to the order of its conditions) and the search stops when
+    either budget runs out.
+
+    Args:
+        G: The DAG representing causal relationships.
+        expr: The causal expression, a string or CausalQuery.
+        max_expansions (int, optional): Node budget. Defaults to 10000.
+        max_seconds (float, optional): Time budget. Defaults to 1.0.
+        max_depth (int, optional): Longest rewrite sequence explored. Defaults to 4.
+        cost (callable, optional): CausalQuery -> sortable cost. Defaults to rewrite_cost.
+
+    Returns:
+        SearchResult with the cheapest expression found
+    """
+    query = expr if isinstance(expr, CausalQuery) else parse_query(expr)
+    check_dag(G)
+    start = time.perf_counter()
+    tie = itertools.count()
+    seen = {_canonical(query)}
+    best = (cost(query), 0, query, ())
+    frontier = [(cost(query), next(tie), 0, query, ())]
+    expansions = generated = table_hits = deepest = 0
+    exhausted = True
+
+    while frontier:
+        if expansions >= max_expansions or time.perf_counter() - start > max_seconds:
+            exhausted = False
+            break
+        _, _, depth, current, steps = heapq.heappop(frontier)
+        if depth == max_depth:
+            continue
+        expansions += 1
+        for step, rewritten in _rewrites(G, current):
+            generated += 1
+            key = _canonical(rewritten)
+            if key in seen:
+                table_hits += 1
+                continue
+            seen.add(key)
+            rewritten_cost = cost(rewritten)
+            deepest = max(deepest, depth + 1)
+            if (rewritten_cost, depth + 1) < best[:2]:
+                best = (rewritten_cost, depth + 1, rewritten, steps + (step,))
+            heapq.heappush(frontier, (rewritten_cost, next(tie), depth + 1, rewritten, steps + (step,)))
+
+    best_cost, _, best_query, best_steps = best
+    stats = SearchStats(expansions, generated, table_hits, deepest, time.perf_counter() - start, exhausted)
+    expression = best_query if isinstance(expr, CausalQuery) else str(best_query)
+    return SearchResult(expression, best_cost, best_steps, stats)
+
+
+
+def dag_to_causal_expression(G, outcome, method="rules"):
     """
     Converts a causal DAG to a standardized causal expression.
     Args:
         G: The DAG representing causal relationships.
         outcome: The target outcome variable
+        method: "rules" simplifies with the do-calculus rule loop, "id" returns
+            the estimand of the ID algorithm (see identification.py), which
+            always terminates and raises ValueError if there is none.
 
     TODO: check if the rules can be infinetly applied
     TODO: Completeness of Do-Calculus (if no rules can be further applied)
     """
+    with instrumentation.trace("dag_to_causal_expression", outcome):
+        expr = _initial_expression(G, outcome)
+        if method == "id":
+            from identification import identify_query
+            result = identify_query(G, expr)
+            if not result.identifiable:
+                raise ValueError(f"{expr} is not identifiable, hedge: {result.hedge}")
+            return str(result.estimand)
+
+        expr = simplify_expression(G, expr)
+    
+    return expr
+
+
+def _initial_expression(G, outcome):
+    """
+    P(outcome | do(direct causes), everything else) for dag_to_causal_expression.
+    """
     all_nodes = list(G.nodes)
     
     disconnected_nodes = [node for node in all_nodes 
@@ -352,8 +662,11 @@ def dag_to_causal_expression(G, outcome):
     
     direct_causes = list(G.predecessors(outcome))
     
+    # a direct cause is already under do(), even when it also confounds another one
     confounders = []
     for node in all_nodes:
+        if node in direct_causes:
+            continue
         for cause in direct_causes:
             if G.has_edge(node, cause) and G.has_edge(node, outcome):
                 confounders.append(node)
@@ -387,12 +700,11 @@ def dag_to_causal_expression(G, outcome):
         else:
             expr = f"P({outcome})"
     
-    expr = simplify_expression(expr)
-    
     return expr
 
 
 def draw_dag(G):
+    import matplotlib.pyplot as plt
     plt.figure(figsize=(10, 7))
     
     pos = nx.spring_layout(G, seed=42)  
@@ -421,12 +733,18 @@ def draw_dag(G):
 
 
 
-# expr = "P(Y | do(X), do(Z), W)"
-# expr = "P(Y | do(X), Z, W)"
-expr = "P(Y | do(X), Z)"
-# expr = "P(Y | do(X), do(W))"
-# causal_struct = {'X': {'Z': {}}, 'Z': {'Y': {}}, 'Y': {}, 'W': {'X': {}}}
-causal_struct = {'X': {'Z': {}}, 'Z': {'Y': {}}, 'Y': {}, 'W': {'X': {}, 'Y': {}}}
-g = expr_to_digraph(expr, causal_struct)
-print(g.adj)
-print(f'ORIGINAL EXPR: {expr}, SIMPLIFIED EXPR: {apply_rule_1(g, expr)}')
\ No newline at end of file
+def main():
+    logging.basicConfig(level=logging.INFO)
+    # expr = "P(Y | do(X), do(Z), W)"
+    # expr = "P(Y | do(X), Z, W)"
+    expr = "P(Y | do(X), Z)"
+    # expr = "P(Y | do(X), do(W))"
+    # causal_struct = {'X': {'Z': {}}, 'Z': {'Y': {}}, 'Y': {}, 'W': {'X': {}}}
+    causal_struct = {'X': {'Z': {}}, 'Z': {'Y': {}}, 'Y': {}, 'W': {'X': {}, 'Y': {}}}
+    g = expr_to_digraph(expr, causal_struct)
+    print(g.adj)
+    print(f'ORIGINAL EXPR: {expr}, SIMPLIFIED EXPR: {apply_rule_1(g, expr)}')
+
+
+if __name__ == "__main__":
+    main()
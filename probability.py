@@ -7,6 +7,24 @@ https://docs.sympy.org/latest/guides/custom-functions.html
 
 import sympy as sp
 import re
+from functools import lru_cache
+
+# P( effect | do(X), do(W), Z, ... )
+_PARSE_PATTERN = re.compile(r"P\(\s*([\w]+)\s*(?:\|\s*((?:do\(\s*[\w]+\s*\)(?:,\s*)?)*)((?:[\w]+(?:,\s*[\w]+)*)?))?\s*\)")
+_DO_PATTERN = re.compile(r"do\(\s*([\w]+)\s*\)")
+
+PARSE_CACHE_SIZE = 65536
+
+# process-wide symbol table, every parse of "X" yields the same sp.Symbol
+_SYMBOLS = {}
+
+
+def get_symbol(name: str) -> sp.Symbol:
+    symbol = _SYMBOLS.get(name)
+    if symbol is None:
+        symbol = _SYMBOLS[name] = sp.Symbol(name)
+    return symbol
+
 
 class Probability(sp.Function):
     def __new__(cls, *args):
@@ -55,46 +73,55 @@ class CausalProbability(Probability):
         - 'P(Y | X)' 
         - 'P(Y | do(X), Z)' 
         - 'P(Y | do(X), do(W), Z)'
+
+        Results are cached by the whitespace-free string (see cache_info),
+        so repeated expressions are parsed once.
+        """
+        return _parse_cached(cls, "".join(expr_str.split()))
+
+    @staticmethod
+    def cache_info():
         """
-        expr_str = expr_str.replace(' ', '')
-        # pattern = r"P\(\s*([\w]+)\s*\|\s*((?:do\(\s*[\w]+\s*\)(?:,\s*)?)*)((?:,\s*[\w]+)*)?\s*\)"
-        pattern = r"P\(\s*([\w]+)\s*(?:\|\s*((?:do\(\s*[\w]+\s*\)(?:,\s*)?)*)((?:[\w]+(?:,\s*[\w]+)*)?))?\s*\)"
-
-        match = re.match(pattern, expr_str)
-        
-        if not match:
-            raise ValueError(f"Invalid format: {expr_str}")
-        
-        effect, do_part, obs_part = match.groups()
-        print(f"Effect: {effect}, Interventions: {do_part}, Observed: {obs_part}")
-        symbols = {}
-        
-        def get_symbol(name):
-            if name not in symbols:
-                symbols[name] = sp.Symbol(name)
-            return symbols[name]
-        
-        outcome = get_symbol(effect)
-
-        do_vars = []
-        if do_part:
-            do_pattern = r"do\(\s*([\w]+)\s*\)"
-            do_vars = re.findall(do_pattern, do_part)
-        
-        obs_vars = []
+        Hits, misses, maxsize and currsize of the parse cache.
+        """
+        return _parse_cached.cache_info()
+
+    @staticmethod
+    def cache_clear():
+        _parse_cached.cache_clear()
+
+
+def _parse_uncached(cls, expr_str):
+    match = _PARSE_PATTERN.match(expr_str)
+    
+    if not match:
+        raise ValueError(f"Invalid format: {expr_str}")
+    
+    effect, do_part, obs_part = match.groups()
+    outcome = get_symbol(effect)
+
+    do_vars = []
+    if do_part:
+        do_vars = _DO_PATTERN.findall(do_part)
+    
+    obs_vars = []
+    if obs_part:
+        obs_part = obs_part.strip(",")
         if obs_part:
-            obs_part = obs_part.strip(",")
-            if obs_part:
-                obs_vars = [z.strip() for z in obs_part.split(",")]
-
-        conditions = []
-        for do_str in do_vars:
-            conditions.append(Do(get_symbol(do_str)))
-        
-        for obs_str in obs_vars:
-            conditions.append((get_symbol(obs_str)))
-        
-        return cls(outcome, *conditions)
+            obs_vars = [z.strip() for z in obs_part.split(",")]
+
+    conditions = []
+    for do_str in do_vars:
+        conditions.append(Do(get_symbol(do_str)))
+    
+    for obs_str in obs_vars:
+        conditions.append((get_symbol(obs_str)))
+    
+    return cls(outcome, *conditions)
+
+
+# sympy expressions are immutable, so cached results can be shared
+_parse_cached = lru_cache(maxsize=PARSE_CACHE_SIZE)(_parse_uncached)
 
 
 
@@ -0,0 +1,252 @@
+"""
+Persistent, content-addressed store for evaluation results, so re-evaluating
+a dataset only computes rows that are new or changed since an earlier run.
+
+Entries live in one SQLite file and are keyed by content_key of everything the
+result depends on, e.g. the expressions, the causal structure and
+source_digest of the code that computed it. Editing that code or the grammar
+changes every key, so stale results are never returned. They age out by LRU
+eviction once the cache is over its entry or byte limit.
+
+    with ResultCache() as cache:
+        key = content_key(version, y_true, y_pred)
+        found = cache.get_many([key])
+        ...
+        cache.put_many({key: result})
+        print(cache.end_run("nightly").hit_rate)
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import NamedTuple
+
+from syntax_eval import DEFAULT_CACHE_DIR
+
+DEFAULT_PATH = os.path.join(DEFAULT_CACHE_DIR, "results.sqlite")
+
+# SQLite's default limit on bound parameters is 999 before 3.32
+_BATCH = 900
+
+# pending recency updates written out at once if no write flushes them sooner
+_MAX_TOUCHED = 65536
+
+
+def content_key(*parts) -> str:
+    """
+    sha256 of the JSON encoding of parts, stable across processes and runs.
+    """
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def source_digest(*modules) -> str:
+    """
+    sha256 over the source files of modules.
+    """
+    digest = hashlib.sha256()
+    for module in modules:
+        with open(module.__file__, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class ResultCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    maxsize: int
+    currsize: int
+    maxbytes: int
+    currbytes: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class RunInfo(NamedTuple):
+    """
+    Cache counters of one run, as recorded by ResultCache.end_run.
+    """
+    label: str
+    finished: float
+    hits: int
+    misses: int
+    evictions: int
+    currsize: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class ResultCache:
+    """
+    LRU of JSON-serialisable results in SQLite, bounded by entry count and by
+    the total size of the encoded values. Lookups and writes go in batches.
+    Lookups only read. The recency of hits is kept in memory and written with
+    the next put_many, eviction, end_run or close, so concurrent readers
+    don't serialise on write transactions. Hits, misses and evictions are
+    counted per run. end_run records them and starts a new run.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, maxsize: int = 1_000_000, maxbytes: int = 1 << 30):
+        """
+        Args:
+            path (str, optional): SQLite file, created if missing. Defaults to DEFAULT_PATH.
+            maxsize (int, optional): Most entries kept. Defaults to 1000000.
+            maxbytes (int, optional): Most bytes of encoded values kept. Defaults to 1 GiB.
+        """
+        self.path = path
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS results "
+                         "(key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS runs (label TEXT, finished REAL, hits INTEGER, "
+                         "misses INTEGER, evictions INTEGER, currsize INTEGER)")
+        self._db.commit()
+        self.currsize, self.currbytes = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        self.hits = self.misses = self.evictions = 0
+        self._touched = {}
+        self._evict()
+
+    def _select(self, columns: str, keys: list) -> list:
+        rows = []
+        for i in range(0, len(keys), _BATCH):
+            batch = keys[i:i + _BATCH]
+            rows += self._db.execute(f"SELECT key, {columns} FROM results WHERE key IN "
+                                     f"({','.join('?' * len(batch))})", batch).fetchall()
+        return rows
+
+    def get_many(self, keys: list) -> dict:
+        """
+        The cached values of keys, as a dict without the keys that missed.
+        """
+        found = {key: json.loads(value) for key, value in self._select("value", list(dict.fromkeys(keys)))}
+        # counted per key asked for, so the hit rate is per row looked up
+        hits = sum(key in found for key in keys)
+        self.hits += hits
+        self.misses += len(keys) - hits
+        if found:
+            self._touched.update(dict.fromkeys(found, time.time()))
+            if len(self._touched) >= _MAX_TOUCHED:
+                self._flush_touched()
+                self._db.commit()
+        return found
+
+    def _flush_touched(self):
+        # the caller commits
+        if self._touched:
+            self._db.executemany("UPDATE results SET used = ? WHERE key = ?",
+                                 ((used, key) for key, used in self._touched.items()))
+            self._touched = {}
+
+    def put_many(self, items: dict):
+        """
+        Stores key -> value pairs, replacing existing ones, then evicts the least
+        recently used entries until the cache is within its limits.
+        """
+        if not items:
+            return
+        encoded = {key: json.dumps(value) for key, value in items.items()}
+        self._flush_touched()
+        replaced = self._select("size", list(encoded))
+        self.currsize += len(encoded) - len(replaced)
+        self.currbytes += sum(map(len, encoded.values())) - sum(size for _, size in replaced)
+        now = time.time()
+        self._db.executemany("INSERT OR REPLACE INTO results (key, value, size, used) VALUES (?, ?, ?, ?)",
+                             ((key, value, len(value), now) for key, value in encoded.items()))
+        self._evict()
+        self._db.commit()
+
+    def _evict(self):
+        if self.currsize > self.maxsize or self.currbytes > self.maxbytes:
+            # eviction goes by recency
+            self._flush_touched()
+        while self.currsize > self.maxsize or self.currbytes > self.maxbytes:
+            batch = max(self.currsize - self.maxsize, 256)
+            victims = []
+            for key, size in self._db.execute("SELECT key, size FROM results ORDER BY used LIMIT ?", (batch,)):
+                if self.currsize <= self.maxsize and self.currbytes <= self.maxbytes:
+                    break
+                victims.append((key,))
+                self.currsize -= 1
+                self.currbytes -= size
+            if not victims:
+                break
+            self._db.executemany("DELETE FROM results WHERE key = ?", victims)
+            self.evictions += len(victims)
+        self._db.commit()
+
+    def resize(self, maxsize: int = None, maxbytes: int = None):
+        if maxsize is not None:
+            self.maxsize = maxsize
+        if maxbytes is not None:
+            self.maxbytes = maxbytes
+        self._evict()
+
+    def info(self) -> ResultCacheInfo:
+        return ResultCacheInfo(self.hits, self.misses, self.evictions, self.maxsize, self.currsize,
+                               self.maxbytes, self.currbytes)
+
+    def end_run(self, label: str = "") -> RunInfo:
+        """
+        Records the counters of the current run and resets them.
+        """
+        run = RunInfo(label, time.time(), self.hits, self.misses, self.evictions, self.currsize)
+        self._flush_touched()
+        self._db.execute("INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?)", run)
+        self._db.commit()
+        self.hits = self.misses = self.evictions = 0
+        return run
+
+    def runs(self, limit: int = 20) -> list:
+        """
+        The last limit recorded runs, most recent first.
+        """
+        rows = self._db.execute("SELECT * FROM runs ORDER BY finished DESC LIMIT ?", (limit,)).fetchall()
+        return [RunInfo(*row) for row in rows]
+
+    def clear(self):
+        self._db.execute("DELETE FROM results")
+        self._db.commit()
+        self._touched = {}
+        self.currsize = self.currbytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def close(self):
+        self._flush_touched()
+        self._db.commit()
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def main():
+    import sys
+    with ResultCache(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH) as cache:
+        info = cache.info()
+        print(f"{cache.path}: {info.currsize} entries, {info.currbytes / 1e6:.1f}MB")
+        for run in cache.runs():
+            print(f"  {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(run.finished))} {run.label}: "
+                  f"{run.hits} hits, {run.misses} misses ({run.hit_rate:.1%}), {run.evictions} evicted")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,73 @@
+import hashlib
+import importlib.util
+import json
+import multiprocessing
+import os
+import re
+from collections import deque
+from typing import NamedTuple, Optional
 from lark import Lark
-from unidecode import unidecode
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "causaleval")
+
+
+def grammar_digest(grammar: str) -> str:
+    return hashlib.sha256(grammar.encode("utf-8")).hexdigest()
+
+
+# whitespace between two words; no rule of the grammar puts two words side by side
+_NAME_GAP = re.compile(r"(?<=[A-Za-z0-9_])\s+(?=[A-Za-z_])")
+
+
+def join_name_words(expression: str) -> str:
+    """
+    Joins the words of multi-word variable names with "_", so that
+    "E[smoking|do(lung cancer=1)]" becomes "E[smoking|do(lung_cancer=1)]".
+    generate_pairs.VARIABLES has names like these, but a CausalGrammar
+    variable is a single identifier. Expressions that already parse are
+    returned unchanged.
+    """
+    return _NAME_GAP.sub("_", expression)
+
 
 class CausalGrammar:
     def __init__(self):
-        grammar = """
+        # Operators get one rule per precedence level, loosest first:
+        # "=" (non-associative), then "+"/"-", then Σ, then "*" (all left-associative).
+        # Σ_{x} takes a product as its body, so "Σ_{x} A*B - C" is (Σ_{x} A*B) - C.
+        # LALR builds this with no shift/reduce conflicts (Lark(..., strict=True) accepts it).
+        grammar = r"""
             start: expr
 
-            expr: expectation
+            ?expr: sum
+            | sum eq_op sum -> binary_op
+
+            ?sum: term
+            | sum add_op term -> binary_op
+
+            ?term: product
+            | summation
+
+            ?product: atom
+            | product mul_op atom -> binary_op
+
+            ?atom: expectation
             | probability
             | do_expr
-            | summation
             | variable_with_subscript  // Modified variable rule
             | variable
-            | binary_operation
             | "(" expr ")"
 
+            !eq_op: "="
+            !add_op: "+" | "-"
+            !mul_op: "*"
+
             expectation: "E" "[" expr ("|" conditionals)? "]" -> expectation
             probability: "P" "(" expr ("|" conditionals)? ")" -> probability
 
             do_expr: "do" "(" assignment ("," assignment)* ")" -> do_expr
 
-            summation: "Σ" "_{" variable "}" expr -> summation 
-            
-            binary_operation: expr ("+"|"-"|"*"|"=") expr -> binary_op
+            summation: "Σ" "_{" variable "}" term -> summation
 
             conditionals: (assignment | do_expr) ("," (assignment | do_expr))* 
 
@@ -41,38 +86,234 @@ class CausalGrammar:
         """
         self.grammar = grammar
 
+class ParseResult(NamedTuple):
+    """
+    Outcome of checking one expression. Position fields are None for valid
+    input; pretty holds tree.pretty() only when it was asked for.
+    """
+    expression: str
+    valid: bool
+    category: Optional[str] = None
+    message: Optional[str] = None
+    line: Optional[int] = None
+    column: Optional[int] = None
+    pos: Optional[int] = None
+    pretty: Optional[str] = None
+
+
+# Lark exception class -> error category. Matched by name so the copies of
+# these classes inside a standalone parser module are recognised too.
+ERROR_CATEGORIES = {
+    "UnexpectedCharacters": "unexpected_character",
+    "UnexpectedToken": "unexpected_token",
+    "UnexpectedEOF": "unexpected_eof",
+}
+
+
+def _error_result(expression: str, error: Exception) -> ParseResult:
+    category = ERROR_CATEGORIES.get(type(error).__name__, "error")
+    token = getattr(error, "token", None)
+    if category == "unexpected_token" and getattr(token, "type", None) == "$END":
+        category = "unexpected_eof"
+    pos = getattr(error, "pos_in_stream", None)
+    if category == "unexpected_eof":
+        # Lark reports the position of the last token; the input ran out after it
+        pos = len(expression)
+    return ParseResult(expression, False, category, str(error),
+                       getattr(error, "line", None), getattr(error, "column", None), pos)
+
+
 class LarkParser:
-    def __init__(self, grammar: str, parser: str = "lalr"):
+    def __init__(self, grammar: str, parser: str = "lalr", cache_dir: str = None):
         """
         Initialize the parser with a specific grammar.
         
         Args:
             grammar (str): The Lark grammar string
             parser (str, optional): Parser type. Defaults to "lalr".
+            cache_dir (str, optional): Directory to keep the compiled LALR tables in,
+                e.g. DEFAULT_CACHE_DIR. The file is keyed by a hash of the grammar,
+                so editing the grammar recompiles it. Defaults to None (no cache).
+        """
+        self.grammar = grammar
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            cache = os.path.join(cache_dir, f"grammar-{grammar_digest(grammar)[:16]}.lark")
+            self.parser = Lark(self.grammar, parser=parser, cache=cache)
+        else:
+            self.parser = Lark(self.grammar, parser=parser)
+
+    @classmethod
+    def from_standalone(cls, module_path: str, grammar: str = None):
         """
+        Loads a parser module written by emit_standalone. Its LALR tables are
+        loaded as generated instead of being built from the grammar, and
+        causal_ast.to_ast accepts its trees.
+
+        Args:
+            module_path (str): Path of the generated module
+            grammar (str, optional): The grammar the module must have been generated
+                from, otherwise ValueError is raised. Defaults to CausalGrammar.
+        """
+        grammar = grammar or CausalGrammar().grammar
+        spec = importlib.util.spec_from_file_location("causal_grammar_standalone", module_path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        if getattr(module, "GRAMMAR_SHA256", None) != grammar_digest(grammar):
+            raise ValueError(f"{module_path} was generated from a different grammar")
+        self = cls.__new__(cls)
         self.grammar = grammar
-        self.parser = Lark(self.grammar, parser=parser)
+        self.parser = module.Lark_StandAlone()
+        return self
     
-    def parse(self, expression: str):
+    def parse(self, expression: str, verbose: bool = False):
         """
-        Parses the given expression and pretty prints the parse tree if
-        syntax is valid, otherwise prints invalid syntax and returns None.
+        Parses the given expression. With verbose, pretty prints the parse tree
+        if syntax is valid, otherwise prints invalid syntax.
         
         Args:
             expression (str): The expression to parse
+            verbose (bool, optional): Print the outcome. Defaults to False.
         
         Returns:
             Parse tree if valid, None otherwise
         """
         try:
-            # expression = unidecode(expression)  
             tree = self.parser.parse(expression)
-            print("Valid syntax:", tree.pretty())
+            if verbose:
+                print("Valid syntax:", tree.pretty())
             return tree
         except Exception as e:
-            print("Invalid syntax:", e)
+            if verbose:
+                print("Invalid syntax:", e)
             return None
 
+    def check(self, expression: str, pretty: bool = False) -> ParseResult:
+        """
+        Parses the given expression and reports a structured result instead of a tree.
+
+        Args:
+            expression (str): The expression to parse
+            pretty (bool, optional): Include tree.pretty() for valid input. Defaults to False.
+        """
+        return self.parse_checked(expression, pretty)[1]
+
+    def parse_checked(self, expression: str, pretty: bool = False):
+        """
+        check and parse in one pass.
+
+        Returns:
+            (tree, ParseResult), with tree None if the expression is invalid
+        """
+        if not isinstance(expression, str):
+            return None, ParseResult(expression, False, "not_a_string",
+                                     f"Expected a string, got {type(expression).__name__}")
+        try:
+            tree = self.parser.parse(expression)
+        except Exception as e:
+            return None, _error_result(expression, e)
+        return tree, ParseResult(expression, True, pretty=tree.pretty() if pretty else None)
+
+def emit_standalone(grammar: str, module_path: str):
+    """
+    Writes a self-contained LALR parser module for grammar (see
+    LarkParser.from_standalone), tagged with the grammar hash.
+    """
+    from lark.tools.standalone import gen_standalone
+    with open(module_path, "w", encoding="utf-8") as f:
+        gen_standalone(Lark(grammar, parser="lalr"), out=f)
+        f.write(f'\nGRAMMAR_SHA256 = "{grammar_digest(grammar)}"\n')
+
+
+def iter_column(path: str, column: str, chunksize: int = 10000):
+    """
+    Streams one column of a CSV or JSONL (.jsonl/.ndjson) file without loading the whole file.
+    """
+    if path.endswith((".jsonl", ".ndjson")):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line).get(column)
+    else:
+        import pandas as pd
+        for chunk in pd.read_csv(path, usecols=[column], chunksize=chunksize, keep_default_na=False):
+            yield from chunk[column].tolist()
+
+
+_worker_parser = None
+
+
+def _init_worker(grammar: str, cache_dir: str, standalone_path: str):
+    global _worker_parser
+    if standalone_path is not None:
+        _worker_parser = LarkParser.from_standalone(standalone_path, grammar=grammar)
+    else:
+        _worker_parser = LarkParser(grammar, cache_dir=cache_dir)
+
+
+def _check_block(args):
+    expressions, pretty = args
+    return [_worker_parser.check(e, pretty=pretty) for e in expressions]
+
+
+def _blocks(expressions, block_size: int):
+    block = []
+    for expression in expressions:
+        block.append(expression)
+        if len(block) == block_size:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def parse_many(source, column: str = None, grammar: str = None, processes: int = None, chunksize: int = 512,
+               pretty: bool = False, cache_dir: str = DEFAULT_CACHE_DIR, standalone_path: str = None):
+    """
+    Checks many expressions on a process pool and yields a ParseResult per
+    input, in input order. Each worker builds its parser once; input is sent
+    in chunks and only a bounded number of chunks is in flight, so arbitrarily
+    large inputs stream through in constant memory.
+
+    Args:
+        source: Iterable of expression strings, or a CSV/JSONL path (with column)
+        column (str, optional): Column to read when source is a path.
+        grammar (str, optional): Grammar text. Defaults to CausalGrammar.
+        processes (int, optional): Worker count, 0 checks in this process.
+            Defaults to os.cpu_count().
+        chunksize (int, optional): Expressions per dispatched chunk. Defaults to 512.
+        pretty (bool, optional): Include pretty-printed trees. Defaults to False.
+        cache_dir (str, optional): LALR table cache shared by the workers. Defaults to DEFAULT_CACHE_DIR.
+        standalone_path (str, optional): Load workers from an emit_standalone module instead.
+    """
+    if isinstance(source, str):
+        if column is None:
+            raise ValueError("column is required when reading from a file")
+        source = iter_column(source, column)
+    grammar = grammar or CausalGrammar().grammar
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    if processes == 0:
+        _init_worker(grammar, cache_dir, standalone_path)
+        for block in _blocks(source, chunksize):
+            yield from _check_block((block, pretty))
+        return
+
+    # build the table cache once here so workers only load it
+    if standalone_path is None and cache_dir is not None:
+        LarkParser(grammar, cache_dir=cache_dir)
+    with multiprocessing.Pool(processes, initializer=_init_worker,
+                              initargs=(grammar, cache_dir, standalone_path)) as pool:
+        in_flight = deque()
+        for block in _blocks(source, chunksize):
+            in_flight.append(pool.apply_async(_check_block, ((block, pretty),)))
+            if len(in_flight) >= 4 * processes:
+                yield from in_flight.popleft().get()
+        while in_flight:
+            yield from in_flight.popleft().get()
+
+
 def main():
     grammar = CausalGrammar()
     parser = LarkParser(grammar=grammar.grammar)
@@ -90,7 +331,7 @@ def main():
     
     for exp in expressions:
         print(f"\nParsing expression: {exp}")
-        parser.parse(exp)
+        parser.parse(exp, verbose=True)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
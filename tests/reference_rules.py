@@ -0,0 +1,231 @@
+"""
+The string-based do-calculus rules normalize_expr had before the CausalQuery
+IR, unchanged except for their prints and debug logging. The rewrite is
+compared against them in test_normalize_expr.py.
+"""
+
+import networkx as nx
+
+
+def apply_rule_1(G, expression):
+    """
+    https://plato.stanford.edu/entries/causal-models/do-calculus.html
+
+    Rule 1 (Insertion/deletion of observations)
+    P(Y | do(X), Z, W) = P(Y | do(X), W) if Z is independent of y, 
+    given X and potentially other variables W. 
+
+    In the DAG, we remove all arrows going into X.
+
+    Args:
+        G: The DAG representing causal relationships.
+        expression: The causal expression
+    """
+    expression = expression.replace(" ", "")
+
+    parts = expression.split('|')  
+    outcome = parts[0].replace('P(', '').replace(')', '') 
+    
+    right_side = parts[1].replace(')', '')  
+    terms = right_side.split(',')  # :: List[Str]
+    
+    do_terms = []
+    condition_terms = []
+    
+    for term in terms:
+        if 'do(' in term:
+            do_terms.append(term.replace('do(', ''))
+        else:
+            condition_terms.append(term)
+    
+    G_modified = G.copy()
+    for do_var in do_terms:
+        # remove all incoming edges into a do() term
+        for predecessor in list(G.predecessors(do_var)):
+            G_modified.remove_edge(predecessor, do_var)
+    
+    # check each conditoning variable to see if it can be removed
+    removable_conditions = []
+    for z in condition_terms:
+        # check if outcome is independent of z 
+        other_conditions = [c for c in condition_terms if c != z]
+        
+
+        if nx.is_d_separator(G_modified, outcome, z, set(do_terms) | set(other_conditions)):
+            removable_conditions.append(z)
+    
+    if removable_conditions:
+        new_conditions = [c for c in condition_terms if c not in removable_conditions]
+        
+        if do_terms and new_conditions:
+            new_expression = f"P({outcome}|{','.join(['do(' + x + ')' for x in do_terms])},{','.join(new_conditions)})"
+        elif do_terms:
+            new_expression = f"P({outcome}|{','.join(['do(' + x + ')' for x in do_terms])})"
+        elif new_conditions:
+            new_expression = f"P({outcome}|{','.join(new_conditions)})"
+        else:
+            new_expression = f"P({outcome})"
+        return new_expression
+    else:
+        return expression
+
+def apply_rule_2(G, expression):
+    """
+    Rule 2 (Action/Observation Exchange)
+    P(Y|do(X), do(Z), W) = P(Y|do(X), Z, W) if Y and Z are independent,
+    given X and potentially other variables W.
+
+    In the DAG, we remove the arrow going into X and out of Z
+    (Generalization of the Back-Door Criteria)
+    """
+    expression = expression.replace(" ", "") 
+    
+    parts = expression.split('|')
+    outcome = parts[0].replace('P(', '').replace(')', '')
+    
+    right_side = parts[1].replace(')', '')
+    terms = right_side.split(',')
+    
+    do_terms = []
+    condition_terms = []
+    
+    for term in terms:
+        if 'do(' in term:
+            do_terms.append(term.replace('do(', '').replace(')', ''))
+        else:
+            condition_terms.append(term)
+    
+    if not do_terms:
+        return expression
+    
+    # here we try to convert each do(Z) to Z
+    convertible_interventions = []
+    
+    for z_var in do_terms:
+        if len(do_terms) > 1 and z_var == do_terms[0]:
+            continue
+            
+        # G-{UX:U\in V(G)}
+        G_modified = G.copy()
+        for do_var in do_terms:
+            for predecessor in list(G.predecessors(do_var)):
+                G_modified.remove_edge(predecessor, do_var)
+
+        #  G-{UX:U\in V(G)} - {ZU:U\in V(G)}
+        for successor in list(G.successors(z_var)):
+            G_modified.remove_edge(z_var, successor)
+        
+        # Other interventions (W)
+        other_interventions = [x for x in do_terms if x != z_var]
+        
+        # if Y and Z are d-seperated by X \cup W in G** Where G** = G-{UX:U\in V(G)} - {ZU:U\in V(G)}
+        if nx.is_d_separator(G_modified, {outcome}, {z_var}, set(other_interventions) | set(condition_terms)):
+            convertible_interventions.append(z_var)
+    
+    if convertible_interventions:
+        # Convert applicable do(Z) terms to observation Z
+        new_do_terms = [x for x in do_terms if x not in convertible_interventions]
+        new_conditions = condition_terms + convertible_interventions
+        
+        if new_do_terms and new_conditions:
+            new_expression = f"P({outcome}|{','.join(['do(' + x + ')' for x in new_do_terms])},{','.join(new_conditions)})"
+        elif new_do_terms:
+            new_expression = f"P({outcome}|{','.join(['do(' + x + ')' for x in new_do_terms])})"
+        elif new_conditions:
+            new_expression = f"P({outcome}|{','.join(new_conditions)})"
+        else:
+            new_expression = f"P({outcome})"
+
+        return new_expression
+    else:
+        return expression
+
+
+def apply_rule_3(G, expression):
+    """
+    Rule 3 (Insertion/Deletion of Actions)
+    P(Y|do(X), do(Z), W) = P(Y|do(X), W) if Y and Z are indepedent, given
+    X and potentially other variables Z. 
+
+    In the DAG we remove all arrow going out of X and all nodes of Z that are not 
+    ancestors of W.
+    """
+    expression = expression.replace(" ", "")
+    
+    parts = expression.split('|')
+    outcome = parts[0].replace('P(', '').replace(')', '')
+    
+    right_side = parts[1].replace(')', '')
+    terms = right_side.split(',')
+    
+    do_terms = []
+    condition_terms = []
+    
+    for term in terms:
+        if 'do(' in term:
+            do_terms.append(term.replace('do(', '').replace(')', ''))
+        else:
+            condition_terms.append(term)
+    
+    if len(do_terms) < 2:
+        return expression
+    
+    removable_interventions = []
+    
+    primary_intervention = do_terms[0]
+    secondary_interventions = do_terms[1:]
+    
+    for z_var in secondary_interventions:
+        G_star = G.copy()
+        
+        # Create G* = G-{UX:U\in V(G)}
+        for do_var in do_terms:
+            for predecessor in list(G.predecessors(do_var)):
+                G_star.remove_edge(predecessor, do_var)
+        
+        ancestors_of_W = set()
+        for w in condition_terms:
+            if w in G_star.nodes:
+                ancestors = nx.ancestors(G_star, w)
+                ancestors_of_W.update(ancestors)
+                ancestors_of_W.add(w) 
+
+        # G** = G* - {UZ : U \in V(G*) \land UW \not in E(G*)}
+        G_modified = G_star.copy()
+        for predecessor in list(G_star.predecessors(z_var)):
+            if predecessor not in ancestors_of_W:
+                G_modified.remove_edge(predecessor, z_var)
+        
+        conditioning_set = set([primary_intervention]) | set(condition_terms)
+        
+        if nx.is_d_separator(G_modified, {outcome}, {z_var}, conditioning_set):
+            removable_interventions.append(z_var)
+    
+    if removable_interventions:
+        new_do_terms = [x for x in do_terms if x not in removable_interventions]
+        
+        if new_do_terms and condition_terms:
+            new_expression = f"P({outcome}|{','.join(['do(' + x + ')' for x in new_do_terms])},{','.join(condition_terms)})"
+        elif new_do_terms:
+            new_expression = f"P({outcome}|{','.join(['do(' + x + ')' for x in new_do_terms])})"
+        elif condition_terms:
+            new_expression = f"P({outcome}|{','.join(condition_terms)})"
+        else:
+            new_expression = f"P({outcome})"
+
+        return new_expression
+    else:
+        return expression
+
+
+
+def simplify_expression(G, expr):
+    prev_expr = None
+    expr = expr.replace(' ', '')
+    while prev_expr != expr:  
+        prev_expr = expr
+        expr = apply_rule_1(G, expr)
+        expr = apply_rule_2(G, expr)
+        expr = apply_rule_3(G, expr)
+        expr = expr.replace(' ', '')
+    return expr
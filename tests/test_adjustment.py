@@ -0,0 +1,13 @@
+import networkx as nx
+import pytest
+
+from adjustment import adjustment_sets, is_adjustment_set
+
+
+@pytest.mark.parametrize("x, y, z", [("X", "Y", "Z"), (0, 1, 2), (("x", 1), ("y", 1), ("z", 1))])
+def test_adjustment_accepts_any_node_type(x, y, z):
+    G = nx.DiGraph([(z, x), (z, y), (x, y)])
+    assert list(adjustment_sets(G, x, y)) == [frozenset({z})]
+    assert is_adjustment_set(G, x, y, [z])
+    assert is_adjustment_set(G, [x], {y}, {z})
+    assert not is_adjustment_set(G, x, y, [])
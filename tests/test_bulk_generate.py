@@ -0,0 +1,44 @@
+import itertools
+
+import pytest
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+from bulk_generate import bulk_generate, iter_bulk_batches
+from generate_pairs import MATH_EXPRESSIONS, TEMPLATES, VARIABLES
+
+
+def reference_rows(lambda_range):
+    """
+    The templates x variables x λ product, formatted the way sample_rows does it.
+    """
+    rows = []
+    for t, (T, Y, X), x_value in itertools.product(range(len(TEMPLATES)), VARIABLES,
+                                                   range(lambda_range[0], lambda_range[1] + 1)):
+        question = TEMPLATES[t].format(Δ=T, Γ=Y, Λ=X, λ=x_value)
+        math_expr = MATH_EXPRESSIONS[t].replace("Δ", T).replace("Γ", Y).replace("Λ", X).replace("λ", str(x_value))
+        rows.append((question, math_expr))
+    return rows
+
+
+def read_rows(path):
+    table = pq.read_table(path)
+    return list(zip(table.column("Natural Language Question").to_pylist(), table.column("y_true").to_pylist()))
+
+
+def test_full_product_matches_reference_formatting(tmp_path):
+    path = str(tmp_path / "bulk.parquet")
+    # batches of 7 cut through templates and variables
+    assert bulk_generate(path, lambda_range=(0, 12), batch_size=7) == len(reference_rows((0, 12)))
+    assert read_rows(path) == reference_rows((0, 12))
+
+
+def test_sampled_rows_are_reference_rows(tmp_path):
+    path = str(tmp_path / "bulk.parquet")
+    bulk_generate(path, num_rows=500, batch_size=64, seed=3)
+    rows = read_rows(path)
+    assert len(rows) == 500
+    assert set(rows) <= set(reference_rows((0, 188)))
+    again = [row for questions, expressions in iter_bulk_batches(num_rows=500, batch_size=64, seed=3)
+             for row in zip(questions, expressions)]
+    assert again == rows
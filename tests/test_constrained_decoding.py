@@ -0,0 +1,77 @@
+import random
+
+import pytest
+
+from constrained_decoding import GrammarConstraint
+from syntax_eval import CausalGrammar, LarkParser
+
+# token strings of a fake vocabulary, multi-character ones included so tokens
+# can straddle grammar terminals the way BPE pieces do
+VOCAB = list("EP[]()|,=+-*_{}Σ0123456789XYZabc ") + [
+    "do", "do(", "E[", "P(", ")]", "=1", "=0", "X=", " - ", "Y|", "Σ_{", "ab", "12", ", ", "XY", "\n",
+]
+
+
+@pytest.fixture(scope="module")
+def grammar():
+    return CausalGrammar().grammar
+
+
+@pytest.fixture(scope="module")
+def constraint(grammar):
+    return GrammarConstraint.from_grammar(grammar)
+
+
+@pytest.fixture(scope="module")
+def parser(grammar):
+    return LarkParser(grammar)
+
+
+def fake_decode(constraint, rng, max_new_tokens):
+    """
+    Greedy decoding over random logits: takes the best scoring token the
+    constraint allows, stops when a complete output draws the eos slot, and
+    closes what is left with constraint.completion like GenerationBackend does.
+    """
+    state = constraint.start()
+    text = ""
+    for _ in range(max_new_tokens):
+        scores = {token: rng.random() for token in VOCAB}
+        eos = rng.random()
+        for token in sorted(scores, key=scores.get, reverse=True):
+            if eos > scores[token] and constraint.is_complete(state):
+                return text
+            advanced = constraint.advance(state, token)
+            if advanced is not None:
+                state, text = advanced, text + token
+                break
+        else:
+            break
+    if constraint.is_complete(state):
+        return text
+    return text + constraint.completion(state)
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_fake_logits_output_parses(constraint, parser, seed):
+    rng = random.Random(seed)
+    text = fake_decode(constraint, rng, max_new_tokens=rng.randint(1, 40))
+    assert parser.parse(text) is not None, text
+
+
+def test_advance_rejects_dead_prefixes(constraint):
+    state = constraint.start()
+    assert constraint.advance(state, "E[") is not None
+    assert constraint.advance(state, "]") is None
+    assert constraint.advance(constraint.advance(state, "P(X"), "]") is None
+
+
+def test_tiny_random_generate_parses(grammar, constraint, parser):
+    pytest.importorskip("transformers")
+    from generate_pairs import GenerationBackend
+
+    backend = GenerationBackend.tiny_random(seed=1)
+    outputs = backend.generate([f"Question {i}:" for i in range(4)], max_new_tokens=16, constraint=constraint)
+    assert len(outputs) == 4
+    for text in outputs:
+        assert parser.parse(text) is not None, text
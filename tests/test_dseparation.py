@@ -0,0 +1,76 @@
+import random
+
+import networkx as nx
+import pytest
+
+from dseparation import MutilatedGraph
+from normalize_expr import _rule_2_candidates, parse_query
+from workloads import random_dag, random_query
+
+
+def seeded_dag(rng, n):
+    return random_dag(n, rng.random() * 0.6, rng.randrange(1 << 30))
+
+
+def random_mutilation(rng, G):
+    nodes = list(G)
+    return MutilatedGraph(G, cut_incoming=rng.sample(nodes, rng.randint(0, 2)),
+                          cut_outgoing=rng.sample(nodes, rng.randint(0, 2)),
+                          cut_edges=rng.sample(list(G.edges), min(len(G.edges), rng.randint(0, 2))))
+
+
+def random_split(rng, G):
+    """
+    Disjoint x (one node), candidates (at least one) and z (maybe empty).
+    """
+    nodes = rng.sample(list(G), len(G))
+    i = rng.randint(2, len(nodes))
+    j = rng.randint(i, len(nodes))
+    return set(nodes[:1]), set(nodes[1:i]), set(nodes[i:j])
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_leave_one_out_matches_per_candidate_is_d_separator(seed):
+    rng = random.Random(seed)
+    for _ in range(50):
+        n = rng.randint(3, 12)
+        G = seeded_dag(rng, n)
+        M = random_mutilation(rng, G)
+        H = M.to_graph()
+        x, candidates, z = random_split(rng, G)
+        expected = {c for c in candidates if nx.is_d_separator(H, x, {c}, z | (candidates - {c}))}
+        assert M.leave_one_out_separated(x, candidates, z) == expected
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_separated_from_and_is_d_separator_match_networkx(seed):
+    rng = random.Random(seed)
+    for _ in range(50):
+        n = rng.randint(3, 12)
+        G = seeded_dag(rng, n)
+        M = random_mutilation(rng, G)
+        H = M.to_graph()
+        x, candidates, z = random_split(rng, G)
+        expected = {c for c in candidates if nx.is_d_separator(H, x, {c}, z)}
+        assert M.separated_from(x, candidates, z) == expected
+        assert M.is_d_separator(x, candidates, z) == nx.is_d_separator(H, x, candidates, z)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_rule_2_cutting_all_candidates_matches_one_at_a_time(seed):
+    # the rule 2 graph of a candidate z only cuts the arrows out of z; the
+    # batched version cuts them out of every candidate at once
+    rng = random.Random(seed)
+    for _ in range(50):
+        n = rng.randint(3, 10)
+        G = seeded_dag(rng, n)
+        num_conditions = rng.randint(1, n - 1)
+        num_do = rng.randint(1, num_conditions)
+        query = parse_query(random_query(G, rng, num_do, num_conditions - num_do))
+        candidates = set(query.do[1:] if len(query.do) > 1 else query.do)
+        expected = set()
+        for c in candidates:
+            H = MutilatedGraph(G, cut_incoming=query.do, cut_outgoing={c}).to_graph()
+            if nx.is_d_separator(H, set(query.outcome), {c}, (set(query.do) - {c}) | set(query.obs)):
+                expected.add(c)
+        assert _rule_2_candidates(G, query) == expected
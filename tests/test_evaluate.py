@@ -0,0 +1,28 @@
+import pytest
+
+from evaluate import evaluate_rows
+from generate_pairs import MATH_EXPRESSIONS, TEMPLATES, VARIABLES, sample_rows
+from syntax_eval import CausalGrammar, LarkParser, join_name_words
+
+
+def test_generated_rows_parse():
+    rows = [(y_true, y_true) for _, y_true in sample_rows(200, VARIABLES, TEMPLATES, MATH_EXPRESSIONS, seed=0)]
+    results = list(evaluate_rows(rows, processes=0, cache_dir=None))
+    assert all(result.true_valid and result.equivalent for result in results)
+
+
+def test_respaced_multi_word_names_are_equivalent():
+    y_true = "E[smoking|do(lung cancer=1,age=27)] - E[smoking|do(lung cancer=0,age=27)]"
+    y_pred = "E[smoking | do(lung cancer = 1, age = 27)]-E[smoking | do(lung cancer = 0, age = 27)]"
+    result, = evaluate_rows([(y_true, y_pred)], processes=0, cache_dir=None)
+    assert result.pred_valid and result.equivalent and not result.exact_match
+
+
+@pytest.mark.parametrize("expression", [
+    "E[Y | do(T=1)] - E[Y | do(T=0)]",
+    "E[Y_{X(0)}|do(T = 1)] - E[Y|do(T = 0)]",
+    "Σ_{x} P(X= x|T = 0)*(E[Y|T = 1,X= x] - E[Y|T = 0,X= x])",
+])
+def test_join_name_words_keeps_valid_expressions(expression):
+    assert LarkParser(CausalGrammar().grammar).parse(expression) is not None
+    assert join_name_words(expression) == expression
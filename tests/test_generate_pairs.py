@@ -0,0 +1,124 @@
+import json
+
+import pytest
+
+from generate_pairs import (
+    MATH_EXPRESSIONS, PROMPT_PREFIX, TEMPLATES, VARIABLES, build_question_prompt, generate_batched, generate_questions,
+    sample_rows,
+)
+
+
+class StubBackend:
+    """
+    Answers every prompt with its model name, counting calls.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+
+    def generate(self, prompts, max_new_tokens=64, stop=None, prefix=None, prefix_cache=True, constraint=None):
+        self.calls += 1
+        return [self.name for _ in prompts]
+
+
+def run(path, backend, **kwargs):
+    pd = pytest.importorskip("pandas")
+    manifest = generate_questions(20, VARIABLES, TEMPLATES, MATH_EXPRESSIONS, backend=backend,
+                                  output_path=str(path), chunk_size=8, **kwargs)
+    return manifest, pd.read_csv(path)
+
+
+def test_finished_run_is_returned_as_is(tmp_path):
+    backend = StubBackend("model-a")
+    _, first = run(tmp_path / "pairs.csv", backend)
+    calls = backend.calls
+    _, second = run(tmp_path / "pairs.csv", backend)
+    assert backend.calls == calls
+    assert second.equals(first)
+
+
+@pytest.mark.parametrize("change", [
+    {"backend": StubBackend("model-b")},
+    {"batch_size": 4},
+    {"prefix_cache": False},
+    {"stop": ["\n", ";"]},
+])
+def test_changed_generation_settings_start_a_new_dataset(tmp_path, change):
+    path = tmp_path / "pairs.csv"
+    run(path, StubBackend("model-a"))
+    kwargs = {"backend": StubBackend("model-a"), **change}
+    manifest, rows = run(path, **kwargs)
+    assert kwargs["backend"].calls > 0
+    assert manifest["complete"] and manifest["rows_written"] == 20 and len(rows) == 20
+    assert (rows["y_pred"] == kwargs["backend"].name).all()
+    with open(str(path) + ".manifest.json") as f:
+        params = json.load(f)["params"]
+    assert params["model"] == kwargs["backend"].name
+    for key, value in change.items():
+        if key != "backend":
+            assert params[key] == value
+
+
+class HashLM:
+    """
+    Stand-in causal LM without transformers. The next token is a hash of the
+    attended (token, position) pairs, so padding, masks, positions and cached
+    prefixes that are handled wrong change the output. The KV cache is one
+    layer of (token ids, positions).
+    """
+    ALPHABET = [ord(c) for c in "abcXYZ()|=, "] + [ord("\n"), 257]
+
+    def to(self, device):
+        return self
+
+    def eval(self):
+        return self
+
+    def __call__(self, input_ids, attention_mask=None, position_ids=None, past_key_values=None, **kwargs):
+        import torch
+        from types import SimpleNamespace
+
+        if position_ids is None:
+            past_length = 0 if past_key_values is None else past_key_values[0][0].shape[1]
+            position_ids = torch.arange(past_length, past_length + input_ids.shape[1])[None].expand_as(input_ids)
+        if past_key_values is not None:
+            input_ids = torch.cat([past_key_values[0][0], input_ids], dim=1)
+            position_ids = torch.cat([past_key_values[0][1], position_ids], dim=1)
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+        h = ((input_ids + 1) * (position_ids * 31 + 7) * attention_mask).sum(dim=-1) % 1000003
+        logits = torch.zeros((input_ids.shape[0], 1, 258))
+        logits[torch.arange(len(h)), 0, torch.tensor(self.ALPHABET)[h % len(self.ALPHABET)]] = 1.0
+        return SimpleNamespace(logits=logits, past_key_values=((input_ids, position_ids),))
+
+
+@pytest.fixture
+def hash_backend():
+    pytest.importorskip("torch")
+    from generate_pairs import ByteTokenizer, GenerationBackend
+    return GenerationBackend(HashLM(), ByteTokenizer(), name="hash")
+
+
+# prompts of different lengths, so batches need left padding
+PROMPTS = [build_question_prompt(question) for question, _ in
+           sample_rows(24, VARIABLES, TEMPLATES, MATH_EXPRESSIONS, seed=0)]
+
+
+@pytest.mark.parametrize("prefix", [None, PROMPT_PREFIX])
+def test_batched_generation_matches_one_prompt_at_a_time(hash_backend, prefix):
+    alone = [hash_backend.generate([prompt], max_new_tokens=24, prefix=prefix)[0] for prompt in PROMPTS]
+    assert len(set(alone)) > 1
+    for batch_size in (3, 8, 24):
+        assert generate_batched(hash_backend, PROMPTS, batch_size=batch_size, max_new_tokens=24,
+                                prefix=prefix) == alone
+
+
+def test_prefix_cache_matches_uncached_prefix(hash_backend):
+    uncached = generate_batched(hash_backend, PROMPTS, batch_size=8, max_new_tokens=24, prefix=PROMPT_PREFIX,
+                                prefix_cache=False)
+    assert hash_backend.stats["prefix_encodes"] == 0
+    cached = generate_batched(hash_backend, PROMPTS, batch_size=8, max_new_tokens=24, prefix=PROMPT_PREFIX)
+    assert cached == uncached
+    # encoded once, then reused by every batch
+    assert hash_backend.stats["prefix_encodes"] == 1
@@ -0,0 +1,86 @@
+import random
+
+import networkx as nx
+import pytest
+
+from graph_batch import GraphBatch
+from markov_equivalence import get_v_structures, markov_equivalence
+from workloads import random_dag
+
+
+def seeded_dag(rng, n):
+    return random_dag(n, rng.random() * 0.6, rng.randrange(1 << 30))
+
+
+def perturbed(rng, G):
+    """
+    G with a few random edges reversed, some of them covered, so about half
+    the results stay in G's Markov equivalence class.
+    """
+    H = G.copy()
+    for u, v in rng.sample(list(H.edges), min(rng.randint(0, 2), H.number_of_edges())):
+        H.remove_edge(u, v)
+        H.add_edge(v, u)
+    return H
+
+
+def with_back_edge(rng, G):
+    # adds v -> u for some path u -> ... -> v half of the time, making a cycle
+    H = G.copy()
+    if H.number_of_edges() and rng.random() < 0.5:
+        u, v = rng.choice(list(H.edges))
+        H.add_edge(v, rng.choice([u] + list(nx.ancestors(H, u))))
+    return H
+
+
+def reaching(G, v):
+    """
+    Nodes with a directed path of length one or more to v, v itself if it is on a cycle.
+    """
+    if v not in G:
+        return set()
+    return set().union(*({p} | nx.ancestors(G, p) for p in G.predecessors(v)))
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_markov_equivalent_matches_markov_equivalence(seed):
+    rng = random.Random(seed)
+    nodes = [f"V{i}" for i in range(9)]
+    graphs = [seeded_dag(rng, 9) for _ in range(100)]
+    others = [perturbed(rng, G) if rng.random() < 0.8 else seeded_dag(rng, 9) for G in graphs]
+    batch = GraphBatch.from_graphs(graphs, nodes=nodes)
+    result = batch.markov_equivalent(GraphBatch.from_graphs(others, nodes=nodes), chunk_size=16)
+    assert result.tolist() == [markov_equivalence(G, H) for G, H in zip(graphs, others)]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_v_structures_match_get_v_structures(seed):
+    rng = random.Random(seed)
+    graphs = [seeded_dag(rng, rng.randint(3, 10)) for _ in range(50)]
+    batch = GraphBatch.from_graphs(graphs)
+    assert [batch.v_structures(b) for b in range(len(batch))] == [get_v_structures(G) for G in graphs]
+    assert batch.count_v_structures(chunk_size=7).tolist() == [len(get_v_structures(G)) for G in graphs]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_is_acyclic_and_ancestor_closure_match_networkx(seed):
+    rng = random.Random(seed)
+    graphs = [with_back_edge(rng, seeded_dag(rng, rng.randint(2, 12))) for _ in range(50)]
+    # the longest paths and cycles 12 nodes allow need every squaring of the closure
+    order = rng.sample([f"V{i}" for i in range(12)], 12)
+    graphs += [nx.DiGraph(list(zip(order, order[1:]))), nx.DiGraph(list(zip(order, order[1:] + order[:1])))]
+    batch = GraphBatch.from_graphs(graphs)
+    assert batch.is_acyclic(chunk_size=8).tolist() == [nx.is_directed_acyclic_graph(G) for G in graphs]
+    closure = batch.ancestor_closure(chunk_size=8)
+    for b, G in enumerate(graphs):
+        for j, v in enumerate(batch.nodes):
+            ancestors = {batch.nodes[i] for i in closure[b, :, j].nonzero()[0]}
+            assert ancestors == reaching(G, v), (b, v)
+
+
+def test_graphs_round_trip_with_missing_nodes():
+    rng = random.Random(0)
+    graphs = [seeded_dag(rng, n) for n in (3, 6, 9)]
+    batch = GraphBatch.from_graphs(graphs)
+    for G, H in zip(graphs, batch.to_graphs()):
+        assert set(H) == set(G) and set(H.edges) == set(G.edges)
@@ -0,0 +1,18 @@
+import networkx as nx
+import pytest
+
+from identification import identify
+
+
+@pytest.mark.parametrize("x, y, z", [("X", "Y", "Z"), (0, 1, 2), (("x", 1), ("y", 1), ("z", 1))])
+def test_identify_accepts_any_node_type(x, y, z):
+    G = nx.DiGraph([(z, x), (z, y), (x, y)])
+    result = identify(G, y, x)
+    assert result.identifiable
+    assert identify(G, {y}, [x]).estimand == result.estimand
+
+
+def test_identify_reports_missing_nodes():
+    G = nx.DiGraph([(0, 1)])
+    with pytest.raises(nx.NodeNotFound):
+        identify(G, 1, 7)
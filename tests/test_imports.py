@@ -0,0 +1,22 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# module -> heavy dependencies it must only load when used
+LAZY = {
+    "normalize_expr": ("matplotlib", "sympy", "torch", "transformers"),
+    "causal_equiv": ("matplotlib", "torch", "transformers"),
+    "generate_pairs": ("torch", "transformers", "huggingface_hub", "pandas"),
+    "dataset_writer": ("pandas", "pyarrow"),
+}
+
+
+@pytest.mark.parametrize("module", sorted(LAZY))
+def test_import_does_not_load_heavy_dependencies(module):
+    code = f"import sys, {module}; print(' '.join(m for m in {LAZY[module]!r} if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, capture_output=True, text=True, check=True)
+    assert out.stdout.split() == []
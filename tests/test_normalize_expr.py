@@ -0,0 +1,126 @@
+import random
+import tracemalloc
+
+import networkx as nx
+import pytest
+
+import normalize_expr
+import reference_rules
+from workloads import random_dag, random_query, sparse_density
+
+RULES = ("apply_rule_1", "apply_rule_2", "apply_rule_3", "simplify_expression")
+
+
+def random_case(rng):
+    n = rng.randint(3, 9)
+    G = random_dag(n, rng.random() * 0.6, rng.randrange(1 << 30))
+    num_conditions = rng.randint(1, min(5, n - 1))
+    num_do = rng.randint(0, num_conditions)
+    return G, random_query(G, rng, num_do, num_conditions - num_do)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_rules_match_string_implementation(seed):
+    rng = random.Random(seed)
+    compared = 0
+    for _ in range(100):
+        G, expression = random_case(rng)
+        for name in RULES:
+            try:
+                expected = getattr(reference_rules, name)(G, expression)
+            except (nx.NetworkXError, IndexError):
+                # the string rules raise on do() parents of other do() terms and
+                # once every condition is gone, the IR ones don't
+                continue
+            kwargs = {"cache": None} if name == "simplify_expression" else {}
+            assert getattr(normalize_expr, name)(G, expression, **kwargs) == expected, (name, expression, G.edges)
+            compared += 1
+    assert compared > 300
+
+
+def test_rules_write_nothing_to_stdout(capsys):
+    G = nx.DiGraph([("Z", "X"), ("X", "Y"), ("W", "Z")])
+    assert normalize_expr.simplify_expression(G, "P(Y|do(X),W)", cache=None) == "P(Y|X)"
+    assert capsys.readouterr().out == ""
+
+
+def test_graph_fingerprint_is_exact():
+    G = nx.DiGraph([("X", "Y"), ("Z", "X")])
+    H = nx.DiGraph()
+    H.add_nodes_from(["Y", "Z", "X"])
+    H.add_edges_from([("Z", "X"), ("X", "Y")])
+    assert normalize_expr.graph_fingerprint(G) == normalize_expr.graph_fingerprint(H)
+    H.add_edge("Z", "Y")
+    assert normalize_expr.graph_fingerprint(G) != normalize_expr.graph_fingerprint(H)
+
+
+def test_graph_fingerprint_is_built_once_per_graph():
+    G = random_dag(1000, sparse_density(1000), 0)
+    key = normalize_expr.graph_fingerprint(G)
+    assert normalize_expr.graph_fingerprint(G) is key
+    # an equal graph built separately gets the same interned key
+    assert normalize_expr.graph_fingerprint(random_dag(1000, sparse_density(1000), 0)) is key
+    u, v = next(iter(G.edges))
+    G.remove_edge(u, v)
+    assert normalize_expr.graph_fingerprint(G) is not key
+    G.add_edge(u, v)
+    assert normalize_expr.graph_fingerprint(G) is key
+
+
+def test_cache_entries_share_one_graph_key():
+    G = random_dag(1000, sparse_density(1000), 0)
+    rng = random.Random(0)
+    cache = normalize_expr.SimplifyCache()
+    tracemalloc.start()
+    for _ in range(100):
+        normalize_expr.simplify_expression(G, random_query(G, rng), cache=cache)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert {id(fingerprint) for fingerprint, _, _ in cache._entries} == {id(normalize_expr.graph_fingerprint(G))}
+    # a copy of the graph per entry would take ~30 KB each
+    assert memory < 1000 * cache.info().currsize
+
+
+def test_cache_does_not_mix_graphs():
+    cache = normalize_expr.SimplifyCache()
+    confounded = nx.DiGraph([("Z", "X"), ("Z", "Y"), ("X", "Y"), ("W", "Z")])
+    unconfounded = nx.DiGraph([("Z", "X"), ("X", "Y"), ("W", "Z")])
+    for G in (confounded, unconfounded, confounded):
+        assert normalize_expr.simplify_expression(G, "P(Y|do(X),W)", cache=cache) == \
+            normalize_expr.simplify_expression(G, "P(Y|do(X),W)", cache=None)
+    assert cache.info().hits > 0
+
+
+def test_search_does_not_insert_do_terms():
+    # rule 2's test cuts the arrows into W itself, so turning W into do(W)
+    # and removing it with rule 3 would be unsound
+    G = nx.DiGraph([("U", "Z"), ("Z", "W"), ("U", "Y")])
+    G.add_node("X")
+    result = normalize_expr.search_simplify(G, "P(Y|do(X),W)")
+    assert result.expression == "P(Y|W)"
+    assert all(rule in ("rule_1", "rule_2", "rule_3", "rule_1^-1") for rule, _ in result.steps)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_search_replays_and_never_loses_to_greedy(seed):
+    rng = random.Random(seed)
+    for _ in range(50):
+        G, expression = random_case(rng)
+        greedy = normalize_expr.simplify_expression(G, expression, cache=None)
+        result = normalize_expr.search_simplify(G, expression, max_depth=12, max_expansions=10**6, max_seconds=10)
+        assert result.cost <= normalize_expr.rewrite_cost(normalize_expr.parse_query(greedy))
+        query = normalize_expr.parse_query(expression)
+        for step in result.steps:
+            query = dict(normalize_expr._rewrites(G, query))[step]
+        assert str(query) == result.expression
+
+
+def test_dag_to_causal_expression_on_a_confounder():
+    # Z confounds X -> Y and is a direct cause of Y itself, so both go under do();
+    # with every parent of Y intervened on the back-door estimand adjusts for nothing
+    G = nx.DiGraph([("Z", "X"), ("Z", "Y"), ("X", "Y")])
+    assert normalize_expr._initial_expression(G, "Y") == "P(Y | do(Z,X))"
+    estimand = normalize_expr.dag_to_causal_expression(G, "Y", method="id")
+    assert estimand == "P(Y|Z,X)"
+    simplified = normalize_expr.parse_query(normalize_expr.dag_to_causal_expression(G, "Y"))
+    assert (simplified.outcome, simplified.do, set(simplified.obs)) == (("Y",), (), {"X", "Z"})
@@ -0,0 +1,51 @@
+import itertools
+import sqlite3
+
+import pytest
+
+import result_cache
+from result_cache import ResultCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # a strictly increasing clock, so recency never ties
+    ticks = itertools.count()
+    monkeypatch.setattr(result_cache.time, "time", lambda: float(next(ticks)))
+
+
+def test_get_many_does_not_write(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    with ResultCache(path) as cache:
+        cache.put_many({"a": 1, "b": 2})
+        # another connection holding a write lock must not block lookups
+        other = sqlite3.connect(path)
+        other.execute("BEGIN IMMEDIATE")
+        assert cache.get_many(["a", "b", "c"]) == {"a": 1, "b": 2}
+        assert not cache._db.in_transaction
+        other.rollback()
+        other.close()
+        assert cache.info().hits == 2 and cache.info().misses == 1
+
+
+def test_eviction_follows_reads(tmp_path, clock):
+    with ResultCache(str(tmp_path / "cache.sqlite"), maxsize=3) as cache:
+        cache.put_many({"a": 1})
+        cache.put_many({"b": 2})
+        cache.put_many({"c": 3})
+        cache.get_many(["a"])
+        cache.put_many({"d": 4})
+        assert cache.get_many(["a", "b", "c", "d"]) == {"a": 1, "c": 3, "d": 4}
+        cache.get_many(["c"])
+        cache.resize(maxsize=2)
+        assert cache.get_many(["a", "c", "d"]) == {"c": 3, "d": 4}
+
+
+def test_reads_are_kept_across_close(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite")
+    with ResultCache(path) as cache:
+        cache.put_many({"a": 1})
+        cache.put_many({"b": 2})
+        cache.get_many(["a"])
+    with ResultCache(path, maxsize=1) as cache:
+        assert cache.get_many(["a", "b"]) == {"a": 1}
@@ -0,0 +1,50 @@
+import random
+
+import pytest
+
+from causal_ast import to_ast
+from syntax_eval import CausalGrammar, LarkParser, emit_standalone
+from workloads import random_expression
+
+EXPRESSIONS = [
+    "E[Y|do(T=1)] - E[Y|do(T=0)]",
+    "Σ_{z} P(Y|do(X=1),Z=z)*P(Z=z)",
+    "E[Y_{X(0)}|do(X=1)] = E[Y]",
+    "X_{Y}",
+]
+
+
+@pytest.fixture(scope="module")
+def standalone_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("standalone") / "causal_grammar_standalone.py")
+    emit_standalone(CausalGrammar().grammar, path)
+    return path
+
+
+@pytest.mark.parametrize("expression", EXPRESSIONS)
+def test_standalone_trees_convert_to_the_same_ast(standalone_path, expression):
+    standalone = LarkParser.from_standalone(standalone_path)
+    lark = LarkParser(CausalGrammar().grammar)
+    assert to_ast(standalone.parse(expression)) is to_ast(lark.parse(expression))
+
+
+def test_standalone_grammar_is_checked_by_default(standalone_path):
+    LarkParser.from_standalone(standalone_path)
+    with pytest.raises(ValueError):
+        LarkParser.from_standalone(standalone_path, grammar=CausalGrammar().grammar + "\n")
+
+
+def test_summation_body_keeps_its_parentheses():
+    parser = LarkParser(CausalGrammar().grammar)
+    node = to_ast(parser.parse("Σ_{x} (P(X=x|T=1) - P(X=x|T=0))"))
+    assert str(node) == "Σ_{x} (P(X = x|T=1) - P(X = x|T=0))"
+    assert to_ast(parser.parse(str(node))) is node
+
+
+@pytest.mark.parametrize("num_atoms", [1, 2, 4, 8, 16])
+def test_str_round_trips_through_the_parser(num_atoms):
+    parser = LarkParser(CausalGrammar().grammar)
+    rng = random.Random(num_atoms)
+    for _ in range(200):
+        node = to_ast(parser.parse(random_expression(num_atoms, rng)))
+        assert to_ast(parser.parse(str(node))) is node, str(node)
@@ -0,0 +1,89 @@
+"""
+Seeded workload generators shared by benchmarks.py and bench_suite.py. The
+same seed always gives the same inputs:
+
+- random_dag: DAGs of a given size and density, sparse_density for a given
+  number of edges per node instead;
+- random_query: P(Y|do(...),...) expressions over a DAG;
+- random_expression: grammar-valid expression strings with a given number of
+  E[...]/P(...) atoms.
+"""
+
+import math
+import random
+
+import networkx as nx
+
+
+def random_dag(num_nodes: int, density: float, seed: int = 0) -> nx.DiGraph:
+    """
+    DAG over nodes "V0".."V{n-1}" with round(density * n * (n - 1) / 2) edges,
+    drawn uniformly without replacement from the pairs of a random
+    topological order.
+    """
+    rng = random.Random(seed)
+    order = [f"V{i}" for i in range(num_nodes)]
+    rng.shuffle(order)
+    pairs = num_nodes * (num_nodes - 1) // 2
+    G = nx.DiGraph()
+    G.add_nodes_from(sorted(order, key=lambda v: int(v[1:])))
+    for k in rng.sample(range(pairs), round(density * pairs)):
+        # k-th pair (i, j), i < j, of the order
+        j = (1 + math.isqrt(1 + 8 * k)) // 2
+        i = k - j * (j - 1) // 2
+        G.add_edge(order[i], order[j])
+    return G
+
+
+def sparse_density(num_nodes: int, edges_per_node: float = 2) -> float:
+    """
+    The random_dag density that gives edges_per_node * num_nodes edges, or as
+    many as fit.
+    """
+    return min(1.0, 2 * edges_per_node / max(1, num_nodes - 1))
+
+
+def random_query(G, rng: random.Random, num_do: int = 2, num_obs: int = 2) -> str:
+    """
+    P(Y|do(...),...,...) over distinct nodes of G.
+    """
+    outcome, *rest = rng.sample(list(G), min(len(G), 1 + num_do + num_obs))
+    terms = [f"do({v})" for v in rest[:num_do]] + rest[num_do:]
+    return f"P({outcome}|{','.join(terms)})" if terms else f"P({outcome})"
+
+
+def _random_atom(rng: random.Random) -> str:
+    names = ("X", "Y", "Z", "T", "W")
+    outcome = rng.choice(names)
+    conditions = []
+    for _ in range(rng.randint(0, 3)):
+        assignment = f"{rng.choice(names)}={rng.choice(('0', '1', 'x', 'z'))}"
+        conditions.append(f"do({assignment})" if rng.random() < 0.5 else assignment)
+    body = f"{outcome}|{','.join(conditions)}" if conditions else outcome
+    return f"E[{body}]" if rng.random() < 0.5 else f"P({body})"
+
+
+def _join(parts: list, rng: random.Random) -> str:
+    out = parts[0]
+    for part in parts[1:]:
+        out += f" {rng.choice('+-*')} {part}"
+    return out
+
+
+def random_expression(num_atoms: int, rng: random.Random) -> str:
+    """
+    A CausalGrammar-valid expression with num_atoms E[...]/P(...) atoms, joined
+    by +, - and *, with runs of atoms grouped in parentheses or Σ_{x}.
+    """
+    atoms = [_random_atom(rng) for _ in range(num_atoms)]
+    groups = []
+    i = 0
+    while i < len(atoms):
+        run = atoms[i:i + rng.randint(1, 4)]
+        group = _join(run, rng)
+        if len(run) > 1:
+            # a summation is a term, not an atom, so it needs its own parentheses
+            group = f"({group})" if rng.random() < 0.5 else f"(Σ_{{x}} ({group}))"
+        groups.append(group)
+        i += len(run)
+    return _join(groups, rng)